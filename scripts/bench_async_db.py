@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Benchmark: blocking (pymysql-style) session vs async session under concurrency
+
+Runs a small FastAPI app in-process with two async handlers issuing the same
+query, one through a synchronous Session (blocks the event loop, as the
+services did) and one through the async session from
+shared/common/async_database.py. Each query takes QUERY_MS milliseconds on the
+database side. While each load runs, the event-loop lag (how late a 5 ms
+timer fires) is sampled: that is how long every other request and in-flight
+call_service await of the worker is held up.
+
+By default a temporary SQLite database is used with a sleep_ms() SQL function
+standing in for query time (aiosqlite runs it off the event loop). Pass
+--database-url mysql+pymysql://... to measure against MySQL (SLEEP()).
+
+Usage:
+    python scripts/bench_async_db.py [--requests 200] [--concurrency 50] [--query-ms 20]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import httpx  # noqa: E402
+from fastapi import Depends, FastAPI  # noqa: E402
+from sqlalchemy import create_engine, event, text  # noqa: E402
+from sqlalchemy.engine import make_url  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncSession  # noqa: E402
+from sqlalchemy.orm import Session, sessionmaker  # noqa: E402
+
+from shared.common.async_database import async_session_dependency, create_async_database  # noqa: E402
+
+
+def _sleep_ms(ms):
+    time.sleep(ms / 1000.0)
+    return ms
+
+
+def build_app(database_url: str, pool_size: int, concurrency: int):
+    sqlite = make_url(database_url).get_backend_name() == "sqlite"
+    # The blocking engine needs a connection per concurrent request: a handler
+    # blocked waiting for the pool also blocks the loop that would return
+    # connections to it. aiosqlite uses NullPool (a connection per session).
+    engine = create_engine(database_url, pool_size=max(pool_size, concurrency), max_overflow=0)
+    SessionLocal = sessionmaker(bind=engine, autoflush=False)
+    pool_args = {} if sqlite else {"pool_size": pool_size, "max_overflow": 0}
+    async_engine, AsyncSessionLocal = create_async_database(database_url, **pool_args)
+    get_async_db = async_session_dependency(AsyncSessionLocal)
+
+    if sqlite:
+        @event.listens_for(engine, "connect")
+        def _register(dbapi_connection, _):
+            dbapi_connection.create_function("sleep_ms", 1, _sleep_ms)
+
+        @event.listens_for(async_engine.sync_engine, "connect")
+        def _register_async(dbapi_connection, _):
+            dbapi_connection.create_function("sleep_ms", 1, _sleep_ms)
+
+        query = text("SELECT sleep_ms(:ms)")
+    else:
+        query = text("SELECT SLEEP(:ms / 1000.0)")
+
+    def get_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app = FastAPI()
+
+    @app.get("/sync")
+    async def sync_query(ms: int, db: Session = Depends(get_db)):
+        db.execute(query, {"ms": ms}).scalar()
+        return {"ok": True}
+
+    @app.get("/async")
+    async def async_query(ms: int, db: AsyncSession = Depends(get_async_db)):
+        (await db.execute(query, {"ms": ms})).scalar()
+        return {"ok": True}
+
+    return app, engine, async_engine
+
+
+async def run_load(client: httpx.AsyncClient, path: str, requests: int, concurrency: int, query_ms: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    loop_lags = []
+    done = asyncio.Event()
+
+    async def one():
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.get(path, params={"ms": query_ms})
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - started)
+
+    async def probe():
+        while not done.is_set():
+            started = time.perf_counter()
+            await asyncio.sleep(0.005)
+            loop_lags.append(max(0.0, time.perf_counter() - started - 0.005))
+
+    prober = asyncio.create_task(probe())
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - started
+    done.set()
+    await prober
+    return elapsed, latencies, loop_lags
+
+
+def _ms(seconds: float) -> str:
+    return f"{seconds * 1000:8.1f} ms"
+
+
+def report(name: str, requests: int, elapsed: float, latencies, loop_lags):
+    latencies = sorted(latencies)
+    lags = sorted(loop_lags) or [0.0]
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(
+        f"{name:6} {requests / elapsed:8.1f} req/s   p50 {_ms(statistics.median(latencies))}   p95 {_ms(p95)}"
+        f"   loop lag p50 {_ms(statistics.median(lags))}  max {_ms(lags[-1])}"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--query-ms", type=int, default=20)
+    parser.add_argument("--pool-size", type=int, default=10)
+    parser.add_argument("--database-url", default=None, help="default: a temporary SQLite file")
+    args = parser.parse_args()
+
+    tmpdir = None
+    database_url = args.database_url
+    if database_url is None:
+        tmpdir = tempfile.TemporaryDirectory()
+        database_url = f"sqlite:///{os.path.join(tmpdir.name, 'bench.db')}"
+
+    app, engine, async_engine = build_app(database_url, args.pool_size, args.concurrency)
+    print(
+        f"{args.requests} requests, concurrency {args.concurrency}, {args.query_ms} ms per query, "
+        f"pool {args.pool_size}, {make_url(database_url).get_backend_name()}"
+    )
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # Warm up both pools
+        await client.get("/sync", params={"ms": 0})
+        await client.get("/async", params={"ms": 0})
+        for name in ("sync", "async"):
+            elapsed, latencies, lags = await run_load(
+                client, f"/{name}", args.requests, args.concurrency, args.query_ms
+            )
+            report(name, args.requests, elapsed, latencies, lags)
+
+    engine.dispose()
+    await async_engine.dispose()
+    if tmpdir is not None:
+        tmpdir.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: compiled GatewayRouter vs the previous get_service_url
+
+The previous implementation (sorting SERVICE_ROUTES and re-evaluating the
+is_public_endpoint chain on every request) is reproduced below with its debug
+prints removed, so the comparison only measures routing work.
+
+Usage:
+    python scripts/bench_gateway_router.py [iterations]
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "services", "api-gateway"))
+
+from router import GatewayRouter, ANY_METHOD  # noqa: E402
+
+AUTH = "http://auth-service:8000"
+CUSTOMER = "http://customer-service:8000"
+ROOM = "http://room-service:8000"
+BOOKING = "http://booking-service:8000"
+PAYMENT = "http://payment-service:8000"
+REPORT = "http://report-service:8000"
+
+SERVICES = {
+    "auth": AUTH,
+    "customer": CUSTOMER,
+    "room": ROOM,
+    "booking": BOOKING,
+    "payment": PAYMENT,
+    "report": REPORT,
+}
+
+ROUTES = {
+    "/api/auth": "auth",
+    "/api/users": "auth",
+    "/api/customers": "customer",
+    "/api/rooms": "room",
+    "/api/bookings": "booking",
+    "/api/payments": "payment",
+    "/api/reports": "report",
+    "/auth": "auth",
+    "/users": "auth",
+    "/customers": "customer",
+    "/rooms": "room",
+    "/bookings": "booking",
+    "/payments": "payment",
+    "/reports": "report",
+}
+
+# Previous SERVICE_ROUTES shape: prefix -> upstream URL
+SERVICE_ROUTES = {prefix: SERVICES[name] for prefix, name in ROUTES.items()}
+
+PUBLIC_ENDPOINTS = {
+    "/api/auth": {"login": ANY_METHOD, "register": ANY_METHOD, "": ("POST",)},
+    "/api/rooms": {"*": ("GET",)},
+}
+
+SAMPLES = [
+    ("GET", "/api/rooms"),
+    ("GET", "/api/rooms/12"),
+    ("GET", "/api/rooms/available"),
+    ("GET", "/api/rooms/12/availability"),
+    ("PUT", "/api/rooms/12/status"),
+    ("GET", "/api/rooms/room-types"),
+    ("POST", "/api/auth/login"),
+    ("GET", "/api/auth/me"),
+    ("GET", "/api/users/3"),
+    ("GET", "/api/bookings"),
+    ("POST", "/api/bookings"),
+    ("GET", "/api/payments/7"),
+    ("GET", "/api/reports/dashboard"),
+    ("GET", "/api/customers/5/with-history"),
+    ("GET", "/bookings/2"),
+]
+
+
+def legacy_get_service_url(path):
+    sorted_routes = sorted(SERVICE_ROUTES.items(), key=lambda x: len(x[0]), reverse=True)
+    for route_prefix, service_url in sorted_routes:
+        if path.startswith(route_prefix):
+            stripped_path = path[len(route_prefix):].lstrip('/')
+            if route_prefix == "/api/users":
+                stripped_path = f"users/{stripped_path}" if stripped_path else "users"
+            elif route_prefix == "/api/auth":
+                pass
+            elif route_prefix == "/api/rooms":
+                if not stripped_path:
+                    stripped_path = "rooms"
+                elif stripped_path.startswith("room-types"):
+                    pass
+                elif stripped_path == "available" or stripped_path.startswith("available?"):
+                    pass
+                elif stripped_path.endswith("/availability") or stripped_path.endswith("/status"):
+                    pass
+                elif stripped_path and not stripped_path.startswith("rooms/"):
+                    stripped_path = f"rooms/{stripped_path}"
+            elif route_prefix.startswith("/api/"):
+                service_name = route_prefix[5:]
+                stripped_path = f"{service_name}/{stripped_path}" if stripped_path else service_name
+            return (service_url, stripped_path)
+    return None
+
+
+def legacy_is_public(path, method):
+    path = path[len("/api/"):]
+    return (
+        path == "auth/login" or
+        path.startswith("auth/login/") or
+        path == "auth/register" or
+        path.startswith("auth/register/") or
+        (path == "auth" and method == "POST") or
+        (method == "GET" and (path == "rooms" or path.startswith("rooms/") or path.startswith("room-types")))
+    )
+
+
+def legacy_lookup(method, path):
+    public = legacy_is_public(path, method) if path.startswith("/api/") else True
+    return legacy_get_service_url(path), public
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    router = GatewayRouter(ROUTES, SERVICES, PUBLIC_ENDPOINTS)
+
+    # Both implementations must agree before their speed is compared
+    for method, path in SAMPLES:
+        match = router.match(path, method)
+        legacy_route, legacy_public = legacy_lookup(method, path)
+        assert (match.service_url, match.path) == legacy_route, (path, match, legacy_route)
+        assert match.public == legacy_public, (method, path)
+
+    def run_legacy():
+        for method, path in SAMPLES:
+            legacy_lookup(method, path)
+
+    def run_trie():
+        for method, path in SAMPLES:
+            router.match(path, method)
+
+    legacy = min(timeit.repeat(run_legacy, number=iterations, repeat=3))
+    trie = min(timeit.repeat(run_trie, number=iterations, repeat=3))
+    lookups = iterations * len(SAMPLES)
+
+    print(f"{'implementation':<16}{'total (s)':>12}{'per lookup (us)':>18}")
+    print(f"{'legacy':<16}{legacy:>12.3f}{legacy / lookups * 1e6:>18.2f}")
+    print(f"{'trie':<16}{trie:>12.3f}{trie / lookups * 1e6:>18.2f}")
+    print(f"speedup: {legacy / trie:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+In-memory stand-in for Redis, for running the services' shared cache locally
+
+Speaks enough of the Redis protocol (RESP) for shared/common/cache.py's
+RedisBackend: PING, AUTH, SELECT, GET, SET (EX/PX), DEL, INCR, FLUSHALL.
+Single process, no persistence; not a Redis replacement.
+
+Usage:
+    python scripts/resp_stub.py [--port 6379]
+    CACHE_URL=redis://localhost:6379/0 uvicorn main:app ...
+"""
+import argparse
+import asyncio
+import time
+
+store = {}
+
+
+def _encode(value) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, Exception):
+        return b"-ERR %s\r\n" % str(value).encode()
+    if isinstance(value, str):
+        return b"+%s\r\n" % value.encode()
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+def _get(key):
+    entry = store.get(key)
+    if entry is None:
+        return None
+    value, expires_at = entry
+    if expires_at is not None and expires_at <= time.monotonic():
+        del store[key]
+        return None
+    return value
+
+
+def execute(args):
+    command = args[0].upper()
+    if command in (b"PING", b"AUTH", b"SELECT"):
+        return "PONG" if command == b"PING" else "OK"
+    if command == b"GET":
+        return _get(args[1])
+    if command == b"SET":
+        expires_at = None
+        options = [a.upper() for a in args[3:]]
+        if b"EX" in options:
+            expires_at = time.monotonic() + int(args[3 + options.index(b"EX") + 1])
+        if b"PX" in options:
+            expires_at = time.monotonic() + int(args[3 + options.index(b"PX") + 1]) / 1000
+        store[args[1]] = (args[2], expires_at)
+        return "OK"
+    if command == b"DEL":
+        return sum(1 for key in args[1:] if _get(key) is not None and store.pop(key, None) is not None)
+    if command == b"INCR":
+        value = int(_get(args[1]) or 0) + 1
+        expires_at = store.get(args[1], (None, None))[1]
+        store[args[1]] = (str(value).encode(), expires_at)
+        return value
+    if command == b"FLUSHALL":
+        store.clear()
+        return "OK"
+    return ValueError(f"unknown command '{command.decode()}'")
+
+
+async def read_command(reader):
+    line = await reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b"*"):
+        # Inline command (e.g. typed into telnet)
+        return line.split()
+    args = []
+    for _ in range(int(line[1:-2])):
+        length = int((await reader.readline())[1:-2])
+        args.append((await reader.readexactly(length + 2))[:-2])
+    return args
+
+
+async def handle(reader, writer):
+    try:
+        while True:
+            args = await read_command(reader)
+            if args is None:
+                break
+            if args:
+                writer.write(_encode(execute(args)))
+                await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6379)
+    args = parser.parse_args()
+    server = await asyncio.start_server(handle, args.host, args.port)
+    print(f"RESP stand-in listening on {args.host}:{args.port}")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Print traces recorded by shared/common/tracing.py as indented span trees
+
+Each span shows its offset from the start of the trace and its duration, so
+the critical path of a request across gateway and services is easy to read.
+
+Usage:
+    python scripts/trace_view.py <spans.jsonl> [trace_id]   # default: last trace
+    python scripts/trace_view.py <spans.jsonl> --slowest N  # N slowest traces
+"""
+import json
+import sys
+from collections import defaultdict
+
+
+def load(path):
+    traces = defaultdict(list)
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                span = json.loads(line)
+                traces[span["traceId"]].append(span)
+    return traces
+
+
+def duration_ms(span):
+    return (span["endTimeUnixNano"] - span["startTimeUnixNano"]) / 1e6
+
+
+def print_trace(trace_id, spans):
+    start = min(span["startTimeUnixNano"] for span in spans)
+    ids = {span["spanId"] for span in spans}
+    children = defaultdict(list)
+    roots = []
+    for span in spans:
+        if span["parentSpanId"] in ids:
+            children[span["parentSpanId"]].append(span)
+        else:
+            roots.append(span)
+
+    total = max(span["endTimeUnixNano"] for span in spans) - start
+    print(f"trace {trace_id}  {total / 1e6:.1f} ms, {len(spans)} spans")
+
+    def walk(span, depth):
+        offset = (span["startTimeUnixNano"] - start) / 1e6
+        detail = span["attributes"].get("db.statement") or span["attributes"].get("http.url") or ""
+        status = "" if span["status"] == "OK" else f"  [{span['status']}]"
+        print(
+            f"  {offset:8.1f} ms {duration_ms(span):8.1f} ms  {'  ' * depth}"
+            f"{span['service']}: {span['name']}{status}  {detail[:80]}"
+        )
+        for child in sorted(children[span["spanId"]], key=lambda s: s["startTimeUnixNano"]):
+            walk(child, depth + 1)
+
+    for root in sorted(roots, key=lambda s: s["startTimeUnixNano"]):
+        walk(root, 0)
+    print()
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+
+    traces = load(sys.argv[1])
+    if not traces:
+        print("No spans recorded")
+        return
+
+    def trace_duration(spans):
+        return max(s["endTimeUnixNano"] for s in spans) - min(s["startTimeUnixNano"] for s in spans)
+
+    if len(sys.argv) > 3 and sys.argv[2] == "--slowest":
+        ranked = sorted(traces.items(), key=lambda item: trace_duration(item[1]), reverse=True)
+        for trace_id, spans in ranked[:int(sys.argv[3])]:
+            print_trace(trace_id, spans)
+    elif len(sys.argv) > 2:
+        if sys.argv[2] not in traces:
+            sys.exit(f"Trace {sys.argv[2]} not found")
+        print_trace(sys.argv[2], traces[sys.argv[2]])
+    else:
+        trace_id = max(traces, key=lambda t: max(s["endTimeUnixNano"] for s in traces[t]))
+        print_trace(trace_id, traces[trace_id])
+
+
+if __name__ == "__main__":
+    main()
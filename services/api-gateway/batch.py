@@ -0,0 +1,57 @@
+"""
+Batch requests for the API Gateway
+
+POST /api/batch carries several API sub-requests in one round trip. The
+gateway authenticates the caller once, runs the sub-requests concurrently
+(bounded by GATEWAY_BATCH_CONCURRENCY) through the normal router and returns
+every result, in request order, with its own status code.
+"""
+import asyncio
+import os
+from typing import Any, Awaitable, Callable, List, Optional
+
+from pydantic import BaseModel, Field
+
+# Sub-requests in flight at once for one batch
+GATEWAY_BATCH_CONCURRENCY = int(os.getenv("GATEWAY_BATCH_CONCURRENCY", "8"))
+# Largest number of sub-requests accepted in one batch
+GATEWAY_BATCH_MAX_REQUESTS = int(os.getenv("GATEWAY_BATCH_MAX_REQUESTS", "50"))
+
+
+class BatchItem(BaseModel):
+    id: Optional[str] = None
+    method: str = "GET"
+    path: str = Field(..., description="API path including any query string, e.g. /api/bookings?status=pending")
+    body: Optional[Any] = None
+
+
+class BatchRequest(BaseModel):
+    requests: List[BatchItem]
+
+
+class BatchItemResult(BaseModel):
+    id: Optional[str] = None
+    status: int
+    body: Optional[Any] = None
+
+
+class BatchResponse(BaseModel):
+    responses: List[BatchItemResult]
+
+
+async def run_batch(
+    items: List[BatchItem],
+    execute: Callable[[BatchItem], Awaitable[BatchItemResult]],
+    concurrency: int = GATEWAY_BATCH_CONCURRENCY,
+) -> List[BatchItemResult]:
+    """Run execute() for every item with at most `concurrency` in flight, keeping order"""
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def bounded(item: BatchItem) -> BatchItemResult:
+        async with semaphore:
+            try:
+                return await execute(item)
+            except Exception as e:
+                return BatchItemResult(id=item.id, status=500, body={"detail": f"Batch item failed: {e}"})
+
+    return list(await asyncio.gather(*(bounded(item) for item in items)))
@@ -0,0 +1,64 @@
+"""
+Single-flight request coalescing for the API Gateway
+
+Concurrent identical idempotent requests share one in-flight upstream call:
+the first caller (the leader) starts it, later callers with the same key wait
+for the same result instead of sending their own request.
+"""
+import asyncio
+import hashlib
+from typing import Awaitable, Callable, Dict, Hashable, Iterable, Optional, Tuple, TypeVar
+from urllib.parse import urlencode
+
+T = TypeVar("T")
+
+
+def coalescing_key(
+    method: str,
+    url: str,
+    query_items: Iterable[Tuple[str, str]],
+    authorization: Optional[str],
+    accept: Optional[str] = None,
+) -> Tuple[str, str, str, str, str]:
+    """Requests only share a result when method, URL, query, Accept and auth scope match"""
+    # Responses may be user-specific, so the auth scope is the caller's own token
+    scope = hashlib.sha256(authorization.encode("utf-8")).hexdigest() if authorization else ""
+    return (method, url, urlencode(sorted(query_items)), accept or "", scope)
+
+
+class SingleFlight:
+    """Run at most one call per key at a time and share its outcome"""
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, "asyncio.Task"] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, call: Callable[[], Awaitable[T]]) -> T:
+        task = self._inflight.get(key)
+        if task is None:
+            self.leaders += 1
+            # The upstream call runs in its own task so a disconnecting leader
+            # does not cancel it for the followers
+            task = asyncio.ensure_future(call())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _finished(self, key: Hashable, task: "asyncio.Task"):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the exception as retrieved even if every waiter went away
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict:
+        total = self.leaders + self.coalesced
+        return {
+            "in_flight": len(self._inflight),
+            "upstream_calls": self.leaders,
+            "coalesced": self.coalesced,
+            "coalesced_ratio": round(self.coalesced / total, 4) if total else 0.0,
+        }
@@ -0,0 +1,154 @@
+"""
+Adaptive concurrency limiting and priority-aware load shedding per upstream
+
+Each upstream has an in-flight limit that adapts to its latency (AIMD with a
+latency gradient): while the recent average round-trip time stays close to
+the upstream's long-term average the limit grows additively; when it climbs
+past GATEWAY_LIMIT_TOLERANCE times that baseline, or calls fail, it is cut
+multiplicatively. Averages rather than the fastest call are compared because
+one upstream serves routes of very different cost (GET /rooms/{id} next to
+/rooms/available). The limit only moves while at least half of it is in use:
+latency measured at light load says nothing about how much concurrency the
+upstream can take. Requests beyond the limit are shed at once rather than
+queued.
+
+Priority classes reserve headroom: low-priority traffic (reports, catalog
+reads) may only use part of the limit, so booking and payment writes are the
+last to be shed.
+"""
+import os
+import time
+from contextvars import ContextVar
+
+from metrics import CONCURRENCY_LIMIT, SHED
+
+CRITICAL = "critical"  # booking and payment writes
+NORMAL = "normal"
+LOW = "low"  # reports and catalog reads
+
+GATEWAY_LIMIT_ENABLED = os.getenv("GATEWAY_LIMIT_ENABLED", "true").strip().lower() in ("1", "true", "yes", "on")
+GATEWAY_LIMIT_INITIAL = int(os.getenv("GATEWAY_LIMIT_INITIAL", "50"))
+GATEWAY_LIMIT_MIN = int(os.getenv("GATEWAY_LIMIT_MIN", "5"))
+GATEWAY_LIMIT_TOLERANCE = float(os.getenv("GATEWAY_LIMIT_TOLERANCE", "2.0"))
+GATEWAY_LIMIT_BACKOFF = float(os.getenv("GATEWAY_LIMIT_BACKOFF", "0.9"))
+# Share of the current limit each priority class may occupy
+PRIORITY_SHARE = {
+    CRITICAL: 1.0,
+    NORMAL: float(os.getenv("GATEWAY_LIMIT_SHARE_NORMAL", "0.8")),
+    LOW: float(os.getenv("GATEWAY_LIMIT_SHARE_LOW", "0.5")),
+}
+
+# Priority of the request being handled; read when an upstream lease is taken
+current_priority: ContextVar[str] = ContextVar("current_priority", default=NORMAL)
+
+# Samples averaged (exponentially) into the recent round-trip time, and into
+# the long-term baseline it is compared with
+_RTT_SHORT_WINDOW = 10
+_RTT_LONG_WINDOW = 500
+
+
+class LoadShedError(Exception):
+    """Raised instead of sending a request that is over the upstream's limit"""
+
+    def __init__(self, name: str, priority: str, retry_after: float):
+        super().__init__(f"{name} is over its concurrency limit ({priority} priority request shed)")
+        self.name = name
+        self.priority = priority
+        self.retry_after = retry_after
+        # Low-priority callers are asked to slow down; anything else means the
+        # upstream itself is saturated
+        self.status_code = 429 if priority == LOW else 503
+
+
+class AdaptiveLimiter:
+    """AIMD in-flight limit for one upstream"""
+
+    def __init__(
+        self,
+        name: str,
+        max_limit: int,
+        initial_limit: int = GATEWAY_LIMIT_INITIAL,
+        min_limit: int = GATEWAY_LIMIT_MIN,
+        enabled: bool = GATEWAY_LIMIT_ENABLED,
+    ):
+        self.name = name
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = float(min(max(initial_limit, self.min_limit), self.max_limit))
+        self.enabled = enabled
+        self.in_flight = 0
+        self.shed = {CRITICAL: 0, NORMAL: 0, LOW: 0}
+
+        self._rtt = None
+        self._baseline_rtt = None
+        self._samples = 0
+        self._last_decrease = 0.0
+        CONCURRENCY_LIMIT.set(name, value=int(self.limit))
+
+    def acquire(self, priority: str):
+        """Admit one request of the given priority or raise LoadShedError"""
+        if self.enabled and self.in_flight >= max(1.0, self.limit * PRIORITY_SHARE.get(priority, 1.0)):
+            self.shed[priority] = self.shed.get(priority, 0) + 1
+            SHED.inc(self.name, priority)
+            raise LoadShedError(self.name, priority, self._retry_after())
+        self.in_flight += 1
+
+    def release(self):
+        self.in_flight -= 1
+
+    def on_sample(self, rtt: float, failed: bool = False):
+        """Adjust the limit from one completed call (time to response headers)"""
+        if not failed:
+            self._track_rtt(rtt)
+
+        # Neither grow nor cut while the limit is barely used
+        if self.in_flight + 1 < self.limit * 0.5:
+            return
+
+        now = time.monotonic()
+        if failed or self._slowed_down():
+            # At most one cut per round trip, so a burst of slow responses to
+            # requests sent under the old limit does not collapse it
+            if now - self._last_decrease >= max(rtt, 0.05):
+                self.limit = max(self.min_limit, self.limit * GATEWAY_LIMIT_BACKOFF)
+                self._last_decrease = now
+        else:
+            self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+        CONCURRENCY_LIMIT.set(self.name, value=int(self.limit))
+
+    def _track_rtt(self, rtt: float):
+        # Plain means until the windows are full, then exponential ones; the
+        # baseline follows a lasting change of the upstream's normal latency
+        self._samples += 1
+        if self._rtt is None:
+            self._rtt = self._baseline_rtt = rtt
+            return
+        self._rtt += max(2.0 / (_RTT_SHORT_WINDOW + 1), 1.0 / self._samples) * (rtt - self._rtt)
+        self._baseline_rtt += max(1.0 / _RTT_LONG_WINDOW, 1.0 / self._samples) * (rtt - self._baseline_rtt)
+
+    def _slowed_down(self) -> bool:
+        return self._samples >= _RTT_SHORT_WINDOW and self._rtt > self._baseline_rtt * GATEWAY_LIMIT_TOLERANCE
+
+    def _retry_after(self) -> float:
+        return max(1.0, (self._baseline_rtt or 0.0) * 10)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "limit": round(self.limit, 2),
+            "min_limit": self.min_limit,
+            "max_limit": self.max_limit,
+            "in_flight": self.in_flight,
+            "rtt": round(self._rtt, 4) if self._rtt is not None else None,
+            "baseline_rtt": round(self._baseline_rtt, 4) if self._baseline_rtt is not None else None,
+            "shed": dict(self.shed),
+        }
+
+
+def classify(service: str, method: str, public: bool) -> str:
+    """Priority class of a gateway request"""
+    if service in ("booking", "payment") and method != "GET":
+        return CRITICAL
+    if service == "report" or (public and method == "GET"):
+        return LOW
+    return NORMAL
@@ -3,18 +3,48 @@ API Gateway - Single entry point for all services
 """
 from fastapi import FastAPI, Request, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, RedirectResponse, HTMLResponse, FileResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import JSONResponse, RedirectResponse, HTMLResponse, FileResponse, StreamingResponse, Response
+from starlette.background import BackgroundTask
+import asyncio
 import httpx
+import json
+import logging
+import math
 import os
-from typing import Optional
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import date
+from typing import Any, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
 import sys
 from pathlib import Path
 
 # Add parent directory to path to import shared modules
 sys.path.append(os.path.join(os.path.dirname(__file__), '../../'))
 
-from shared.utils.jwt_handler import verify_token
+from upstream import BufferedResponse, GATEWAY_UPSTREAM_TIMEOUT, UpstreamPools, end_to_end_headers
+from router import GatewayRouter, ANY_METHOD
+from token_cache import VerifiedTokenCache
+from response_cache import ResponseCache, is_cacheable, stale_paths
+from coalescing import SingleFlight, coalescing_key
+from concurrency import LoadShedError, classify, current_priority
+from batch import (
+    BatchItem, BatchItemResult, BatchRequest, BatchResponse, GATEWAY_BATCH_MAX_REQUESTS, run_batch
+)
+from metrics import MetricsMiddleware, label_route, registry
+from static_cache import StaticAssetCache
+from shared.utils.identity import IDENTITY_HEADER, sign_identity
+from shared.utils.circuit_breaker import CircuitOpenError, breakers
+from shared.common.compression import CompressionMiddleware
+from shared.common.deadline import DeadlineExceeded, DeadlineMiddleware
+from shared.common.tracing import TracingMiddleware
+
+# Leveled logging replaces the old unconditional prints; per-request details
+# are DEBUG so the hot path stays quiet unless GATEWAY_LOG_LEVEL asks for them
+GATEWAY_LOG_LEVEL = os.getenv("GATEWAY_LOG_LEVEL", "WARNING").strip().upper()
+logging.basicConfig(format="%(asctime)s [API Gateway] %(levelname)s %(message)s")
+logger = logging.getLogger("api-gateway")
+logger.setLevel(GATEWAY_LOG_LEVEL)
 
 app = FastAPI(
     title="API Gateway",
@@ -31,7 +61,26 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Mount static files (CSS, JS, images, etc.)
+# X-Request-Deadline from clients is honoured up to the upstream timeout, which
+# is also the budget of requests without one; upstream calls get what is left
+app.add_middleware(
+    DeadlineMiddleware,
+    default_budget=GATEWAY_UPSTREAM_TIMEOUT,
+    max_budget=GATEWAY_UPSTREAM_TIMEOUT,
+)
+
+# gzip/brotli for large JSON answered by the gateway itself (views, batch,
+# cached catalog reads); bodies relayed already compressed pass through
+app.add_middleware(CompressionMiddleware)
+
+# Per-route latency, upstream/overhead split and status counters (served at /metrics)
+app.add_middleware(MetricsMiddleware)
+
+# Starts (or continues) the W3C trace of every request; upstream calls carry
+# its traceparent and the response a Server-Timing entry per hop
+app.add_middleware(TracingMiddleware, service_name="api-gateway")
+
+# Locate frontend files (HTML, CSS, JS, images, etc.)
 # Frontend files are copied to /app/frontend in Dockerfile
 # Try multiple paths: first check if frontend is in same directory, then check parent
 FRONTEND_DIR = None
@@ -46,33 +95,19 @@ for path in possible_paths:
     if path.exists():
         if (path / "index.html").exists() or (path / "html" / "index.html").exists():
             FRONTEND_DIR = path
-            print(f"[API Gateway] ✅ Found FRONTEND_DIR: {FRONTEND_DIR}")
+            logger.info("Found FRONTEND_DIR: %s", FRONTEND_DIR)
             break
         else:
-            print(f"[API Gateway] ⚠️ Path exists but no index.html: {path}")
-    else:
-        print(f"[API Gateway] ⚠️ Path does not exist: {path}")
-
-if FRONTEND_DIR and FRONTEND_DIR.exists():
-    # Mount static assets (CSS, JS)
-    # IMPORTANT: Mount routes must be registered BEFORE catch-all routes
-    css_dir = FRONTEND_DIR / "css"
-    js_dir = FRONTEND_DIR / "js"
-    if css_dir.exists():
-        css_files = list(css_dir.glob("*.css"))
-        print(f"[API Gateway] ✅ Mounting CSS directory: {css_dir}")
-        print(f"[API Gateway] ✅ CSS files found: {[f.name for f in css_files]}")
-        app.mount("/css", StaticFiles(directory=str(css_dir)), name="css")
+            logger.debug("Path exists but no index.html: %s", path)
     else:
-        print(f"[API Gateway] ❌ WARNING: CSS directory not found: {css_dir}")
-    if js_dir.exists():
-        print(f"[API Gateway] ✅ Mounting JS directory: {js_dir}")
-        app.mount("/js", StaticFiles(directory=str(js_dir)), name="js")
-    else:
-        print(f"[API Gateway] ❌ WARNING: JS directory not found: {js_dir}")
-else:
-    print(f"[API Gateway] ❌ WARNING: FRONTEND_DIR not found or invalid")
-    print(f"[API Gateway] Tried paths: {possible_paths}")
+        logger.debug("Path does not exist: %s", path)
+
+if not FRONTEND_DIR:
+    logger.warning("FRONTEND_DIR not found or invalid, tried: %s", possible_paths)
+
+# Frontend files (HTML, CSS, JS, images) are served from an in-memory cache
+# filled at startup, see static_cache.py
+static_cache = StaticAssetCache(FRONTEND_DIR)
 
 # Service URLs
 AUTH_SERVICE_URL = os.getenv("AUTH_SERVICE_URL", "http://auth-service:8000")
@@ -82,25 +117,89 @@ BOOKING_SERVICE_URL = os.getenv("BOOKING_SERVICE_URL", "http://booking-service:8
 PAYMENT_SERVICE_URL = os.getenv("PAYMENT_SERVICE_URL", "http://payment-service:8000")
 REPORT_SERVICE_URL = os.getenv("REPORT_SERVICE_URL", "http://report-service:8000")
 
-# Service routing map - Map API paths to service URLs
+UPSTREAM_SERVICES = {
+    "auth": AUTH_SERVICE_URL,
+    "customer": CUSTOMER_SERVICE_URL,
+    "room": ROOM_SERVICE_URL,
+    "booking": BOOKING_SERVICE_URL,
+    "payment": PAYMENT_SERVICE_URL,
+    "report": REPORT_SERVICE_URL,
+}
+
+# Service routing map - Map API paths to services in UPSTREAM_SERVICES
 SERVICE_ROUTES = {
-    "/api/auth": AUTH_SERVICE_URL,
-    "/api/users": AUTH_SERVICE_URL,  # User management routes to auth service
-    "/api/customers": CUSTOMER_SERVICE_URL,
-    "/api/rooms": ROOM_SERVICE_URL,
-    "/api/bookings": BOOKING_SERVICE_URL,
-    "/api/payments": PAYMENT_SERVICE_URL,
-    "/api/reports": REPORT_SERVICE_URL,
+    "/api/auth": "auth",
+    "/api/users": "auth",  # User management routes to auth service
+    "/api/customers": "customer",
+    "/api/rooms": "room",
+    "/api/room-types": "room",
+    "/api/bookings": "booking",
+    "/api/payments": "payment",
+    "/api/reports": "report",
     # Legacy routes without /api prefix (for backward compatibility)
-    "/auth": AUTH_SERVICE_URL,
-    "/users": AUTH_SERVICE_URL,
-    "/customers": CUSTOMER_SERVICE_URL,
-    "/rooms": ROOM_SERVICE_URL,
-    "/bookings": BOOKING_SERVICE_URL,
-    "/payments": PAYMENT_SERVICE_URL,
-    "/reports": REPORT_SERVICE_URL,
+    "/auth": "auth",
+    "/users": "auth",
+    "/customers": "customer",
+    "/rooms": "room",
+    "/bookings": "booking",
+    "/payments": "payment",
+    "/reports": "report",
+}
+
+PROXY_METHODS = ("GET", "POST", "PUT", "PATCH", "DELETE")
+BODY_METHODS = ("POST", "PUT", "PATCH")
+
+# Largest request body the gateway will forward (default 10 MiB)
+GATEWAY_MAX_BODY_SIZE = int(os.getenv("GATEWAY_MAX_BODY_SIZE", str(10 * 1024 * 1024)))
+
+# "stream" forwards upstream bytes unchanged; "buffered" parses and re-serializes JSON
+GATEWAY_RESPONSE_MODE = os.getenv("GATEWAY_RESPONSE_MODE", "stream").strip().lower()
+
+# Endpoints reachable without a JWT: route prefix -> {first sub-segment: methods}
+# ("" matches the bare prefix, "*" any sub-path)
+# - /api/auth/login, /api/auth/register (authentication), POST /api/auth
+# - GET /api/rooms, GET /api/rooms/{id}, GET /api/room-types (public room listing)
+PUBLIC_ENDPOINTS = {
+    "/api/auth": {"login": ANY_METHOD, "register": ANY_METHOD, "": ("POST",)},
+    "/api/rooms": {"*": ("GET",)},
+    "/api/room-types": {"*": ("GET",)},
 }
 
+# Routes and auth policy compiled once into a prefix trie
+gateway_router = GatewayRouter(SERVICE_ROUTES, UPSTREAM_SERVICES, PUBLIC_ENDPOINTS)
+
+# Long-lived connection pools, one per backend service
+upstream_pools = UpstreamPools(UPSTREAM_SERVICES)
+
+# Forward HMAC-signed identity claims (X-Verified-Identity) with verified requests
+# so backend services can skip decoding the JWT again
+GATEWAY_FORWARD_IDENTITY = os.getenv("GATEWAY_FORWARD_IDENTITY", "false").strip().lower() in ("1", "true", "yes", "on")
+
+# Decoded payloads of already-verified JWTs, valid until each token's exp
+token_cache = VerifiedTokenCache()
+
+# Public catalog reads (rooms, room types) cached at the gateway
+GATEWAY_CACHE_ENABLED = os.getenv("GATEWAY_CACHE_ENABLED", "true").strip().lower() in ("1", "true", "yes", "on")
+GATEWAY_CACHE_TTL_ROOMS = float(os.getenv("GATEWAY_CACHE_TTL_ROOMS", "10"))
+GATEWAY_CACHE_TTL_ROOM_TYPES = float(os.getenv("GATEWAY_CACHE_TTL_ROOM_TYPES", "60"))
+response_cache = ResponseCache()
+
+# Opt-in: identical concurrent GETs (same URL, query and token) share one upstream call
+GATEWAY_COALESCE_GETS = os.getenv("GATEWAY_COALESCE_GETS", "false").strip().lower() in ("1", "true", "yes", "on")
+single_flight = SingleFlight()
+
+
+@app.on_event("startup")
+async def startup_event():
+    await upstream_pools.start()
+    loaded = static_cache.load()
+    logger.info("Loaded %d frontend files into the static cache (%s)", loaded, static_cache.stats())
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await upstream_pools.close()
+
 
 async def proxy_request(
     service_url: str,
@@ -109,95 +208,283 @@ async def proxy_request(
     request: Request,
     headers: Optional[dict] = None
 ):
-    """Proxy request to backend service"""
-    try:
-        # Get request body if exists
-        body = None
-        if method in ["POST", "PUT", "PATCH"]:
-            try:
-                body = await request.json()
-            except:
-                body = await request.body()
-        
-        # Prepare headers
-        forward_headers = {}
-        if headers:
-            forward_headers.update(headers)
-        
-        # Forward authorization header
-        auth_header = request.headers.get("Authorization")
-        if auth_header:
-            forward_headers["Authorization"] = auth_header
+    """Proxy request to backend service
+
+    In streaming mode (GATEWAY_RESPONSE_MODE=stream, the default) the upstream
+    body is forwarded chunk by chunk without being decoded, so gateway memory
+    stays flat regardless of payload size. GATEWAY_RESPONSE_MODE=buffered keeps
+    the previous behaviour of parsing and re-serializing the JSON body.
+    """
+    if method not in PROXY_METHODS:
+        raise HTTPException(status_code=405, detail=f"Method {method} not allowed")
+
+    forward_headers = _forward_headers(request, headers)
+
+    # Request bodies are streamed to the upstream byte for byte, never decoded
+    content = None
+    if method in BODY_METHODS:
+        content_length = _declared_content_length(request)
+        if content_length is not None:
+            forward_headers["Content-Length"] = str(content_length)
+        content = _limited_request_body(request)
+
+    with upstream_errors(service_url):
+        # Raw upstream bytes are passed through as-is in streaming mode, so only
+        # ask for an encoding the client itself accepts; the upstream compresses
+        # and CompressionMiddleware leaves the already-encoded body alone.
+        # Buffered mode re-serializes the body, so it is fetched uncompressed
+        # and compressed once, on the way out.
+        if GATEWAY_RESPONSE_MODE == "stream":
+            forward_headers["Accept-Encoding"] = request.headers.get("Accept-Encoding") or "identity"
+        else:
+            forward_headers["Accept-Encoding"] = "identity"
         
-        # Forward other important headers
-        for header_name in ["Content-Type", "Accept"]:
-            header_value = request.headers.get(header_name)
-            if header_value:
-                forward_headers[header_name] = header_value
+        # Make request to backend service over its pooled keep-alive client,
+        # on the replica picked by the service's load balancer
+        pool = upstream_pools.get(service_url)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "Proxying request: %s %s/%s headers=%s params=%s",
+                method, service_url, path, list(forward_headers.keys()), dict(request.query_params),
+            )
+        lease, response = await pool.stream(
+            method,
+            path,
+            params=request.query_params,
+            headers=forward_headers,
+            content=content,
+            # A body streamed from the client cannot be sent twice
+            replayable=content is None,
+        )
+
+        logger.debug("Response status: %s", response.status_code)
+
+        if GATEWAY_RESPONSE_MODE == "stream":
+            return _streaming_response(lease, response)
+
+        try:
+            await response.aread()
+        finally:
+            await lease.release(response)
+
+        # The body is decoded and re-encoded below, so upstream framing and
+        # encoding headers no longer describe it
+        response_headers = dict(end_to_end_headers(
+            response.headers, exclude=("content-length", "content-encoding", "date", "server")
+        ))
         
-        # Make request to backend service
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            url = f"{service_url.rstrip('/')}/{path.lstrip('/')}"
-            print(f"[API Gateway] Proxying request: {method} {url}")
-            print(f"[API Gateway] Headers: {list(forward_headers.keys())}")
-            print(f"[API Gateway] Query params: {dict(request.query_params)}")
-            
-            if method == "GET":
-                response = await client.get(url, headers=forward_headers, params=request.query_params)
-            elif method == "POST":
-                response = await client.post(url, json=body, headers=forward_headers, params=request.query_params)
-            elif method == "PUT":
-                response = await client.put(url, json=body, headers=forward_headers, params=request.query_params)
-            elif method == "PATCH":
-                response = await client.patch(url, json=body, headers=forward_headers, params=request.query_params)
-            elif method == "DELETE":
-                response = await client.delete(url, headers=forward_headers, params=request.query_params)
-            else:
-                raise HTTPException(status_code=405, detail=f"Method {method} not allowed")
-            
-            print(f"[API Gateway] Response status: {response.status_code}")
-            print(f"[API Gateway] Response headers: {dict(response.headers)}")
-            
-            # Return response
-            try:
-                response_data = response.json()
-                print(f"[API Gateway] Response data type: {type(response_data)}, length: {len(response_data) if isinstance(response_data, list) else 'N/A'}")
-                return JSONResponse(
-                    content=response_data,
-                    status_code=response.status_code,
-                    headers=dict(response.headers)
-                )
-            except Exception as json_error:
-                print(f"[API Gateway] Error parsing JSON response: {json_error}")
-                print(f"[API Gateway] Response text: {response.text[:200]}")
-                return JSONResponse(
-                    content={"detail": response.text},
-                    status_code=response.status_code
-                )
-    
+        # Return response
+        try:
+            response_data = response.json()
+            return JSONResponse(
+                content=response_data,
+                status_code=response.status_code,
+                headers=response_headers
+            )
+        except Exception as json_error:
+            logger.warning("Error parsing JSON response: %s (body starts %r)", json_error, response.text[:200])
+            return JSONResponse(
+                content={"detail": response.text},
+                status_code=response.status_code
+            )
+
+
+@contextmanager
+def upstream_errors(service_url: str):
+    """Translate upstream transport failures into gateway HTTP errors"""
+    try:
+        yield
+    except LoadShedError as e:
+        logger.info("Shed request to %s: %s", service_url, e)
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=f"Service busy - {e}",
+            headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))}
+        )
+    except CircuitOpenError as e:
+        logger.info("Rejected request to %s: %s", service_url, e)
+        raise HTTPException(
+            status_code=503,
+            detail=f"Service unavailable - {e}",
+            headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))}
+        )
+    except DeadlineExceeded as e:
+        logger.info("Deadline exceeded before calling %s", service_url)
+        raise HTTPException(
+            status_code=504,
+            detail="Gateway timeout - request deadline exceeded"
+        )
     except httpx.TimeoutException as e:
-        print(f"[API Gateway] Timeout error: {e}")
+        logger.warning("Timeout error from %s: %s", service_url, e)
         raise HTTPException(
             status_code=504,
             detail="Gateway timeout - Service did not respond in time"
         )
     except httpx.ConnectError as e:
-        print(f"[API Gateway] Connection error: {e}")
-        print(f"[API Gateway] Failed to connect to: {service_url}")
+        logger.warning("Failed to connect to %s: %s", service_url, e)
         raise HTTPException(
             status_code=503,
             detail=f"Service unavailable - Cannot connect to backend service at {service_url}"
         )
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"[API Gateway] Unexpected error in proxy_request: {type(e).__name__}: {e}")
-        import traceback
-        print(f"[API Gateway] Traceback: {traceback.format_exc()}")
+        logger.exception("Unexpected error proxying to %s: %s: %s", service_url, type(e).__name__, e)
         raise HTTPException(
             status_code=500,
             detail=f"Gateway error: {str(e)}"
         )
 
 
+def _forward_headers(request: Request, headers: Optional[dict] = None) -> dict:
+    """Headers sent upstream: caller extras plus the client's auth and content negotiation"""
+    forward_headers = {}
+    if headers:
+        forward_headers.update(headers)
+    
+    # Forward authorization header
+    auth_header = request.headers.get("Authorization")
+    if auth_header:
+        forward_headers["Authorization"] = auth_header
+    
+    # Forward other important headers
+    for header_name in ["Content-Type", "Accept"]:
+        header_value = request.headers.get(header_name)
+        if header_value:
+            forward_headers[header_name] = header_value
+    return forward_headers
+
+
+async def fetch_upstream(
+    service_url: str,
+    path: str,
+    method: str = "GET",
+    params=None,
+    headers: Optional[dict] = None,
+    content=None,
+) -> BufferedResponse:
+    """Call a backend service and read the whole response (for cached or composed responses)"""
+    pool = upstream_pools.get(service_url)
+    logger.debug("Fetching: %s %s/%s", method, service_url.rstrip("/"), path.lstrip("/"))
+    with upstream_errors(service_url):
+        return await pool.fetch(method, path, params=params, headers=headers, content=content)
+
+
+async def coalesced_fetch(
+    service_url: str,
+    path: str,
+    request: Request,
+    headers: Optional[dict] = None,
+) -> BufferedResponse:
+    """GET an upstream resource, sharing the call with identical concurrent
+    requests when GATEWAY_COALESCE_GETS is enabled"""
+    forward_headers = _forward_headers(request, headers)
+
+    def fetch():
+        return fetch_upstream(service_url, path, params=request.query_params, headers=forward_headers)
+
+    if not GATEWAY_COALESCE_GETS:
+        return await fetch()
+
+    key = coalescing_key(
+        "GET",
+        f"{service_url.rstrip('/')}/{path.lstrip('/')}",
+        request.query_params.multi_items(),
+        request.headers.get("Authorization"),
+        request.headers.get("Accept"),
+    )
+    return await single_flight.do(key, fetch)
+
+
+def buffered_to_response(result: BufferedResponse) -> Response:
+    response = Response(content=result.body, status_code=result.status_code)
+    for name, value in result.headers:
+        response.headers.append(name, value)
+    return response
+
+
+async def cached_proxy_request(service_url: str, path: str, request: Request) -> Response:
+    """Serve a public catalog GET from the response cache, filling it on a miss"""
+    key = response_cache.key(path, request.query_params.multi_items())
+    if_none_match = request.headers.get("If-None-Match")
+
+    entry = response_cache.get(key)
+    if entry is not None:
+        return entry.to_response(if_none_match, "HIT")
+
+    result = await coalesced_fetch(service_url, path, request)
+    if result.status_code != 200:
+        return buffered_to_response(result)
+
+    entry = response_cache.put(key, result, catalog_ttl(path))
+    return entry.to_response(if_none_match, "MISS")
+
+
+def catalog_ttl(path: str) -> float:
+    return GATEWAY_CACHE_TTL_ROOM_TYPES if path.startswith("room-types") else GATEWAY_CACHE_TTL_ROOMS
+
+
+def _declared_content_length(request: Request) -> Optional[int]:
+    """Validate the client's Content-Length against GATEWAY_MAX_BODY_SIZE"""
+    value = request.headers.get("Content-Length")
+    if value is None:
+        return None
+    try:
+        length = int(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid Content-Length header")
+    if length < 0:
+        raise HTTPException(status_code=400, detail="Invalid Content-Length header")
+    if length > GATEWAY_MAX_BODY_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Request body too large (limit {GATEWAY_MAX_BODY_SIZE} bytes)"
+        )
+    return length
+
+
+async def _limited_request_body(request: Request):
+    """Yield the client request body as it arrives
+
+    Chunks are pulled from the client only as fast as the upstream connection
+    accepts them, so a slow backend applies back-pressure to the client rather
+    than the gateway buffering the body. Chunked uploads without a
+    Content-Length are cut off once they exceed GATEWAY_MAX_BODY_SIZE.
+    """
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > GATEWAY_MAX_BODY_SIZE:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Request body too large (limit {GATEWAY_MAX_BODY_SIZE} bytes)"
+            )
+        if chunk:
+            yield chunk
+
+
+def _streaming_response(lease, response: httpx.Response) -> StreamingResponse:
+    """Forward an open upstream response to the client chunk by chunk"""
+
+    async def body():
+        try:
+            async for chunk in response.aiter_raw():
+                yield chunk
+        finally:
+            await lease.release(response)
+
+    streaming = StreamingResponse(
+        body(),
+        status_code=response.status_code,
+        # Also runs when the client disconnects before the body is consumed
+        background=BackgroundTask(lease.release, response),
+    )
+    # Date and Server are set by the gateway's own HTTP server
+    for name, value in end_to_end_headers(response.headers, exclude=("date", "server")):
+        streaming.headers.append(name, value)
+    return streaming
+
+
 def get_service_url(path: str) -> Optional[tuple]:
     """Determine which service to route to based on path
     Returns: (service_url, stripped_path) or None
@@ -208,61 +495,10 @@ def get_service_url(path: str) -> Optional[tuple]:
     - /api/auth/login -> (AUTH_SERVICE_URL, "login")
     - /api/rooms/1 -> (ROOM_SERVICE_URL, "rooms/1")
     """
-    # Sort by length (longest first) to match /api/auth before /api
-    sorted_routes = sorted(SERVICE_ROUTES.items(), key=lambda x: len(x[0]), reverse=True)
-    
-    for route_prefix, service_url in sorted_routes:
-        if path.startswith(route_prefix):
-            # Strip the prefix from path when forwarding to service
-            stripped_path = path[len(route_prefix):].lstrip('/')
-            print(f"[API Gateway] Routing: path={path}, route_prefix={route_prefix}, stripped_path={stripped_path}")
-            
-            # Special handling for /api/users -> forward to /users in auth service
-            if route_prefix == "/api/users":
-                # Forward to /users/{id} in auth service
-                if stripped_path:
-                    stripped_path = f"users/{stripped_path}"
-                else:
-                    stripped_path = "users"
-            # For /api/auth, just forward the path after /api/auth (e.g., login -> /login)
-            # Auth service already has routes like /login, /register, etc.
-            elif route_prefix == "/api/auth":
-                # Forward directly (e.g., /api/auth/login -> /login)
-                # No need to add "auth/" prefix
-                pass
-            # Special handling for /api/rooms - some endpoints don't need prefix
-            elif route_prefix == "/api/rooms":
-                # Endpoints like /room-types, /available don't need "rooms/" prefix
-                # They are direct endpoints in room service
-                if not stripped_path:
-                    # Empty path -> /api/rooms -> forward to /rooms
-                    stripped_path = "rooms"
-                elif stripped_path.startswith("room-types"):
-                    # Forward directly without adding "rooms/" prefix
-                    pass
-                elif stripped_path == "available" or stripped_path.startswith("available?"):
-                    # Forward directly without adding "rooms/" prefix
-                    pass
-                elif stripped_path.endswith("/availability") or stripped_path.endswith("/status"):
-                    # For /{id}/availability and /{id}/status, forward directly
-                    pass
-                elif stripped_path and not stripped_path.startswith("rooms/"):
-                    # For other paths like /{id}, add "rooms/" prefix
-                    stripped_path = f"rooms/{stripped_path}"
-            # For other /api/* routes, add service name prefix
-            elif route_prefix.startswith("/api/"):
-                # Extract service name from prefix (e.g., /api/bookings -> bookings)
-                service_name = route_prefix[5:]  # Remove "/api/"
-                if stripped_path:
-                    stripped_path = f"{service_name}/{stripped_path}"
-                else:
-                    # For empty path (e.g., /api/customers -> /customers)
-                    stripped_path = service_name
-                print(f"[API Gateway] Service routing: service_name={service_name}, stripped_path={stripped_path}")
-            
-            print(f"[API Gateway] Final routing: service_url={service_url}, final_path={stripped_path}")
-            return (service_url, stripped_path)
-    return None
+    match = gateway_router.match(path)
+    if match is None:
+        return None
+    return (match.service_url, match.path)
 
 
 def extract_token_from_request(request: Request) -> Optional[str]:
@@ -280,25 +516,21 @@ def verify_jwt_auth(request: Request) -> dict:
     token = extract_token_from_request(request)
     
     if not token:
-        print("[API Gateway] JWT verification failed: No token provided")
+        logger.debug("JWT verification failed: No token provided")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Missing authentication token. Please provide Authorization: Bearer <token>"
         )
     
-    # Debug: Log token preview
-    print(f"[API Gateway] Verifying JWT token: {token[:30]}...")
-    
-    payload = verify_token(token)
+    payload = token_cache.verify(token)
     if not payload:
-        print(f"[API Gateway] JWT verification failed: Invalid or expired token")
-        print(f"[API Gateway] Token preview: {token[:50]}...")
+        logger.info("JWT verification failed: Invalid or expired token")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid or expired token"
         )
     
-    print(f"[API Gateway] JWT verified successfully. User ID: {payload.get('sub')}, Roles: {payload.get('roles')}")
+    logger.debug("JWT verified. User ID: %s, Roles: %s", payload.get("sub"), payload.get("roles"))
     return payload
 
 
@@ -312,6 +544,48 @@ async def health_check():
     }
 
 
+@app.get("/gateway/pools")
+async def pool_stats():
+    """Connection pool usage for each upstream service"""
+    return upstream_pools.stats()
+
+
+@app.get("/gateway/token-cache")
+async def token_cache_stats():
+    """Hit/miss counters and size of the verified-token cache"""
+    return token_cache.stats()
+
+
+@app.get("/gateway/cache")
+async def response_cache_stats():
+    """Size and hit/miss counters of the catalog response cache"""
+    return response_cache.stats()
+
+
+@app.get("/gateway/coalescing")
+async def coalescing_stats():
+    """How many GETs were served by sharing another request's upstream call"""
+    return {"enabled": GATEWAY_COALESCE_GETS, **single_flight.stats()}
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics in the text exposition format"""
+    return Response(content=registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/gateway/breakers")
+async def breaker_stats():
+    """Circuit breaker state for each upstream"""
+    return breakers.stats()
+
+
+@app.get("/gateway/static")
+async def static_cache_stats():
+    """Files and bytes held by the in-memory frontend cache"""
+    return static_cache.stats()
+
+
 @app.get("/")
 async def root(request: Request):
     """
@@ -355,7 +629,7 @@ async def redirect_endpoint(request: Request):
     
     try:
         # Verify token
-        payload = verify_token(token)
+        payload = token_cache.verify(token)
         if not payload:
             return JSONResponse(
                 content={
@@ -383,18 +657,14 @@ async def redirect_endpoint(request: Request):
                 # Single role as string
                 roles = [roles_raw.lower().strip()]
         
-        # Debug logging
-        print(f"[Redirect Endpoint] Token verified. roles_raw: {roles_raw}, normalized roles: {roles}")
+        logger.debug("Redirect: token verified. roles_raw: %s, normalized roles: %s", roles_raw, roles)
         
         # Check if user has admin role (case-insensitive)
         admin_roles = ["admin", "manager", "receptionist"]
         is_admin = any(role.lower() in admin_roles for role in roles)
         
-        print(f"[Redirect Endpoint] is_admin: {is_admin}, roles: {roles}")
-        
         if is_admin:
             redirect_url = "/admin/admin.html#dashboard"
-            print(f"[Redirect Endpoint] Redirecting admin to: {redirect_url}")
             return JSONResponse(
                 content={
                     "redirect": "admin",
@@ -407,7 +677,6 @@ async def redirect_endpoint(request: Request):
             )
         else:
             redirect_url = "/user/user.html#home"
-            print(f"[Redirect Endpoint] Redirecting user to: {redirect_url}")
             return JSONResponse(
                 content={
                     "redirect": "user",
@@ -422,8 +691,7 @@ async def redirect_endpoint(request: Request):
     except Exception as e:
         import traceback
         error_trace = traceback.format_exc()
-        print(f"[Redirect Endpoint] Error: {str(e)}")
-        print(f"[Redirect Endpoint] Traceback: {error_trace}")
+        logger.error("Redirect endpoint error: %s\n%s", e, error_trace)
         return JSONResponse(
                 content={
                     "redirect": "login",
@@ -436,178 +704,255 @@ async def redirect_endpoint(request: Request):
             )
 
 
-# Serve frontend HTML files
-@app.get("/index.html")
-async def serve_index():
-    """Serve index.html - Entry point từ html/index.html"""
-    if not FRONTEND_DIR:
-        raise HTTPException(status_code=500, detail="Frontend directory not found")
-    
-    # Entry point: html/index.html (theo cấu trúc dự án)
-    index_paths = [
-        FRONTEND_DIR / "html" / "index.html",  # Ưu tiên: html/index.html
-        FRONTEND_DIR / "index.html"  # Fallback: root/index.html
-    ]
-    
-    for index_path in index_paths:
-        if index_path.exists():
-            return FileResponse(str(index_path))
-    
-    raise HTTPException(status_code=404, detail="index.html not found")
-
-
-@app.get("/user.html")
-async def serve_user():
-    if not FRONTEND_DIR:
-        raise HTTPException(status_code=500, detail="Frontend not configured")
-
-    user_html = FRONTEND_DIR / "user.html"
-    if user_html.exists():
-        return FileResponse(str(user_html))
-
-    # fallback
-    html_user = FRONTEND_DIR / "html" / "user" / "user.html"
-    if html_user.exists():
-        return FileResponse(str(html_user))
+# Frontend HTML pages: route -> candidate files under FRONTEND_DIR, first match wins
+FRONTEND_PAGES = {
+    "/index.html": ("html/index.html", "index.html"),  # Entry point: html/index.html
+    "/user.html": ("user.html", "html/user/user.html"),
+    "/login.html": ("login.html", "html/login.html"),
+    "/register.html": ("register.html", "html/register.html"),
+    "/admin.html": ("admin.html", "html/admin/admin.html"),
+    "/admin/admin.html": ("html/admin/admin.html", "admin.html"),
+    "/admin/dashboard.html": ("html/admin/dashboard.html",),
+    "/admin/rooms.html": ("html/admin/rooms.html",),
+    "/admin/customers.html": ("html/admin/customers.html",),
+    "/admin/bookings.html": ("html/admin/bookings.html",),
+    "/admin/revenue.html": ("html/admin/revenue.html",),
+    "/user/user.html": ("html/user/user.html", "user.html"),
+}
 
-    raise HTTPException(status_code=404, detail="user.html not found")
 
+def serve_static_asset(asset, request: Request) -> Response:
+    label_route(request.scope, "static")
+    return static_cache.serve(asset, request.headers.get("Accept-Encoding"), request.headers.get("If-None-Match"))
 
-@app.get("/login.html")
-async def serve_login():
-    if not FRONTEND_DIR:
-        raise HTTPException(status_code=500, detail="Frontend not configured")
 
-    # Try direct path then html/login.html
-    login_html = FRONTEND_DIR / "login.html"
-    if login_html.exists():
-        return FileResponse(str(login_html))
+def _frontend_page(route: str, candidates: tuple):
+    async def serve_page(request: Request):
+        if not FRONTEND_DIR:
+            raise HTTPException(status_code=500, detail="Frontend not configured")
+        asset = static_cache.first(candidates)
+        if asset is None:
+            raise HTTPException(status_code=404, detail=f"{route.lstrip('/')} not found")
+        return serve_static_asset(asset, request)
 
-    html_login = FRONTEND_DIR / "html" / "login.html"
-    if html_login.exists():
-        return FileResponse(str(html_login))
+    serve_page.__name__ = "serve_" + route.strip("/").replace("/", "_").replace(".", "_").replace("-", "_")
+    return serve_page
 
-    raise HTTPException(status_code=404, detail="login.html not found")
 
+for _route, _candidates in FRONTEND_PAGES.items():
+    app.add_api_route(_route, _frontend_page(_route, _candidates), methods=["GET"], include_in_schema=False)
 
-@app.get("/register.html")
-async def serve_register():
-    if not FRONTEND_DIR:
-        raise HTTPException(status_code=500, detail="Frontend not configured")
 
-    # Try direct path then html/register.html
-    register_html = FRONTEND_DIR / "register.html"
-    if register_html.exists():
-        return FileResponse(str(register_html))
+@app.post("/api/batch", response_model=BatchResponse)
+async def api_batch(batch: BatchRequest, request: Request):
+    """
+    Chạy nhiều API request trong một lần gọi
+    - Xác thực JWT một lần cho cả batch
+    - Các request con chạy song song qua router (tối đa GATEWAY_BATCH_CONCURRENCY cùng lúc)
+    - Mỗi kết quả có status riêng, theo đúng thứ tự gửi lên
+    """
+    label_route(request.scope, "/api/batch")
+    if len(batch.requests) > GATEWAY_BATCH_MAX_REQUESTS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Too many requests in batch (limit {GATEWAY_BATCH_MAX_REQUESTS})"
+        )
 
-    html_register = FRONTEND_DIR / "html" / "register.html"
-    if html_register.exists():
-        return FileResponse(str(html_register))
+    # Authenticate once for every sub-request; public ones run even without a token
+    token = extract_token_from_request(request)
+    payload = token_cache.verify(token) if token else None
+    base_headers = _forward_headers(request)
+    base_headers.pop("Content-Type", None)
+    identity_headers = {}
+    if payload and GATEWAY_FORWARD_IDENTITY:
+        identity = sign_identity(payload, token)
+        if identity:
+            identity_headers[IDENTITY_HEADER] = identity
+
+    async def execute(item: BatchItem) -> BatchItemResult:
+        method = item.method.upper()
+        target = urlsplit(item.path)
+        if method not in PROXY_METHODS:
+            return BatchItemResult(id=item.id, status=405, body={"detail": f"Method {method} not allowed"})
+        match = gateway_router.match(target.path, method) if target.path.startswith("/api/") else None
+        if match is None or target.path.rstrip("/") == "/api/batch":
+            return BatchItemResult(id=item.id, status=404, body={"detail": f"API endpoint not found: {target.path}"})
+
+        headers = dict(base_headers)
+        if not match.public:
+            if payload is None:
+                detail = "Invalid or expired token" if token else "Missing authentication token"
+                return BatchItemResult(id=item.id, status=401, body={"detail": detail})
+            headers.update(identity_headers)
+        current_priority.set(classify(match.service, method, match.public))
+
+        content = None
+        if item.body is not None and method in BODY_METHODS:
+            content = json.dumps(item.body).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+        params = parse_qsl(target.query, keep_blank_values=True)
+
+        room_cache = match.service == "room" and GATEWAY_CACHE_ENABLED
+        cache_key = None
+        if room_cache and method == "GET" and match.public and is_cacheable(match.path):
+            cache_key = response_cache.key(match.path, params)
+            entry = response_cache.get(cache_key)
+            if entry is not None:
+                return BatchItemResult(id=item.id, status=entry.status_code, body=_decode_body(entry.body))
 
-    raise HTTPException(status_code=404, detail="register.html not found")
+        try:
+            result = await fetch_upstream(
+                match.service_url, match.path, method, params=params, headers=headers, content=content
+            )
+        except HTTPException as e:
+            return BatchItemResult(id=item.id, status=e.status_code, body={"detail": e.detail})
+        finally:
+            if room_cache and method != "GET":
+                exact, subtree = stale_paths(match.path)
+                response_cache.invalidate(exact, subtree)
 
-@app.get("/admin.html")
-async def serve_admin():
-    if not FRONTEND_DIR:
-        raise HTTPException(status_code=500, detail="Frontend not configured")
+        if cache_key is not None and result.status_code == 200:
+            response_cache.put(cache_key, result, catalog_ttl(match.path))
+        return BatchItemResult(id=item.id, status=result.status_code, body=_decode_body(result.body))
 
-    user_html = FRONTEND_DIR / "admin.html"
-    if user_html.exists():
-        return FileResponse(str(user_html))
+    return BatchResponse(responses=await run_batch(batch.requests, execute))
 
-    # fallback
-    html_user = FRONTEND_DIR / "html" / "admin" / "admin.html"
-    if html_user.exists():
-        return FileResponse(str(html_user))
 
-    raise HTTPException(status_code=404, detail="admin.html not found")
+def _decode_body(body: bytes):
+    if not body:
+        return None
+    try:
+        return json.loads(body)
+    except ValueError:
+        return body.decode("utf-8", errors="replace")
 
 
-@app.get("/admin/admin.html")
-async def serve_admin_subfolder():
-    if not FRONTEND_DIR:
-        raise HTTPException(status_code=500, detail="Frontend not configured")
+def _view_body(status: int, body: Any, shape: type):
+    """body if the upstream answered 200 with JSON of the expected shape (dict or list), else None"""
+    if status != 200 or not isinstance(body, shape):
+        return None
+    if shape is list:
+        return [item for item in body if isinstance(item, dict)]
+    return body
 
-    # Try html/admin/admin.html first
-    html_admin = FRONTEND_DIR / "html" / "admin" / "admin.html"
-    if html_admin.exists():
-        return FileResponse(str(html_admin))
 
-    # fallback to root admin.html
-    admin_html = FRONTEND_DIR / "admin.html"
-    if admin_html.exists():
-        return FileResponse(str(admin_html))
+def _error_detail(body: Any, default: str) -> str:
+    return body.get("detail", default) if isinstance(body, dict) else default
 
-    raise HTTPException(status_code=404, detail="admin/admin.html not found")
 
+async def view_fetch(service: str, path: str, headers: dict, params=None) -> Tuple[int, Any]:
+    """GET one upstream resource for a composite view as (status, decoded body)
 
-# Serve admin HTML pages
-@app.get("/admin/dashboard.html")
-async def serve_admin_dashboard():
-    if not FRONTEND_DIR:
-        raise HTTPException(status_code=500, detail="Frontend not configured")
-    dashboard_html = FRONTEND_DIR / "html" / "admin" / "dashboard.html"
-    if dashboard_html.exists():
-        return FileResponse(str(dashboard_html))
-    raise HTTPException(status_code=404, detail="admin/dashboard.html not found")
+    Public catalog reads go through the response cache; failures become a
+    status code instead of an exception so gathered calls degrade independently.
+    """
+    cache_key = None
+    if service == "room" and GATEWAY_CACHE_ENABLED and is_cacheable(path):
+        cache_key = response_cache.key(path, (params or {}).items())
+        entry = response_cache.get(cache_key)
+        if entry is not None:
+            return entry.status_code, _decode_body(entry.body)
+    try:
+        result = await fetch_upstream(UPSTREAM_SERVICES[service], path, params=params, headers=headers)
+    except HTTPException as e:
+        return e.status_code, {"detail": e.detail}
+    if cache_key is not None and result.status_code == 200:
+        response_cache.put(cache_key, result, catalog_ttl(path))
+    return result.status_code, _decode_body(result.body)
 
 
-@app.get("/admin/rooms.html")
-async def serve_admin_rooms():
-    if not FRONTEND_DIR:
-        raise HTTPException(status_code=500, detail="Frontend not configured")
-    rooms_html = FRONTEND_DIR / "html" / "admin" / "rooms.html"
-    if rooms_html.exists():
-        return FileResponse(str(rooms_html))
-    raise HTTPException(status_code=404, detail="admin/rooms.html not found")
+def _view_headers(request: Request, identity_headers: Optional[dict] = None) -> dict:
+    headers = _forward_headers(request, identity_headers)
+    headers.pop("Content-Type", None)
+    return headers
 
 
-@app.get("/admin/customers.html")
-async def serve_admin_customers():
-    if not FRONTEND_DIR:
-        raise HTTPException(status_code=500, detail="Frontend not configured")
-    customers_html = FRONTEND_DIR / "html" / "admin" / "customers.html"
-    if customers_html.exists():
-        return FileResponse(str(customers_html))
-    raise HTTPException(status_code=404, detail="admin/customers.html not found")
+@app.get("/api/views/room-detail/{room_id}")
+async def room_detail_view(
+    room_id: int,
+    request: Request,
+    check_in: Optional[date] = None,
+    check_out: Optional[date] = None,
+):
+    """
+    Dữ liệu cho trang chi tiết phòng trong một lần gọi (public)
+    - Phòng, loại phòng và (nếu có check_in/check_out) tình trạng phòng trống
+    - Các request tới room-service chạy song song
+    """
+    label_route(request.scope, "/api/views")
+    current_priority.set(classify("room", "GET", True))
+    headers = _view_headers(request)
 
+    calls = [view_fetch("room", f"rooms/{room_id}", headers)]
+    if check_in and check_out:
+        dates = {"check_in": check_in.isoformat(), "check_out": check_out.isoformat()}
+        calls.append(view_fetch("room", f"rooms/{room_id}/availability", headers, params=dates))
+    results = await asyncio.gather(*calls)
 
-@app.get("/admin/bookings.html")
-async def serve_admin_bookings():
-    if not FRONTEND_DIR:
-        raise HTTPException(status_code=500, detail="Frontend not configured")
-    bookings_html = FRONTEND_DIR / "html" / "admin" / "bookings.html"
-    if bookings_html.exists():
-        return FileResponse(str(bookings_html))
-    raise HTTPException(status_code=404, detail="admin/bookings.html not found")
+    room_status, room = results[0]
+    if room_status != 200:
+        raise HTTPException(status_code=room_status, detail=_error_detail(room, "Room not found"))
+    room = _view_body(room_status, room, dict)
+    if room is None:
+        raise HTTPException(status_code=502, detail="Invalid response from room service")
 
+    # Room responses embed their type; only look it up when they don't
+    room_type = room.get("room_type") if isinstance(room.get("room_type"), dict) else None
+    if room_type is None and room.get("room_type_id") is not None:
+        room_type = _view_body(*await view_fetch("room", f"room-types/{room['room_type_id']}", headers), dict)
 
-@app.get("/admin/revenue.html")
-async def serve_admin_revenue():
-    if not FRONTEND_DIR:
-        raise HTTPException(status_code=500, detail="Frontend not configured")
-    revenue_html = FRONTEND_DIR / "html" / "admin" / "revenue.html"
-    if revenue_html.exists():
-        return FileResponse(str(revenue_html))
-    raise HTTPException(status_code=404, detail="admin/revenue.html not found")
-
+    availability = _view_body(*results[1], dict) if len(results) > 1 else None
 
-@app.get("/user/user.html")
-async def serve_user_subfolder():
-    if not FRONTEND_DIR:
-        raise HTTPException(status_code=500, detail="Frontend not configured")
+    return {"room": room, "room_type": room_type, "availability": availability}
 
-    # Try html/user/user.html first
-    html_user = FRONTEND_DIR / "html" / "user" / "user.html"
-    if html_user.exists():
-        return FileResponse(str(html_user))
 
-    # fallback to root user.html
-    user_html = FRONTEND_DIR / "user.html"
-    if user_html.exists():
-        return FileResponse(str(user_html))
-
-    raise HTTPException(status_code=404, detail="user/user.html not found")
+@app.get("/api/views/my-bookings")
+async def my_bookings_view(request: Request):
+    """
+    Dữ liệu cho trang "Đặt phòng của tôi" trong một lần gọi
+    - Booking, phòng và thanh toán được lấy song song rồi ghép lại theo booking
+    - Booking/payment service tự lọc theo người dùng trong token
+    """
+    label_route(request.scope, "/api/views")
+    payload = verify_jwt_auth(request)
+    identity_headers = None
+    if GATEWAY_FORWARD_IDENTITY:
+        identity = sign_identity(payload, extract_token_from_request(request))
+        if identity:
+            identity_headers = {IDENTITY_HEADER: identity}
+    headers = _view_headers(request, identity_headers)
+
+    (bookings_status, bookings), (payments_status, payments), (rooms_status, rooms) = await asyncio.gather(
+        view_fetch("booking", "bookings", headers),
+        view_fetch("payment", "payments", headers),
+        view_fetch("room", "rooms", headers),
+    )
+    if bookings_status != 200:
+        raise HTTPException(status_code=bookings_status, detail=_error_detail(bookings, "Booking service error"))
+    bookings = _view_body(bookings_status, bookings, list)
+    if bookings is None:
+        raise HTTPException(status_code=502, detail="Invalid response from booking service")
+    # A body of the wrong shape counts as unavailable, like an error status
+    rooms = _view_body(rooms_status, rooms, list)
+    payments = _view_body(payments_status, payments, list)
+
+    rooms_by_id = {room.get("id"): room for room in rooms or []}
+    payments_by_booking = defaultdict(list)
+    for payment in payments or []:
+        payments_by_booking[payment.get("booking_id")].append(payment)
+
+    unavailable = [name for name, body in (("rooms", rooms), ("payments", payments)) if body is None]
+    return {
+        "bookings": [
+            {
+                **booking,
+                "room": rooms_by_id.get(booking.get("room_id")),
+                "payments": payments_by_booking.get(booking.get("id"), []),
+            }
+            for booking in bookings
+        ],
+        "unavailable": unavailable,
+    }
 
 
 # API routes with /api prefix - Main entry point for all API requests
@@ -620,58 +965,68 @@ async def api_gateway_proxy(path: str, request: Request):
     """
     full_path = f"/api/{path}"
     
-    # Check if this is a public endpoint - skip JWT auth
-    # Public endpoints: 
-    # - /api/auth/login, /api/auth/register (authentication)
-    # - GET /api/rooms, GET /api/rooms/{id} (public room listing)
-    is_public_endpoint = (
-        # Auth endpoints
-        path == "auth/login" or 
-        path.startswith("auth/login/") or
-        path == "auth/register" or
-        path.startswith("auth/register/") or
-        (path == "auth" and request.method == "POST") or
-        # Public room endpoints (GET only)
-        (request.method == "GET" and (path == "rooms" or path.startswith("rooms/") or path.startswith("room-types")))
-    )
+    # Find the service to route to and whether the endpoint is public
+    match = gateway_router.match(full_path, request.method)
+    if match is None:
+        # API route not found
+        raise HTTPException(
+            status_code=404,
+            detail=f"API endpoint not found: {full_path}"
+        )
+    label_route(request.scope, match.prefix)
+    # Booking/payment writes are shed last, reports and catalog reads first
+    current_priority.set(classify(match.service, request.method, match.public))
     
     # Verify JWT token for all routes except public endpoints
     # Protected endpoints: /api/auth/me, /api/auth/logout, POST/PUT/DELETE /api/rooms, and all other /api/* routes
-    if not is_public_endpoint:
-        try:
-            payload = verify_jwt_auth(request)
-            # Token is valid, continue with request
-        except HTTPException:
-            # Re-raise HTTPException from verify_jwt_auth
-            raise
+    identity_headers = None
+    if not match.public:
+        payload = verify_jwt_auth(request)
+        if GATEWAY_FORWARD_IDENTITY:
+            identity = sign_identity(payload, extract_token_from_request(request))
+            if identity:
+                identity_headers = {IDENTITY_HEADER: identity}
     
-    # Find the service to route to
-    result = get_service_url(full_path)
+    if match.service == "room" and GATEWAY_CACHE_ENABLED:
+        if request.method == "GET" and match.public and is_cacheable(match.path):
+            return await cached_proxy_request(match.service_url, match.path, request)
+        if request.method != "GET":
+            try:
+                return await proxy_request(
+                    service_url=match.service_url,
+                    path=match.path,
+                    method=request.method,
+                    request=request,
+                    headers=identity_headers
+                )
+            finally:
+                # Drop cached catalog entries once the write has reached room-service
+                exact, subtree = stale_paths(match.path)
+                response_cache.invalidate(exact, subtree)
     
-    if result:
-        service_url, stripped_path = result
-        return await proxy_request(
-            service_url=service_url,
-            path=stripped_path,
-            method=request.method,
-            request=request
-        )
+    if request.method == "GET" and GATEWAY_COALESCE_GETS:
+        result = await coalesced_fetch(match.service_url, match.path, request, identity_headers)
+        return buffered_to_response(result)
     
-    # API route not found
-    raise HTTPException(
-        status_code=404,
-        detail=f"API endpoint not found: /{full_path}"
+    return await proxy_request(
+        service_url=match.service_url,
+        path=match.path,
+        method=request.method,
+        request=request,
+        headers=identity_headers
     )
 
 
 # Catch-all route for proxying API requests (legacy support and static files)
-@app.api_route("/{path:path}", methods=["GET", "POST", "PUT", "PATCH", "DELETE"])
+@app.api_route("/{path:path}", methods=["GET", "HEAD", "POST", "PUT", "PATCH", "DELETE"])
 async def gateway_proxy(path: str, request: Request):
     """Proxy API requests to appropriate backend service or serve static files"""
-    # Skip static file paths that are already mounted - let StaticFiles handle them
-    # FastAPI mount routes have higher priority, but we add this check as safety
+    # Frontend assets (css/, js/, html/, image/ ...) come from the in-memory cache
+    if request.method in ("GET", "HEAD"):
+        asset = static_cache.get(path)
+        if asset is not None:
+            return serve_static_asset(asset, request)
     if path.startswith(("css/", "js/")):
-        # These should be handled by StaticFiles mount, but if we reach here, return 404
         raise HTTPException(status_code=404, detail=f"Static file not found: {path}")
     
     # Skip HTML files that are already handled by specific routes
@@ -683,25 +1038,32 @@ async def gateway_proxy(path: str, request: Request):
     if path.startswith("api/"):
         raise HTTPException(status_code=404, detail=f"API route should use /api/{path}")
     
-    # For GET requests, check if it's a static file in frontend directory
-    if request.method == "GET" and FRONTEND_DIR:
+    # Files too large for the static cache are still served from disk
+    if request.method in ("GET", "HEAD") and FRONTEND_DIR:
         static_file_path = FRONTEND_DIR / path
         if static_file_path.exists() and static_file_path.is_file():
+            label_route(request.scope, "static")
             return FileResponse(str(static_file_path))
     
     # Check if this is a legacy API route (without /api prefix)
-    result = get_service_url(f"/{path}")
+    match = gateway_router.match(f"/{path}", request.method)
     
-    if result:
+    if match:
+        label_route(request.scope, match.prefix)
         # This is an API request, proxy to backend service
         # Note: Legacy routes should migrate to /api/* prefix
-        service_url, stripped_path = result
-        return await proxy_request(
-            service_url=service_url,
-            path=stripped_path,
-            method=request.method,
-            request=request
-        )
+        try:
+            return await proxy_request(
+                service_url=match.service_url,
+                path=match.path,
+                method=request.method,
+                request=request
+            )
+        finally:
+            # Legacy room writes change the same catalog as /api ones
+            if match.service == "room" and GATEWAY_CACHE_ENABLED and request.method not in ("GET", "HEAD"):
+                exact, subtree = stale_paths(match.path)
+                response_cache.invalidate(exact, subtree)
     
     # Not an API route and not a static file - 404
     raise HTTPException(
@@ -711,7 +1073,8 @@ async def gateway_proxy(path: str, request: Request):
 
 
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    from shared.common.launcher import run
+    # Single worker: gateway state is per process (see the Dockerfile)
+    run("main:app", port=int(os.getenv("PORT", "8000")), workers=int(os.getenv("WEB_CONCURRENCY", "1")))
 
 
@@ -0,0 +1,225 @@
+"""
+Gateway Metrics - Prometheus text-format counters, gauges and histograms
+
+Kept dependency-free: the gateway only needs a handful of metric families, and
+rendering the exposition format by hand avoids pulling in a client library.
+"""
+import bisect
+import time
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+LabelValues = Tuple[str, ...]
+
+# Latency buckets in seconds (upper bounds; +Inf is implicit)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def dec(self, *labels: str, amount: float = 1.0):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels: str, value: float):
+        self._values[labels] = value
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> (per-bucket counts incl. +Inf, sum)
+        self._series: Dict[LabelValues, List] = {}
+
+    def observe(self, *labels: str, value: float):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for labels, (counts, total) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+REQUESTS = registry.register(Counter(
+    "gateway_requests_total", "Requests handled by the gateway", ("route", "method", "status")))
+REQUEST_DURATION = registry.register(Histogram(
+    "gateway_request_duration_seconds", "Total time spent handling a request", ("route",)))
+GATEWAY_OVERHEAD = registry.register(Histogram(
+    "gateway_overhead_seconds", "Request time not spent waiting on upstream services", ("route",)))
+IN_FLIGHT = registry.register(Gauge(
+    "gateway_in_flight_requests", "Requests currently being handled", ("route",)))
+UPSTREAM_CONNECT = registry.register(Histogram(
+    "gateway_upstream_connect_seconds", "Time to open a new upstream TCP connection", ("upstream",)))
+UPSTREAM_RESPONSE = registry.register(Histogram(
+    "gateway_upstream_response_seconds", "Upstream request time, from send until the body is consumed",
+    ("upstream", "status")))
+UPSTREAM_IN_FLIGHT = registry.register(Gauge(
+    "gateway_upstream_in_flight_requests", "Requests currently waiting on an upstream", ("upstream",)))
+CONCURRENCY_LIMIT = registry.register(Gauge(
+    "gateway_concurrency_limit", "Current adaptive in-flight limit per upstream", ("upstream",)))
+SHED = registry.register(Counter(
+    "gateway_shed_requests_total", "Requests rejected by the concurrency limiter", ("upstream", "priority")))
+
+
+class RequestTiming:
+    """Per-request accumulator of time spent in upstream calls"""
+    __slots__ = ("upstream_seconds",)
+
+    def __init__(self):
+        self.upstream_seconds = 0.0
+
+
+current_timing: ContextVar[Optional[RequestTiming]] = ContextVar("current_timing", default=None)
+
+
+def record_upstream(upstream: str, status: str, seconds: float):
+    UPSTREAM_RESPONSE.observe(upstream, status, value=seconds)
+    timing = current_timing.get()
+    if timing is not None:
+        timing.upstream_seconds += seconds
+
+
+def label_route(scope: dict, route: str):
+    """Attach the route label (e.g. the matched prefix) to the current request"""
+    state = scope.setdefault("state", {})
+    if "route" not in state:
+        state["route"] = route
+        IN_FLIGHT.inc(route)
+
+
+def connect_trace(upstream: str):
+    """httpx "trace" extension that records new-connection latency for an upstream"""
+    started = []
+
+    async def trace(event_name: str, info: dict):
+        if event_name == "connection.connect_tcp.started":
+            started.append(time.perf_counter())
+        elif event_name == "connection.connect_tcp.complete" and started:
+            UPSTREAM_CONNECT.observe(upstream, value=time.perf_counter() - started.pop())
+
+    return trace
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-route latency, overhead, status codes and in-flight requests
+
+    Handlers label the request with label_route(request.scope, ...);
+    unlabelled requests are reported as "other".
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        state = scope.setdefault("state", {})
+        timing = RequestTiming()
+        token = current_timing.set(timing)
+        started = time.perf_counter()
+        status_code = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_code[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            route = state.get("route")
+            if route is None:
+                route = "other"
+            else:
+                IN_FLIGHT.dec(route)
+            REQUESTS.inc(route, scope["method"], str(status_code[0]))
+            REQUEST_DURATION.observe(route, value=elapsed)
+            GATEWAY_OVERHEAD.observe(route, value=max(0.0, elapsed - timing.upstream_seconds))
+            current_timing.reset(token)
@@ -0,0 +1,166 @@
+"""
+Response cache for public catalog reads at the API Gateway
+
+Caches successful GET responses (rooms, room types) in memory, keyed by the
+upstream path plus the normalized query string, with per-route TTLs and LRU
+eviction bounded by both entry count and total body size. Every entry carries
+a strong ETag so clients can revalidate with If-None-Match.
+"""
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Iterable, List, Optional, Tuple
+from urllib.parse import urlencode
+
+from fastapi.responses import Response
+
+from upstream import TRACE_HEADERS, BufferedResponse
+
+GATEWAY_CACHE_MAX_ENTRIES = int(os.getenv("GATEWAY_CACHE_MAX_ENTRIES", "512"))
+GATEWAY_CACHE_MAX_BYTES = int(os.getenv("GATEWAY_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+
+
+class CachedResponse:
+    __slots__ = ("key", "status_code", "headers", "body", "etag", "expires_at")
+
+    def __init__(self, key: str, response: BufferedResponse, ttl: float):
+        self.key = key
+        self.status_code = response.status_code
+        # The trace headers of the request that filled the entry must not
+        # be replayed on hits
+        self.headers = [
+            (k, v) for k, v in response.headers if k.lower() not in ("etag", "cache-control", *TRACE_HEADERS)
+        ]
+        self.body = response.body
+        self.etag = '"%s"' % hashlib.sha256(response.body).hexdigest()[:32]
+        self.expires_at = time.monotonic() + ttl
+
+    def ttl_remaining(self) -> int:
+        return max(0, int(self.expires_at - time.monotonic()))
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        if not if_none_match:
+            return False
+        candidates = [tag.strip() for tag in if_none_match.split(",")]
+        # Weak comparison, as required for If-None-Match (RFC 7232, 3.2)
+        return "*" in candidates or any(tag.removeprefix("W/") == self.etag for tag in candidates)
+
+    def to_response(self, if_none_match: Optional[str], cache_status: str) -> Response:
+        validators = {
+            "ETag": self.etag,
+            "Cache-Control": f"public, max-age={self.ttl_remaining()}",
+            "X-Cache": cache_status,
+        }
+        if self.matches(if_none_match):
+            return Response(status_code=304, headers=validators)
+
+        response = Response(content=self.body, status_code=self.status_code)
+        for name, value in self.headers:
+            response.headers.append(name, value)
+        for name, value in validators.items():
+            response.headers[name] = value
+        return response
+
+
+class ResponseCache:
+    """TTL + LRU cache of BufferedResponse bodies"""
+
+    def __init__(self, max_entries: int = GATEWAY_CACHE_MAX_ENTRIES, max_bytes: int = GATEWAY_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def key(path: str, query_items: Iterable[Tuple[str, str]]) -> str:
+        """Cache key: upstream path plus the query string with sorted parameters"""
+        query = urlencode(sorted(query_items))
+        return f"{path.strip('/')}?{query}" if query else path.strip("/")
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at <= time.monotonic():
+            self._remove(key)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key: str, response: BufferedResponse, ttl: float) -> CachedResponse:
+        entry = CachedResponse(key, response, ttl)
+        if ttl <= 0 or len(entry.body) > self.max_bytes:
+            return entry
+        self._remove(key)
+        self._entries[key] = entry
+        self._bytes += len(entry.body)
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+        return entry
+
+    def invalidate(self, exact: Iterable[str] = (), subtree: Iterable[str] = ()) -> int:
+        """Drop entries for the given upstream paths (with any query string),
+        and for subtree paths also everything below them"""
+        exact = {path.strip("/") for path in exact}
+        subtree = tuple(path.strip("/") for path in subtree)
+        stale = [
+            key for key in self._entries
+            if key.split("?", 1)[0] in exact
+            or any(key == p or key.startswith((p + "?", p + "/")) for p in subtree)
+        ]
+        for key in stale:
+            self._remove(key)
+        self.invalidations += len(stale)
+        return len(stale)
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry.body)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+def is_cacheable(upstream_path: str) -> bool:
+    """Public catalog reads served from the cache: rooms, rooms/{id}, room-types"""
+    segments = upstream_path.strip("/").split("/")
+    if segments in (["rooms"], ["room-types"]):
+        return True
+    return len(segments) == 2 and segments[0] == "rooms" and segments[1].isdigit()
+
+
+def stale_paths(upstream_path: str) -> Tuple[List[str], List[str]]:
+    """Cached paths made stale by a write to a room-service path
+
+    Returns:
+        (exact paths, subtree paths) for ResponseCache.invalidate
+    """
+    segments = upstream_path.strip("/").split("/")
+    if segments[0] == "room-types":
+        # Every room response embeds its room type
+        return [], ["room-types", "rooms"]
+    if segments[0] == "rooms" and len(segments) > 1:
+        return ["rooms", "rooms/" + segments[1]], []
+    if segments[0] == "rooms":
+        return ["rooms"], []
+    # /{id}/status and /{id}/availability are forwarded without the rooms/ prefix
+    return ["rooms", "rooms/" + segments[0]], []
@@ -0,0 +1,167 @@
+"""
+Gateway Router - Route table and auth policy compiled into a path-segment trie
+
+The routing rules of the original get_service_url (longest prefix wins, plus the
+/api/users and /api/rooms rewrites) and the public-endpoint policy of
+api_gateway_proxy are evaluated once when the router is built. A lookup then
+walks the request path segment by segment and returns the upstream, the
+rewritten path and whether the gateway must verify a JWT.
+"""
+from typing import Dict, Iterable, Mapping, NamedTuple, Optional
+
+# Method set meaning "any HTTP method"
+ANY_METHOD = "*"
+
+
+class RouteMatch(NamedTuple):
+    service: str        # upstream service name, e.g. "room"
+    service_url: str    # upstream base URL
+    path: str           # path to request on the upstream (no leading slash)
+    prefix: str         # matched route prefix, e.g. "/api/rooms"
+    public: bool        # True when the gateway does not require a JWT
+
+
+def _rewrite_passthrough(rest: str) -> str:
+    return rest
+
+
+def _rewrite_users(rest: str) -> str:
+    # /api/users/{id} -> /users/{id} in auth service
+    return f"users/{rest}" if rest else "users"
+
+
+def _rewrite_rooms(rest: str) -> str:
+    # /room-types, /available, /{id}/availability and /{id}/status are direct
+    # endpoints in room service; everything else lives under /rooms
+    if not rest:
+        return "rooms"
+    if (
+        rest.startswith("room-types")
+        or rest == "available"
+        or rest.endswith("/availability")
+        or rest.endswith("/status")
+        or rest.startswith("rooms/")
+    ):
+        return rest
+    return f"rooms/{rest}"
+
+
+def _rewrite_with_prefix(service_name: str):
+    def rewrite(rest: str) -> str:
+        return f"{service_name}/{rest}" if rest else service_name
+    return rewrite
+
+
+def _rewrite_for(prefix: str):
+    """Pick the path rewrite used by the original get_service_url for a prefix"""
+    if prefix == "/api/users":
+        return _rewrite_users
+    if prefix == "/api/auth":
+        # /api/auth/login -> /login; auth service has no /auth prefix
+        return _rewrite_passthrough
+    if prefix == "/api/rooms":
+        return _rewrite_rooms
+    if prefix.startswith("/api/"):
+        return _rewrite_with_prefix(prefix[len("/api/"):])
+    # Legacy routes without /api prefix forward the remainder unchanged
+    return _rewrite_passthrough
+
+
+class _Route:
+    __slots__ = ("prefix", "service", "service_url", "rewrite", "public_methods", "protected")
+
+    def __init__(self, prefix, service, service_url, rewrite, public_methods, protected):
+        self.prefix = prefix
+        self.service = service
+        self.service_url = service_url
+        self.rewrite = rewrite
+        # first segment after the prefix ("" when empty, "*" for any) -> methods
+        self.public_methods = public_methods
+        self.protected = protected
+
+    def is_public(self, rest: str, method: str) -> bool:
+        if not self.protected:
+            return True
+        first = rest.split("/", 1)[0]
+        methods = self.public_methods.get(first)
+        if methods is None:
+            methods = self.public_methods.get("*", ())
+        return methods == ANY_METHOD or method in methods
+
+
+class _Node:
+    __slots__ = ("children", "route")
+
+    def __init__(self):
+        self.children: Dict[str, "_Node"] = {}
+        self.route: Optional[_Route] = None
+
+
+class GatewayRouter:
+    """Prefix trie over path segments mapping request paths to upstreams"""
+
+    def __init__(
+        self,
+        routes: Mapping[str, str],
+        services: Mapping[str, str],
+        public_endpoints: Optional[Mapping[str, Mapping[str, Iterable[str]]]] = None,
+    ):
+        """
+        Args:
+            routes: route prefix -> service name (SERVICE_ROUTES)
+            services: service name -> upstream base URL
+            public_endpoints: route prefix -> {first sub-segment: methods}
+                for endpoints reachable without a JWT. Routes under /api/ are
+                protected unless listed here; legacy routes are never
+                authenticated by the gateway.
+        """
+        public_endpoints = public_endpoints or {}
+
+        self._root = _Node()
+        for prefix, service in routes.items():
+            policy = {
+                segment: (methods if methods == ANY_METHOD else frozenset(methods))
+                for segment, methods in public_endpoints.get(prefix, {}).items()
+            }
+            route = _Route(
+                prefix=prefix,
+                service=service,
+                service_url=services[service],
+                rewrite=_rewrite_for(prefix),
+                public_methods=policy,
+                protected=prefix.startswith("/api/"),
+            )
+            node = self._root
+            for segment in prefix.strip("/").split("/"):
+                node = node.children.setdefault(segment, _Node())
+            node.route = route
+
+    def match(self, path: str, method: str = "GET") -> Optional[RouteMatch]:
+        """Resolve a request path in one walk down the trie (longest prefix wins)"""
+        if not path.startswith("/"):
+            path = "/" + path
+
+        node = self._root
+        best: Optional[_Route] = None
+        best_end = 0
+        offset = 0
+        for segment in path[1:].split("/"):
+            node = node.children.get(segment)
+            if node is None:
+                break
+            offset += 1 + len(segment)
+            if node.route is not None:
+                best = node.route
+                best_end = offset
+
+        if best is None:
+            return None
+
+        rest = path[best_end:].lstrip("/")
+        return RouteMatch(
+            service=best.service,
+            service_url=best.service_url,
+            path=best.rewrite(rest),
+            prefix=best.prefix,
+            public=best.is_public(rest, method),
+        )
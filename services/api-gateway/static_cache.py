@@ -0,0 +1,157 @@
+"""
+In-memory static asset cache for the gateway frontend
+
+Every file under FRONTEND_DIR is read once at startup, together with gzip (and,
+when the optional "brotli" package is installed, brotli) variants of the
+compressible ones. Requests are then answered from memory with the best
+encoding the client accepts, a strong ETag per representation, Cache-Control
+and 304 Not Modified on revalidation - no filesystem access per request.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+from fastapi.responses import Response
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+# Files larger than this are left on disk and served by FileResponse
+GATEWAY_STATIC_MAX_FILE_SIZE = int(os.getenv("GATEWAY_STATIC_MAX_FILE_SIZE", str(4 * 1024 * 1024)))
+# max-age for CSS/JS/images; HTML pages are always revalidated
+GATEWAY_STATIC_MAX_AGE = int(os.getenv("GATEWAY_STATIC_MAX_AGE", "3600"))
+# Bodies smaller than this are not worth compressing
+GATEWAY_STATIC_MIN_COMPRESS_SIZE = int(os.getenv("GATEWAY_STATIC_MIN_COMPRESS_SIZE", "512"))
+
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+
+
+def _content_type(path: Path) -> str:
+    content_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+    if content_type.startswith("text/") or content_type == "application/javascript":
+        content_type += "; charset=utf-8"
+    return content_type
+
+
+def _accepted_encodings(accept_encoding: Optional[str]) -> set:
+    accepted = set()
+    for item in (accept_encoding or "").split(","):
+        coding, _, params = item.strip().partition(";")
+        if params.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        if coding:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+class StaticAsset:
+    """One file with its precompressed representations"""
+    __slots__ = ("path", "content_type", "cache_control", "digest", "variants")
+
+    def __init__(self, path: Path, body: bytes, digest: str):
+        self.path = path
+        self.content_type = _content_type(path)
+        self.cache_control = (
+            "no-cache" if path.suffix in (".html", ".htm") else f"public, max-age={GATEWAY_STATIC_MAX_AGE}"
+        )
+        self.digest = digest
+        # content-coding -> (body, etag); "identity" is always present
+        self.variants: Dict[str, tuple] = {"identity": (body, f'"{digest}"')}
+
+        if len(body) >= GATEWAY_STATIC_MIN_COMPRESS_SIZE and self.content_type.startswith(COMPRESSIBLE_TYPES):
+            compressed = gzip.compress(body, compresslevel=9, mtime=0)
+            if len(compressed) < len(body):
+                self.variants["gzip"] = (compressed, f'"{digest}-gz"')
+            if brotli is not None:
+                compressed = brotli.compress(body, quality=11)
+                if len(compressed) < len(body):
+                    self.variants["br"] = (compressed, f'"{digest}-br"')
+
+    def response(self, accept_encoding: Optional[str], if_none_match: Optional[str]) -> Response:
+        accepted = _accepted_encodings(accept_encoding)
+        coding = next((c for c in ("br", "gzip") if c in self.variants and c in accepted), "identity")
+        body, etag = self.variants[coding]
+
+        headers = {"ETag": etag, "Cache-Control": self.cache_control}
+        if len(self.variants) > 1:
+            headers["Vary"] = "Accept-Encoding"
+        if if_none_match and self._matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+        if coding != "identity":
+            headers["Content-Encoding"] = coding
+        return Response(content=body, headers=headers, media_type=self.content_type)
+
+    @staticmethod
+    def _matches(if_none_match: str, etag: str) -> bool:
+        candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in candidates or etag in candidates
+
+
+class StaticAssetCache:
+    """Frontend files keyed by their path relative to the frontend root"""
+
+    def __init__(self, root: Optional[Path], max_file_size: int = GATEWAY_STATIC_MAX_FILE_SIZE):
+        self.root = root
+        self.max_file_size = max_file_size
+        self._assets: Dict[str, StaticAsset] = {}
+        self.bytes = 0
+        self.compressed_bytes = 0
+        self.hits = 0
+        self.not_modified = 0
+
+    def load(self) -> int:
+        """(Re)read every file under the root; identical files share one entry"""
+        assets: Dict[str, StaticAsset] = {}
+        by_digest: Dict[str, StaticAsset] = {}
+        if self.root is not None and self.root.is_dir():
+            for path in sorted(self.root.rglob("*")):
+                if not path.is_file() or path.stat().st_size > self.max_file_size:
+                    continue
+                body = path.read_bytes()
+                digest = hashlib.sha256(body).hexdigest()[:32]
+                asset = by_digest.get(digest)
+                if asset is None or asset.content_type != _content_type(path):
+                    asset = by_digest[digest] = StaticAsset(path, body, digest)
+                assets[path.relative_to(self.root).as_posix()] = asset
+
+        self._assets = assets
+        unique = {id(asset): asset for asset in assets.values()}.values()
+        self.bytes = sum(len(asset.variants["identity"][0]) for asset in unique)
+        self.compressed_bytes = sum(
+            len(body) for asset in unique for coding, (body, _) in asset.variants.items() if coding != "identity"
+        )
+        return len(assets)
+
+    def get(self, relative_path: str) -> Optional[StaticAsset]:
+        return self._assets.get(relative_path.lstrip("/"))
+
+    def first(self, candidates: Iterable[str]) -> Optional[StaticAsset]:
+        for candidate in candidates:
+            asset = self.get(candidate)
+            if asset is not None:
+                return asset
+        return None
+
+    def serve(self, asset: StaticAsset, accept_encoding: Optional[str], if_none_match: Optional[str]) -> Response:
+        response = asset.response(accept_encoding, if_none_match)
+        if response.status_code == 304:
+            self.not_modified += 1
+        else:
+            self.hits += 1
+        return response
+
+    def stats(self) -> dict:
+        return {
+            "root": str(self.root) if self.root else None,
+            "files": len(self._assets),
+            "bytes": self.bytes,
+            "compressed_bytes": self.compressed_bytes,
+            "brotli": brotli is not None,
+            "hits": self.hits,
+            "not_modified": self.not_modified,
+        }
@@ -0,0 +1,56 @@
+"""
+Unit tests for the adaptive concurrency limiter (python -m pytest test_concurrency.py)
+"""
+from concurrency import LOW, NORMAL, AdaptiveLimiter
+
+
+def _call(limiter: AdaptiveLimiter, rtt: float, priority: str = NORMAL):
+    limiter.acquire(priority)
+    limiter.on_sample(rtt)
+    limiter.release()
+
+
+def test_mixed_route_latency_at_light_load_keeps_the_limit():
+    # One request at a time, alternating a fast lookup and a slower fan-out
+    limiter = AdaptiveLimiter("room", max_limit=100, initial_limit=50, min_limit=5)
+    for i in range(1000):
+        _call(limiter, 0.003 if i % 2 else 0.040)
+
+    assert limiter.limit == 50
+    # A few concurrent low-priority reads are still admitted
+    for _ in range(4):
+        limiter.acquire(LOW)
+    assert limiter.in_flight == 4
+
+
+def test_mixed_route_latency_under_load_is_not_congestion():
+    limiter = AdaptiveLimiter("room", max_limit=100, initial_limit=10, min_limit=5)
+    for _ in range(8):
+        limiter.acquire(NORMAL)
+    for i in range(200):
+        limiter.on_sample(0.003 if i % 2 else 0.040)
+
+    assert limiter.limit > 10
+
+
+def test_latency_rise_under_load_cuts_the_limit():
+    limiter = AdaptiveLimiter("room", max_limit=100, initial_limit=10, min_limit=5)
+    for _ in range(8):
+        limiter.acquire(NORMAL)
+    for _ in range(100):
+        limiter.on_sample(0.010)
+    grown = limiter.limit
+
+    for _ in range(5):
+        limiter.on_sample(0.100)
+    assert limiter.limit < grown
+
+
+def test_failures_at_light_load_do_not_cut_the_limit():
+    limiter = AdaptiveLimiter("room", max_limit=100, initial_limit=50, min_limit=5)
+    for _ in range(20):
+        limiter.acquire(NORMAL)
+        limiter.on_sample(0.010, failed=True)
+        limiter.release()
+
+    assert limiter.limit == 50
@@ -0,0 +1,79 @@
+"""
+Verified-token cache for the API Gateway
+
+Remembers the decoded payload of JWTs that already passed signature
+verification, keyed by a SHA-256 digest of the token (raw tokens are never
+stored) and expiring each entry at the token's own "exp" claim.
+"""
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from shared.utils.jwt_handler import verify_token
+
+# Maximum number of cached tokens; 0 disables the cache
+GATEWAY_TOKEN_CACHE_SIZE = int(os.getenv("GATEWAY_TOKEN_CACHE_SIZE", "10000"))
+
+
+class VerifiedTokenCache:
+    """Bounded LRU cache of verified JWT payloads"""
+
+    def __init__(
+        self,
+        max_size: int = GATEWAY_TOKEN_CACHE_SIZE,
+        verifier: Callable[[str], Optional[Dict[str, Any]]] = verify_token,
+    ):
+        self.max_size = max_size
+        self._verify = verifier
+        self._entries: "OrderedDict[bytes, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+
+    def verify(self, token: str) -> Optional[Dict[str, Any]]:
+        """Return the token payload (a fresh copy) or None if the token is invalid"""
+        if self.max_size <= 0:
+            return self._verify(token)
+
+        key = hashlib.sha256(token.encode("utf-8")).digest()
+        entry = self._entries.get(key)
+        if entry is not None:
+            payload, expires_at = entry
+            if expires_at > time.time():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return dict(payload)
+            del self._entries[key]
+            self.expirations += 1
+
+        self.misses += 1
+        payload = self._verify(token)
+        if not payload:
+            return None
+
+        exp = payload.get("exp")
+        # Tokens without a numeric expiry are verified every time
+        if isinstance(exp, (int, float)) and exp > time.time():
+            self._entries[key] = (dict(payload), float(exp))
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return payload
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "expirations": self.expirations,
+            "evictions": self.evictions,
+        }
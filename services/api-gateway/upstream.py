@@ -0,0 +1,449 @@
+"""
+Upstream connection pools for the API Gateway
+
+One long-lived httpx.AsyncClient per backend service, created at startup and
+closed at shutdown, so proxied requests reuse keep-alive connections instead of
+paying a new TCP (and TLS) handshake on every call. A service URL may list
+several comma-separated replicas; each request is sent to the one picked by
+the service's load balancer.
+"""
+import asyncio
+import importlib.util
+import os
+import json
+import time
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+
+import httpx
+
+from concurrency import AdaptiveLimiter, current_priority
+from metrics import UPSTREAM_IN_FLIGHT, connect_trace, record_upstream
+from shared.common.tracing import inject as inject_traceparent, start_span
+from shared.common.deadline import (
+    DEADLINE_HEADER, DeadlineExceeded, header_value as deadline_header_value, remaining as deadline_remaining
+)
+from shared.utils.circuit_breaker import breakers
+from shared.utils.load_balancer import LOAD_BALANCER_STRATEGY, balancers
+from shared.utils.retry import LatencyTracker, hedged, retry_connect
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, str(default)))
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, str(default)))
+
+
+def _env_bool(name: str, default: bool = False) -> bool:
+    return os.getenv(name, "true" if default else "false").strip().lower() in ("1", "true", "yes", "on")
+
+
+# Pool configuration (defaults apply to every upstream; each value can be
+# overridden per service with a suffix, e.g. GATEWAY_MAX_CONNECTIONS_BOOKING=200)
+GATEWAY_MAX_CONNECTIONS = _env_int("GATEWAY_MAX_CONNECTIONS", 100)
+GATEWAY_MAX_KEEPALIVE_CONNECTIONS = _env_int("GATEWAY_MAX_KEEPALIVE_CONNECTIONS", 20)
+GATEWAY_KEEPALIVE_EXPIRY = _env_float("GATEWAY_KEEPALIVE_EXPIRY", 30.0)
+GATEWAY_UPSTREAM_TIMEOUT = _env_float("GATEWAY_UPSTREAM_TIMEOUT", 30.0)
+GATEWAY_CONNECT_TIMEOUT = _env_float("GATEWAY_CONNECT_TIMEOUT", 5.0)
+GATEWAY_POOL_TIMEOUT = _env_float("GATEWAY_POOL_TIMEOUT", 5.0)
+# HTTP/2 needs the optional "h2" package and only applies to https:// upstreams
+GATEWAY_HTTP2 = _env_bool("GATEWAY_HTTP2")
+
+# Retries after a connection failure; requests whose body is streamed from the
+# client cannot be replayed and are never retried
+GATEWAY_CONNECT_RETRIES = _env_int("GATEWAY_CONNECT_RETRIES", 2)
+# Opt-in: send a second GET when the first is slower than the upstream's recent p95
+GATEWAY_HEDGE_GETS = _env_bool("GATEWAY_HEDGE_GETS")
+
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+# Hop-by-hop headers (RFC 7230, section 6.1) apply to a single connection and
+# must never be forwarded by a proxy
+HOP_BY_HOP_HEADERS = frozenset({
+    "connection",
+    "keep-alive",
+    "proxy-authenticate",
+    "proxy-authorization",
+    "te",
+    "trailer",
+    "trailers",
+    "transfer-encoding",
+    "upgrade",
+})
+
+
+# Per-request tracing headers: a fetched response may be cached or shared
+# with coalesced followers, and each of those requests has its own trace
+TRACE_HEADERS = ("server-timing", "x-trace-id", "traceparent")
+
+
+def end_to_end_headers(headers: httpx.Headers, exclude: Iterable[str] = ()) -> List[Tuple[str, str]]:
+    """Return upstream response headers without hop-by-hop entries
+
+    Headers named in the upstream Connection header are dropped as well.
+    Repeated headers (e.g. Set-Cookie) are kept as separate items.
+    """
+    dropped = set(HOP_BY_HOP_HEADERS)
+    dropped.update(name.lower() for name in exclude)
+    for token in headers.get("connection", "").split(","):
+        if token.strip():
+            dropped.add(token.strip().lower())
+    return [(name, value) for name, value in headers.multi_items() if name.lower() not in dropped]
+
+
+class BufferedResponse(NamedTuple):
+    """Fully read upstream response, safe to cache or share between requests"""
+    status_code: int
+    headers: List[Tuple[str, str]]
+    body: bytes
+
+    def json(self) -> Any:
+        return json.loads(self.body)
+
+
+class ClientBody:
+    """Request body streamed from the client, remembering whether reading it failed
+
+    A body over GATEWAY_MAX_BODY_SIZE or a client that disconnects mid-upload
+    fails the upstream send from our side: that must not count against the
+    upstream's breaker, concurrency limit or load balancer.
+    """
+
+    def __init__(self, content):
+        self.content = content
+        self.failed = False
+
+    async def __aiter__(self):
+        try:
+            async for chunk in self.content:
+                yield chunk
+        except BaseException:
+            self.failed = True
+            raise
+
+
+def _upstream_failure(exc: BaseException, content: Any) -> bool:
+    """Whether an exception raised while sending counts as an upstream failure"""
+    if isinstance(exc, (asyncio.CancelledError, DeadlineExceeded)):
+        return False
+    return not (isinstance(content, ClientBody) and content.failed)
+
+
+class UpstreamPool:
+    """Pooled client and usage counters for a single upstream base URL"""
+
+    def __init__(self, name: str, base_url: str):
+        suffix = name.upper().replace("-", "_")
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.max_connections = _env_int(f"GATEWAY_MAX_CONNECTIONS_{suffix}", GATEWAY_MAX_CONNECTIONS)
+        self.max_keepalive_connections = _env_int(
+            f"GATEWAY_MAX_KEEPALIVE_CONNECTIONS_{suffix}", GATEWAY_MAX_KEEPALIVE_CONNECTIONS
+        )
+        self.keepalive_expiry = _env_float(f"GATEWAY_KEEPALIVE_EXPIRY_{suffix}", GATEWAY_KEEPALIVE_EXPIRY)
+        self.http2 = _env_bool(f"GATEWAY_HTTP2_{suffix}", GATEWAY_HTTP2) and HTTP2_AVAILABLE
+        self.balancer = balancers.get(
+            self.base_url,
+            name=name,
+            strategy=os.getenv(f"LOAD_BALANCER_STRATEGY_{suffix}", LOAD_BALANCER_STRATEGY).strip().lower(),
+        )
+        self.limiter = AdaptiveLimiter(name, max_limit=self.max_connections)
+        self.latency = LatencyTracker()
+
+        self.client: Optional[httpx.AsyncClient] = None
+        self.breaker = breakers.get(name)
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.total_requests = 0
+        self.errors = 0
+
+    def open(self) -> httpx.AsyncClient:
+        if self.client is None or self.client.is_closed:
+            # No base_url: requests carry the absolute URL of the chosen replica
+            self.client = httpx.AsyncClient(
+                timeout=httpx.Timeout(
+                    GATEWAY_UPSTREAM_TIMEOUT,
+                    connect=GATEWAY_CONNECT_TIMEOUT,
+                    pool=GATEWAY_POOL_TIMEOUT,
+                ),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_keepalive_connections,
+                    keepalive_expiry=self.keepalive_expiry,
+                ),
+                http2=self.http2,
+            )
+        return self.client
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    def request_started(self):
+        self.in_flight += 1
+        self.total_requests += 1
+        if self.in_flight > self.peak_in_flight:
+            self.peak_in_flight = self.in_flight
+        UPSTREAM_IN_FLIGHT.inc(self.name)
+
+    def request_finished(self, error: bool = False):
+        self.in_flight -= 1
+        if error:
+            self.errors += 1
+        UPSTREAM_IN_FLIGHT.dec(self.name)
+
+    def lease(self) -> "UpstreamLease":
+        """Start tracking one request
+
+        Raises CircuitOpenError while the breaker is open and LoadShedError when
+        the request's priority class is over the upstream's concurrency limit.
+        """
+        return UpstreamLease(self)
+
+    def extensions(self) -> dict:
+        """httpx request extensions; the trace hook times new connections"""
+        return {"trace": connect_trace(self.name)}
+
+    def request_timeout(self) -> Union[httpx.Timeout, Any]:
+        """Pool timeouts capped by what is left of the request deadline"""
+        budget = deadline_remaining()
+        if budget is None:
+            return httpx.USE_CLIENT_DEFAULT
+        if budget <= 0:
+            raise DeadlineExceeded("Request deadline exceeded")
+        return httpx.Timeout(
+            min(GATEWAY_UPSTREAM_TIMEOUT, budget),
+            connect=min(GATEWAY_CONNECT_TIMEOUT, budget),
+            pool=min(GATEWAY_POOL_TIMEOUT, budget),
+        )
+
+    @staticmethod
+    def _with_deadline(headers: Optional[Dict[str, str]]) -> Dict[str, str]:
+        request_headers = dict(headers or {})
+        deadline = deadline_header_value()
+        if deadline:
+            request_headers[DEADLINE_HEADER] = deadline
+        # traceparent of the client span the request is sent under
+        return inject_traceparent(request_headers)
+
+    def _client_span(self, method: str, url: str):
+        return start_span(
+            f"{method} {self.name}", "client", {"http.method": method, "http.url": url, "peer.service": self.name}
+        )
+
+    async def _send(self, send, method: str, replayable: bool, discard=None):
+        """Run one attempt with connect-error retries, hedged for GETs when enabled"""
+        def attempt():
+            return retry_connect(send, GATEWAY_CONNECT_RETRIES if replayable else 0)
+
+        if method == "GET" and GATEWAY_HEDGE_GETS:
+            return await hedged(attempt, self.latency.hedge_delay(), discard)
+        return await attempt()
+
+    async def stream(
+        self,
+        method: str,
+        path: str,
+        params: Any = None,
+        headers: Optional[Dict[str, str]] = None,
+        content: Any = None,
+        replayable: bool = True,
+    ) -> Tuple["UpstreamLease", httpx.Response]:
+        """Send a request and return once the response headers arrive
+
+        The caller owns the returned lease and must release it with the response.
+        """
+        client = self.open()
+        if hasattr(content, "__aiter__"):
+            content = ClientBody(content)
+
+        async def send():
+            lease = self.lease()
+            url = lease.url(path)
+            with self._client_span(method, url) as span:
+                try:
+                    request = client.build_request(
+                        method,
+                        url,
+                        content=content,
+                        headers=self._with_deadline(headers),
+                        params=params,
+                        extensions=self.extensions(),
+                        timeout=self.request_timeout(),
+                    )
+                    response = await client.send(request, stream=True)
+                except BaseException as exc:
+                    await lease.release(error=_upstream_failure(exc, content))
+                    raise
+                if span is not None:
+                    span.attributes["http.status_code"] = response.status_code
+            lease.responded(response)
+            return lease, response
+
+        async def discard(result):
+            await result[0].release(result[1])
+
+        return await self._send(send, method, replayable, discard)
+
+    async def fetch(
+        self,
+        method: str,
+        path: str,
+        params: Any = None,
+        headers: Optional[Dict[str, str]] = None,
+        content: Any = None,
+    ) -> BufferedResponse:
+        """Send a request and read the whole (decoded) response body"""
+        client = self.open()
+        request_headers = {"Accept-Encoding": "identity"}
+        if headers:
+            request_headers.update(headers)
+        replayable = not hasattr(content, "__aiter__")
+        if not replayable:
+            content = ClientBody(content)
+
+        async def send():
+            lease = self.lease()
+            url = lease.url(path)
+            with self._client_span(method, url) as span:
+                try:
+                    response = await client.request(
+                        method,
+                        url,
+                        params=params,
+                        headers=self._with_deadline(request_headers),
+                        content=content,
+                        extensions=self.extensions(),
+                        timeout=self.request_timeout(),
+                    )
+                except BaseException as exc:
+                    await lease.release(error=_upstream_failure(exc, content))
+                    raise
+                if span is not None:
+                    span.attributes["http.status_code"] = response.status_code
+            await lease.release(response)
+            return response
+
+        response = await self._send(send, method, replayable)
+        return BufferedResponse(
+            status_code=response.status_code,
+            # Body is already decoded and length is recomputed on the way out
+            headers=end_to_end_headers(
+                response.headers, exclude=("content-length", "content-encoding", "date", "server", *TRACE_HEADERS)
+            ),
+            body=response.content,
+        )
+
+    def stats(self) -> dict:
+        open_connections = None
+        idle_connections = None
+        # httpcore does not expose pool occupancy through httpx's public API
+        pool = getattr(getattr(self.client, "_transport", None), "_pool", None)
+        connections = getattr(pool, "connections", None)
+        if connections is not None:
+            open_connections = len(connections)
+            idle_connections = sum(1 for c in connections if c.is_idle())
+
+        return {
+            "name": self.name,
+            "base_url": self.base_url,
+            "open": self.client is not None and not self.client.is_closed,
+            "http2": self.http2,
+            "max_connections": self.max_connections,
+            "max_keepalive_connections": self.max_keepalive_connections,
+            "keepalive_expiry": self.keepalive_expiry,
+            "open_connections": open_connections,
+            "idle_connections": idle_connections,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "total_requests": self.total_requests,
+            "errors": self.errors,
+            "load_balancer": self.balancer.stats(),
+            "concurrency": self.limiter.stats(),
+        }
+
+
+class UpstreamLease:
+    """A single in-flight request on an UpstreamPool, released exactly once"""
+
+    def __init__(self, pool: UpstreamPool):
+        pool.breaker.before_call()
+        try:
+            pool.limiter.acquire(current_priority.get())
+        except BaseException:
+            pool.breaker.cancel()
+            raise
+        self.pool = pool
+        self.released = False
+        self.responded_at = None
+        self.started_at = time.perf_counter()
+        self.endpoint = pool.balancer.acquire()
+        pool.request_started()
+
+    def url(self, path: str) -> str:
+        """Absolute URL of path on the replica chosen for this request"""
+        return f"{self.endpoint.url}/{path.lstrip('/')}"
+
+    def responded(self, response: httpx.Response):
+        """Report the upstream's answer (status line and headers) to the breaker"""
+        if self.responded_at is None:
+            self.responded_at = time.perf_counter()
+            rtt = self.responded_at - self.started_at
+            self.pool.latency.record(rtt)
+            self.pool.breaker.record(response.status_code < 500, rtt)
+            self.pool.limiter.on_sample(rtt, failed=response.status_code in (502, 503, 504))
+
+    async def release(self, response: Optional[httpx.Response] = None, error: bool = False):
+        if self.released:
+            return
+        self.released = True
+        status = "error"
+        if response is not None:
+            self.responded(response)
+            await response.aclose()
+            error = error or response.status_code >= 500
+            status = str(response.status_code)
+        elif self.responded_at is None:
+            if error:
+                self.pool.breaker.record(False, time.perf_counter() - self.started_at)
+                self.pool.limiter.on_sample(time.perf_counter() - self.started_at, failed=True)
+            else:
+                self.pool.breaker.cancel()
+        self.pool.limiter.release()
+        self.pool.balancer.release(self.endpoint, success=not error)
+        self.pool.request_finished(error=error)
+        # Upstream time runs until the body is consumed (or the stream closed)
+        record_upstream(self.pool.name, status, time.perf_counter() - self.started_at)
+
+
+class UpstreamPools:
+    """Registry of UpstreamPool objects keyed by upstream base URL"""
+
+    def __init__(self, services: Dict[str, str]):
+        self._pools: Dict[str, UpstreamPool] = {}
+        for name, url in services.items():
+            self._pools.setdefault(url.rstrip("/"), UpstreamPool(name, url))
+
+    def get(self, service_url: str) -> UpstreamPool:
+        key = service_url.rstrip("/")
+        pool = self._pools.get(key)
+        if pool is None:
+            pool = self._pools[key] = UpstreamPool(key, key)
+        pool.open()
+        return pool
+
+    async def start(self):
+        for pool in self._pools.values():
+            pool.open()
+
+    async def close(self):
+        for pool in self._pools.values():
+            await pool.close()
+
+    def stats(self) -> dict:
+        return {
+            "http2_available": HTTP2_AVAILABLE,
+            "pools": [pool.stats() for pool in self._pools.values()],
+        }
@@ -4,6 +4,7 @@ Auth Service - Authentication and Authorization Service
 from fastapi import FastAPI, Depends, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from typing import List, Optional
 import sys
@@ -15,6 +16,10 @@ sys.path.append(os.path.join(os.path.dirname(__file__), '../../'))
 from database import get_db, Base, engine
 from shared.utils.jwt_handler import create_access_token, verify_token
 from shared.common.dependencies import get_current_user
+from shared.common.compression import CompressionMiddleware
+from shared.common.db_pool import pool_stats
+from shared.common.deadline import DeadlineMiddleware
+from shared.common.tracing import TracingMiddleware, instrument_engine
 from models import User, Role
 from schemas import UserCreate, UserUpdate, UserLogin, Token, UserResponse, RoleCreate, RoleResponse
 
@@ -42,18 +47,24 @@ def init_default_roles(db: Session):
         if not existing_role:
             role = Role(**role_data)
             db.add(role)
-    
-    db.commit()
+            try:
+                db.commit()
+            except IntegrityError:
+                # Seeded concurrently by another worker or replica
+                db.rollback()
 
-# Initialize roles on startup
-@app.on_event("startup")
-async def startup_event():
+# Initialize roles at import, like the tables: under gunicorn this runs once
+# in the arbiter before the workers fork (shared/common/launcher.py)
+def seed_default_roles():
     db = next(get_db())
     try:
         init_default_roles(db)
     finally:
         db.close()
 
+
+seed_default_roles()
+
 # CORS configuration
 app.add_middleware(
     CORSMiddleware,
@@ -63,6 +74,16 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Honour the caller's X-Request-Deadline for this request and nested calls
+app.add_middleware(DeadlineMiddleware)
+
+# gzip/brotli for large responses; the gateway relays them without re-encoding
+app.add_middleware(CompressionMiddleware)
+
+# Spans for the request, its SQL and outgoing calls; Server-Timing on every response
+app.add_middleware(TracingMiddleware, service_name="auth-service")
+instrument_engine(engine)
+
 # Security scheme
 security = HTTPBearer()
 
@@ -571,6 +592,12 @@ async def health_check():
     """Health check endpoint"""
     return {"status": "healthy", "service": "auth"}
 
+
+@app.get("/debug/db-pool", tags=["Health"])
+async def db_pool_stats():
+    """Connection pool gauges (checked out, overflow, wait and connect time) of the database engine"""
+    return {"sync": pool_stats(engine)}
+
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8001)
+    from shared.common.launcher import run
+    run("main:app", port=int(os.getenv("PORT", "8001")))
@@ -3,6 +3,8 @@ Booking Service - Booking Management Service
 """
 from fastapi import FastAPI, Depends, HTTPException, status, Request
 from fastapi.middleware.cors import CORSMiddleware
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session, joinedload
 from typing import List, Optional
 from datetime import datetime, date
@@ -11,9 +13,14 @@ import os
 
 sys.path.append(os.path.join(os.path.dirname(__file__), "../../"))
 
-from database import get_db, Base, engine
+from database import get_db, get_async_db, get_async_read_db, Base, engine, async_engine, read_replica
 from shared.common.dependencies import get_current_user, get_token
-from shared.utils.http_client import call_service, ServiceHTTPError
+from shared.utils.http_client import call_service, service_clients, ServiceHTTPError
+from shared.common.compression import CompressionMiddleware
+from shared.common.db_pool import pool_stats
+from shared.common.deadline import DeadlineMiddleware
+from shared.common.read_replica import READ_CONSISTENCY_HEADER
+from shared.common.tracing import TracingMiddleware, instrument_engine
 from models import Booking, BookingDetail
 from schemas import (
     BookingCreate,
@@ -38,10 +45,35 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Honour the caller's X-Request-Deadline for this request and nested calls
+app.add_middleware(DeadlineMiddleware)
+
+# gzip/brotli for large responses; the gateway relays them without re-encoding
+app.add_middleware(CompressionMiddleware)
+
+# Spans for the request, its SQL and outgoing calls; Server-Timing on every response
+app.add_middleware(TracingMiddleware, service_name="booking-service")
+instrument_engine(engine)
+instrument_engine(async_engine)
+for replica_engine in read_replica.engines():
+    instrument_engine(replica_engine)
+
 # Service URLs (docker-compose internal DNS)
 CUSTOMER_SERVICE_URL = os.getenv("CUSTOMER_SERVICE_URL", "http://customer-service:8000")
 ROOM_SERVICE_URL = os.getenv("ROOM_SERVICE_URL", "http://room-service:8000")
 
+
+# One pooled keep-alive client per called service, for the app's lifetime
+@app.on_event("startup")
+async def open_service_clients():
+    await service_clients.start(CUSTOMER_SERVICE_URL, ROOM_SERVICE_URL)
+
+
+@app.on_event("shutdown")
+async def close_service_clients():
+    await service_clients.close()
+
+
 Base.metadata.create_all(bind=engine)
 
 
@@ -82,7 +114,9 @@ async def _verify_customer_exists(customer_id: int, auth_header: dict):
     except ServiceHTTPError as e:
         if getattr(e, "status_code", None) == 404:
             raise HTTPException(status_code=404, detail="Customer not found")
-        raise HTTPException(status_code=502, detail=f"Customer service error: {getattr(e, 'message', str(e))}")
+        # 503 (e.g. circuit breaker open) is passed on so clients know to retry later
+        code = 503 if getattr(e, "status_code", None) == 503 else 502
+        raise HTTPException(status_code=code, detail=f"Customer service error: {getattr(e, 'message', str(e))}")
     except Exception as e:
         raise HTTPException(status_code=502, detail=f"Customer service unavailable: {str(e)}")
 
@@ -90,14 +124,20 @@ async def _verify_customer_exists(customer_id: int, auth_header: dict):
 async def _get_room(room_id: int, auth_header: dict) -> dict:
     """Call Room service to check room exists."""
     try:
-        room = await call_service(ROOM_SERVICE_URL, f"rooms/{room_id}", headers=auth_header)
+        # The status decides whether the room can be booked: bypass the room
+        # cache and replica
+        room = await call_service(
+            ROOM_SERVICE_URL, f"rooms/{room_id}", headers={**auth_header, READ_CONSISTENCY_HEADER: "primary"}
+        )
         if not isinstance(room, dict):
             raise HTTPException(status_code=502, detail="Room service returned invalid data")
         return room
     except ServiceHTTPError as e:
         if getattr(e, "status_code", None) == 404:
             raise HTTPException(status_code=404, detail="Room not found")
-        raise HTTPException(status_code=502, detail=f"Room service error: {getattr(e, 'message', str(e))}")
+        # 503 (e.g. circuit breaker open) is passed on so clients know to retry later
+        code = 503 if getattr(e, "status_code", None) == 503 else 502
+        raise HTTPException(status_code=code, detail=f"Room service error: {getattr(e, 'message', str(e))}")
     except Exception as e:
         raise HTTPException(status_code=502, detail=f"Room service unavailable: {str(e)}")
 
@@ -216,7 +256,7 @@ async def get_bookings(
     check_in: Optional[date] = None,
     check_out: Optional[date] = None,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_read_db),
 ):
     """
     Get list of bookings with optional filters
@@ -230,7 +270,7 @@ async def get_bookings(
     Note: Regular users can only see their own bookings. Admins can see all bookings.
     """
     try:
-        query = db.query(Booking)
+        query = select(Booking)
         
         # Check if user is admin
         user_roles = current_user.get("roles", [])
@@ -255,18 +295,19 @@ async def get_bookings(
                 customer_id = None
         
         if customer_id:
-            query = query.filter(Booking.customer_id == customer_id)
+            query = query.where(Booking.customer_id == customer_id)
         if room_id:
-            query = query.filter(Booking.room_id == room_id)
+            query = query.where(Booking.room_id == room_id)
         if status_filter:
-            query = query.filter(Booking.status == status_filter)
+            query = query.where(Booking.status == status_filter)
         if check_in:
-            query = query.filter(Booking.check_in >= check_in)
+            query = query.where(Booking.check_in >= check_in)
         if check_out:
-            query = query.filter(Booking.check_out <= check_out)
+            query = query.where(Booking.check_out <= check_out)
         
         # Eager load details relationship to avoid N+1 queries
-        bookings = query.options(joinedload(Booking.details)).order_by(Booking.check_in.desc()).all()
+        query = query.options(joinedload(Booking.details)).order_by(Booking.check_in.desc())
+        bookings = (await db.execute(query)).unique().scalars().all()
         
         # Convert bookings to response format
         result = []
@@ -297,7 +338,7 @@ async def get_bookings(
 async def get_booking(
     booking_id: int,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     Get booking by ID
@@ -305,7 +346,8 @@ async def get_booking(
     Note: Regular users can only see their own bookings. Admins can see all bookings.
     """
     # Eager load details relationship
-    booking = db.query(Booking).options(joinedload(Booking.details)).filter(Booking.id == booking_id).first()
+    query = select(Booking).options(joinedload(Booking.details)).where(Booking.id == booking_id)
+    booking = (await db.execute(query)).unique().scalar_one_or_none()
     if not booking:
         raise HTTPException(status_code=404, detail="Booking not found")
 
@@ -551,11 +593,16 @@ async def get_available_rooms(
         raise HTTPException(status_code=400, detail="check_out must be after check_in")
 
     try:
-        rooms = await call_service(ROOM_SERVICE_URL, "rooms", headers=auth_header)
+        # Room status decides availability: read it from the room primary
+        rooms = await call_service(
+            ROOM_SERVICE_URL, "rooms", headers={**auth_header, READ_CONSISTENCY_HEADER: "primary"}
+        )
         if not isinstance(rooms, list):
             raise HTTPException(status_code=502, detail="Room service returned invalid rooms list")
     except ServiceHTTPError as e:
-        raise HTTPException(status_code=502, detail=f"Room service error: {getattr(e, 'message', str(e))}")
+        # 503 (e.g. circuit breaker open) is passed on so clients know to retry later
+        code = 503 if getattr(e, "status_code", None) == 503 else 502
+        raise HTTPException(status_code=code, detail=f"Room service error: {getattr(e, 'message', str(e))}")
     except Exception as e:
         raise HTTPException(status_code=502, detail=f"Room service unavailable: {str(e)}")
 
@@ -626,3 +673,9 @@ async def get_booking_details(
 @app.get("/health")
 async def health_check():
     return {"status": "healthy", "service": "booking-service"}
+
+
+@app.get("/debug/db-pool")
+async def db_pool_stats():
+    """Connection pool gauges (checked out, overflow, wait and connect time) of both engines and the read replica"""
+    return {"sync": pool_stats(engine), "async": pool_stats(async_engine), "read": read_replica.stats()}
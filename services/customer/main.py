@@ -3,16 +3,23 @@ Customer Service - Customer Management Service
 """
 from fastapi import FastAPI, Depends, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
 from typing import List, Optional
 import sys
 import os
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '../../'))
 
-from database import get_db, Base, engine
+from database import get_db, get_async_read_db, Base, engine, async_engine, AsyncSessionLocal, read_replica
 from shared.common.dependencies import get_current_user
-from shared.utils.http_client import call_service
+from shared.utils.http_client import ServiceCall, call_service, call_service_many, service_clients
+from shared.common.cache import create_cache
+from shared.common.compression import CompressionMiddleware
+from shared.common.db_pool import pool_stats
+from shared.common.deadline import DeadlineMiddleware
+from shared.common.tracing import TracingMiddleware, instrument_engine
 from models import Customer, CustomerProfile
 from fastapi import Request
 from shared.common.dependencies import get_token
@@ -37,8 +44,57 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Honour the caller's X-Request-Deadline for this request and nested calls
+app.add_middleware(DeadlineMiddleware)
+
+# gzip/brotli for large responses; the gateway relays them without re-encoding
+app.add_middleware(CompressionMiddleware)
+
+# Spans for the request, its SQL and outgoing calls; Server-Timing on every response
+app.add_middleware(TracingMiddleware, service_name="customer-service")
+instrument_engine(engine)
+instrument_engine(async_engine)
+for replica_engine in read_replica.engines():
+    instrument_engine(replica_engine)
+
 # Service URLs
 BOOKING_SERVICE_URL = os.getenv("BOOKING_SERVICE_URL", "http://booking-service:8000")
+ROOM_SERVICE_URL = os.getenv("ROOM_SERVICE_URL", "http://room-service:8000")
+
+
+# One pooled keep-alive client per called service, for the app's lifetime
+@app.on_event("startup")
+async def open_service_clients():
+    await service_clients.start(BOOKING_SERVICE_URL, ROOM_SERVICE_URL)
+
+
+@app.on_event("shutdown")
+async def close_service_clients():
+    await service_clients.close()
+
+
+# Customers by id are served from the shared cache; every write below
+# invalidates the customer it changes
+cache = create_cache("customer-service")
+
+
+@app.on_event("shutdown")
+async def close_cache():
+    await cache.close()
+
+
+async def _load_customer(customer_id: int) -> Optional[dict]:
+    """Customer (with profile) as response data, through the cache; None if not found"""
+
+    async def load():
+        # Own session: the load is shared by concurrent requests
+        query = select(Customer).options(selectinload(Customer.profile)).where(Customer.id == customer_id)
+        async with AsyncSessionLocal() as db:
+            customer = (await db.execute(query)).scalar_one_or_none()
+        return CustomerResponse.model_validate(customer).model_dump(mode="json") if customer else None
+
+    return await cache.get_or_load("customers", customer_id, load)
+
 
 # Create tables
 Base.metadata.create_all(bind=engine)
@@ -80,7 +136,7 @@ async def get_customers(
     limit: int = 100,
     search: Optional[str] = None,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """
     Get list of customers with optional search
@@ -89,47 +145,45 @@ async def get_customers(
     - **limit**: Maximum number of records to return
     - **search**: Search by name, email, or phone
     """
-    query = db.query(Customer)
+    query = select(Customer).options(selectinload(Customer.profile))
     
     if search:
         search_term = f"%{search}%"
-        query = query.filter(
-            (Customer.name.ilike(search_term)) |
-            (Customer.email.ilike(search_term)) |
-            (Customer.phone.ilike(search_term))
-        )
+        query = query.where(or_(
+            Customer.name.ilike(search_term),
+            Customer.email.ilike(search_term),
+            Customer.phone.ilike(search_term),
+        ))
     
-    customers = query.offset(skip).limit(limit).all()
+    customers = (await db.execute(query.offset(skip).limit(limit))).scalars().all()
     return [CustomerResponse.model_validate(customer) for customer in customers]
 
 
 @app.get("/customers/{customer_id}", response_model=CustomerResponse)
 async def get_customer(
     customer_id: int,
-    current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: dict = Depends(get_current_user)
 ):
     """Get customer by ID"""
-    customer = db.query(Customer).filter(Customer.id == customer_id).first()
+    customer = await _load_customer(customer_id)
     if not customer:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Customer not found"
         )
-    return CustomerResponse.model_validate(customer)
+    return customer
 
 
 @app.get("/customers/{customer_id}/with-history", response_model=CustomerWithHistory)
 async def get_customer_with_history(
     customer_id: int,
     request: Request,
-    current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: dict = Depends(get_current_user)
 ):
     """
     Get customer with booking history
     """
-    customer = db.query(Customer).filter(Customer.id == customer_id).first()
+    customer = await _load_customer(customer_id)
     if not customer:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -149,19 +203,21 @@ async def get_customer_with_history(
             headers=auth_header
         )
         
+        # Get room info from Room Service, concurrently and once per room;
+        # bookings without a room are left out of the history
+        bookings = [booking for booking in bookings if booking.get('room_id') is not None]
+        rooms = await call_service_many(
+            [ServiceCall(ROOM_SERVICE_URL, f"rooms/{booking['room_id']}", headers=auth_header) for booking in bookings],
+            name="customer_history_rooms",
+        )
+
         # Format booking history
         from schemas import BookingHistoryItem
         history = []
-        for booking in bookings:
-            # Get room info from Room Service
-            try:
-                room = await call_service(
-                    os.getenv("ROOM_SERVICE_URL", "http://room-service:8000"),
-                    f"rooms/{booking['room_id']}",
-                    headers=auth_header
-                )
-                room_number = room.get('room_number', f"Room {booking['room_id']}")
-            except:
+        for booking, room in zip(bookings, rooms):
+            if room.ok and isinstance(room.value, dict):
+                room_number = room.value.get('room_number', f"Room {booking['room_id']}")
+            else:
                 room_number = f"Room {booking['room_id']}"
             
             history.append(BookingHistoryItem(
@@ -175,9 +231,8 @@ async def get_customer_with_history(
     except Exception as e:
         history = []
     
-    customer_data = CustomerResponse.model_validate(customer)
     return CustomerWithHistory(
-        **customer_data.dict(),
+        **customer,
         booking_history=history
     )
 
@@ -203,6 +258,7 @@ async def update_customer(
     
     db.commit()
     db.refresh(customer)
+    await cache.invalidate("customers", customer_id)
     return CustomerResponse.model_validate(customer)
 
 
@@ -222,6 +278,7 @@ async def delete_customer(
     
     db.delete(customer)
     db.commit()
+    await cache.invalidate("customers", customer_id)
     return None
 
 
@@ -252,6 +309,8 @@ async def create_customer_profile(
             setattr(existing_profile, field, value)
         db.commit()
         db.refresh(existing_profile)
+        # Cached customers embed their profile
+        await cache.invalidate("customers", customer_id)
         return CustomerProfileResponse.model_validate(existing_profile)
     else:
         # Create new profile
@@ -259,6 +318,7 @@ async def create_customer_profile(
         db.add(new_profile)
         db.commit()
         db.refresh(new_profile)
+        await cache.invalidate("customers", customer_id)
         return CustomerProfileResponse.model_validate(new_profile)
 
 
@@ -282,3 +342,15 @@ async def get_customer_profile(
 async def health_check():
     """Health check endpoint"""
     return {"status": "healthy", "service": "customer-service"}
+
+
+@app.get("/debug/db-pool")
+async def db_pool_stats():
+    """Connection pool gauges (checked out, overflow, wait and connect time) of both engines and the read replica"""
+    return {"sync": pool_stats(engine), "async": pool_stats(async_engine), "read": read_replica.stats()}
+
+
+@app.get("/debug/cache")
+async def cache_stats():
+    """Hit/miss counters and size of the customer cache"""
+    return cache.stats()
@@ -12,9 +12,13 @@ import uuid
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '../../'))
 
-from database import get_db, Base, engine
+from database import get_db, get_read_db, Base, engine, read_replica
 from shared.common.dependencies import get_current_user, get_token
-from shared.utils.http_client import call_service
+from shared.utils.http_client import call_service, service_clients
+from shared.common.compression import CompressionMiddleware
+from shared.common.db_pool import pool_stats
+from shared.common.deadline import DeadlineMiddleware
+from shared.common.tracing import TracingMiddleware, instrument_engine
 from fastapi import Request
 from models import Payment, Invoice
 from schemas import (
@@ -37,10 +41,34 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Honour the caller's X-Request-Deadline for this request and nested calls
+app.add_middleware(DeadlineMiddleware)
+
+# gzip/brotli for large responses; the gateway relays them without re-encoding
+app.add_middleware(CompressionMiddleware)
+
+# Spans for the request, its SQL and outgoing calls; Server-Timing on every response
+app.add_middleware(TracingMiddleware, service_name="payment-service")
+instrument_engine(engine)
+for replica_engine in read_replica.engines():
+    instrument_engine(replica_engine)
+
 # Service URLs
 BOOKING_SERVICE_URL = os.getenv("BOOKING_SERVICE_URL", "http://booking-service:8000")
 CUSTOMER_SERVICE_URL = os.getenv("CUSTOMER_SERVICE_URL", "http://customer-service:8000")
 
+
+# One pooled keep-alive client per called service, for the app's lifetime
+@app.on_event("startup")
+async def open_service_clients():
+    await service_clients.start(BOOKING_SERVICE_URL, CUSTOMER_SERVICE_URL)
+
+
+@app.on_event("shutdown")
+async def close_service_clients():
+    await service_clients.close()
+
+
 # Create tables
 Base.metadata.create_all(bind=engine)
 
@@ -171,7 +199,7 @@ async def get_payments(
     payment_method: Optional[str] = None,
     request: Request = None,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Get list of payments with optional filters
@@ -376,7 +404,7 @@ async def get_transaction_history(
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Get transaction history
@@ -420,7 +448,7 @@ async def get_invoices(
     booking_id: Optional[int] = None,
     status: Optional[str] = None,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get list of invoices"""
     query = db.query(Invoice)
@@ -456,3 +484,9 @@ async def get_invoice(
 async def health_check():
     """Health check endpoint"""
     return {"status": "healthy", "service": "payment-service"}
+
+
+@app.get("/debug/db-pool")
+async def db_pool_stats():
+    """Connection pool gauges (checked out, overflow, wait and connect time) of the database engine and the read replica"""
+    return {"sync": pool_stats(engine), "read": read_replica.stats()}
@@ -13,7 +13,11 @@ sys.path.append(os.path.join(os.path.dirname(__file__), '../../'))
 
 from database import get_db, Base, engine
 from shared.common.dependencies import get_current_user, get_token
-from shared.utils.http_client import call_service
+from shared.utils.http_client import call_service, service_clients
+from shared.common.compression import CompressionMiddleware
+from shared.common.db_pool import pool_stats
+from shared.common.deadline import DeadlineMiddleware
+from shared.common.tracing import TracingMiddleware, instrument_engine
 from fastapi import Request
 from models import Report
 from schemas import ReportCreate, ReportResponse
@@ -33,12 +37,34 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Honour the caller's X-Request-Deadline for this request and nested calls
+app.add_middleware(DeadlineMiddleware)
+
+# gzip/brotli for large responses; the gateway relays them without re-encoding
+app.add_middleware(CompressionMiddleware)
+
+# Spans for the request, its SQL and outgoing calls; Server-Timing on every response
+app.add_middleware(TracingMiddleware, service_name="report-service")
+instrument_engine(engine)
+
 # Service URLs
 BOOKING_SERVICE_URL = os.getenv("BOOKING_SERVICE_URL", "http://booking-service:8000")
 PAYMENT_SERVICE_URL = os.getenv("PAYMENT_SERVICE_URL", "http://payment-service:8000")
 ROOM_SERVICE_URL = os.getenv("ROOM_SERVICE_URL", "http://room-service:8000")
 CUSTOMER_SERVICE_URL = os.getenv("CUSTOMER_SERVICE_URL", "http://customer-service:8000")
 
+
+# One pooled keep-alive client per called service, for the app's lifetime
+@app.on_event("startup")
+async def open_service_clients():
+    await service_clients.start(BOOKING_SERVICE_URL, PAYMENT_SERVICE_URL, ROOM_SERVICE_URL, CUSTOMER_SERVICE_URL)
+
+
+@app.on_event("shutdown")
+async def close_service_clients():
+    await service_clients.close()
+
+
 # Create tables
 Base.metadata.create_all(bind=engine)
 
@@ -488,3 +514,9 @@ async def get_dashboard_data(
 async def health_check():
     """Health check endpoint"""
     return {"status": "healthy", "service": "report-service"}
+
+
+@app.get("/debug/db-pool")
+async def db_pool_stats():
+    """Connection pool gauges (checked out, overflow, wait and connect time) of the database engine"""
+    return {"sync": pool_stats(engine)}
@@ -1,9 +1,11 @@
 """
 Room Service - Room Management Service
 """
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, status, Request
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
 from typing import List, Optional
 from datetime import date, datetime
 import sys
@@ -11,13 +13,18 @@ import os
 
 sys.path.append(os.path.join(os.path.dirname(__file__), "../../"))
 
-from database import get_db, Base, engine
-from shared.common.dependencies import get_current_user
+from database import get_db, get_async_db, get_async_read_db, Base, engine, async_engine, AsyncSessionLocal, read_replica
+from shared.common.dependencies import get_current_user, resolve_token_payload
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from shared.utils.jwt_handler import verify_token
 
 security = HTTPBearer(auto_error=False)  # auto_error=False allows requests without token
-from shared.utils.http_client import call_service
+from shared.utils.http_client import ServiceCall, call_service, call_service_many, service_clients
+from shared.common.cache import create_cache
+from shared.common.compression import CompressionMiddleware
+from shared.common.db_pool import pool_stats
+from shared.common.deadline import DeadlineMiddleware
+from shared.common.read_replica import READ_CONSISTENCY_HEADER, wants_primary
+from shared.common.tracing import TracingMiddleware, instrument_engine
 from models import Room, RoomType
 from schemas import (
     RoomCreate,
@@ -50,14 +57,33 @@ def _safe_parse_date(value: str) -> Optional[date]:
             return None
 
 
+def _conflicting_bookings(bookings: list, check_in: date, check_out: date) -> list:
+    """Bookings still active that overlap [check_in, check_out)"""
+    active_bookings = []
+    for booking in bookings:
+        if booking.get("status") in ["cancelled", "checked_out", "completed"]:
+            continue
+
+        bci = _safe_parse_date(booking.get("check_in", ""))
+        bco = _safe_parse_date(booking.get("check_out", ""))
+        if not bci or not bco:
+            continue
+
+        # overlap: NOT (requested ends before booking starts OR requested starts after booking ends)
+        if not (check_out <= bci or check_in >= bco):
+            active_bookings.append(booking)
+    return active_bookings
+
+
 async def get_optional_user(
+    request: Request,
     credentials: HTTPAuthorizationCredentials = Depends(security),
 ) -> Optional[dict]:
     """Optional user dependency - returns None if no token provided"""
     if not credentials:
         return None
     token = credentials.credentials
-    payload = verify_token(token)
+    payload = resolve_token_payload(request, token)
     if payload:
         payload["token"] = token
     return payload
@@ -78,9 +104,45 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Honour the caller's X-Request-Deadline for this request and nested calls
+app.add_middleware(DeadlineMiddleware)
+
+# gzip/brotli for large responses; the gateway relays them without re-encoding
+app.add_middleware(CompressionMiddleware)
+
+# Spans for the request, its SQL and outgoing calls; Server-Timing on every response
+app.add_middleware(TracingMiddleware, service_name="room-service")
+instrument_engine(engine)
+instrument_engine(async_engine)
+for replica_engine in read_replica.engines():
+    instrument_engine(replica_engine)
+
 # Service URLs
 BOOKING_SERVICE_URL = os.getenv("BOOKING_SERVICE_URL", "http://booking-service:8000")
 
+
+# One pooled keep-alive client per called service, for the app's lifetime
+@app.on_event("startup")
+async def open_service_clients():
+    await service_clients.start(BOOKING_SERVICE_URL)
+
+
+@app.on_event("shutdown")
+async def close_service_clients():
+    await service_clients.close()
+
+
+# Hot lookups (rooms by id, room types) are served from the shared cache;
+# every write below invalidates what it changes. Loaders open their own
+# session: a load is shared by concurrent requests and may outlive the first.
+cache = create_cache("room-service")
+
+
+@app.on_event("shutdown")
+async def close_cache():
+    await cache.close()
+
+
 # Create tables
 Base.metadata.create_all(bind=engine)
 
@@ -106,32 +168,43 @@ async def create_room_type(
     db.add(new_room_type)
     db.commit()
     db.refresh(new_room_type)
+    await cache.invalidate_namespace("room-types")
     return RoomTypeResponse.model_validate(new_room_type)
 
 
 @app.get("/room-types", response_model=List[RoomTypeResponse])
 async def get_room_types(
     current_user: Optional[dict] = Depends(get_optional_user),
-    db: Session = Depends(get_db),
 ):
     """Get all room types (Public endpoint - can be accessed without authentication)"""
-    return [RoomTypeResponse.model_validate(rt) for rt in db.query(RoomType).all()]
+
+    async def load():
+        async with read_replica.async_session() as db:
+            room_types = (await db.execute(select(RoomType))).scalars().all()
+        return [RoomTypeResponse.model_validate(rt).model_dump(mode="json") for rt in room_types]
+
+    return await cache.get_or_load("room-types", "all", load)
 
 
 @app.get("/room-types/{room_type_id}", response_model=RoomTypeResponse)
 async def get_room_type(
     room_type_id: int,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db),
 ):
     """Get room type by ID"""
-    room_type = db.query(RoomType).filter(RoomType.id == room_type_id).first()
+
+    async def load():
+        async with AsyncSessionLocal() as db:
+            room_type = await db.get(RoomType, room_type_id)
+        return RoomTypeResponse.model_validate(room_type).model_dump(mode="json") if room_type else None
+
+    room_type = await cache.get_or_load("room-types", room_type_id, load)
     if not room_type:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Room type not found",
         )
-    return RoomTypeResponse.model_validate(room_type)
+    return room_type
 
 
 @app.put("/room-types/{room_type_id}", response_model=RoomTypeResponse)
@@ -155,6 +228,9 @@ async def update_room_type(
 
     db.commit()
     db.refresh(room_type)
+    # Cached rooms embed their room type
+    await cache.invalidate_namespace("room-types")
+    await cache.invalidate_namespace("rooms")
     return RoomTypeResponse.model_validate(room_type)
 
 
@@ -204,7 +280,7 @@ async def get_rooms(
     status: Optional[str] = None,
     floor: Optional[int] = None,
     current_user: Optional[dict] = Depends(get_optional_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_read_db),
 ):
     """
     Get list of rooms with optional filters (Public endpoint)
@@ -213,16 +289,16 @@ async def get_rooms(
     - **status**: Filter by status (available, booked, occupied, maintenance)
     - **floor**: Filter by floor
     """
-    query = db.query(Room)
+    query = select(Room).options(selectinload(Room.room_type))
 
     if room_type_id:
-        query = query.filter(Room.room_type_id == room_type_id)
+        query = query.where(Room.room_type_id == room_type_id)
     if status:
-        query = query.filter(Room.status == status)
+        query = query.where(Room.status == status)
     if floor:
-        query = query.filter(Room.floor == floor)
+        query = query.where(Room.floor == floor)
 
-    rooms = query.all()
+    rooms = (await db.execute(query)).scalars().all()
     return [RoomResponse.model_validate(room) for room in rooms]
 
 
@@ -238,7 +314,7 @@ async def get_available_rooms(
     check_out: Optional[date] = None,
     room_type_id: Optional[int] = None,
     current_user: Optional[dict] = Depends(get_optional_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     Get list of available rooms
@@ -247,29 +323,30 @@ async def get_available_rooms(
     - **check_out**: Check-out date (optional)
     - **room_type_id**: Filter by room type (optional)
     """
-    query = db.query(Room).filter(Room.status == "available")
+    query = select(Room).options(selectinload(Room.room_type)).where(Room.status == "available")
 
     if room_type_id:
-        query = query.filter(Room.room_type_id == room_type_id)
+        query = query.where(Room.room_type_id == room_type_id)
 
-    rooms = query.all()
+    rooms = (await db.execute(query)).scalars().all()
 
-    # If dates provided, filter by availability using Booking Service
+    # If dates provided, filter by availability using Booking Service,
+    # fetching the bookings of every room concurrently (from the booking
+    # primary: a lagging replica could miss a new booking)
     if check_in and check_out:
+        token = current_user.get("token", "") if current_user else ""
+        auth_header = {"Authorization": f"Bearer {token}"} if token else {}
+        auth_header[READ_CONSISTENCY_HEADER] = "primary"
+        room_bookings = await call_service_many(
+            [ServiceCall(BOOKING_SERVICE_URL, f"bookings?room_id={room.id}", headers=auth_header) for room in rooms],
+            name="available_rooms",
+        )
         available_rooms: List[Room] = []
-        for room in rooms:
-            try:
-                availability = await check_room_availability(
-                    room_id=room.id,
-                    check_in=check_in,
-                    check_out=check_out,
-                    current_user=current_user,
-                    db=db,
-                )
-                if availability.available:
-                    available_rooms.append(room)
-            except Exception:
-                # If check fails, keep it if status is available
+        for room, bookings in zip(rooms, room_bookings):
+            # If check fails, keep it since its status is available
+            if not bookings.ok or not isinstance(bookings.value, list):
+                available_rooms.append(room)
+            elif not _conflicting_bookings(bookings.value, check_in, check_out):
                 available_rooms.append(room)
         rooms = available_rooms
 
@@ -282,7 +359,7 @@ async def check_room_availability(
     check_in: date,
     check_out: date,
     current_user: Optional[dict] = Depends(get_optional_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     Check room availability for given dates
@@ -290,7 +367,7 @@ async def check_room_availability(
     This endpoint checks if a room is available for the specified date range
     by querying the Booking Service for conflicting bookings.
     """
-    room = db.query(Room).filter(Room.id == room_id).first()
+    room = (await db.execute(select(Room).where(Room.id == room_id))).scalar_one_or_none()
     if not room:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -316,10 +393,11 @@ async def check_room_availability(
             check_out=check_out,
         )
 
-    # Check for conflicting bookings via Booking Service
+    # Check for conflicting bookings via Booking Service (primary reads)
     try:
         token = current_user.get("token", "") if current_user else ""
         auth_header = {"Authorization": f"Bearer {token}"} if token else {}
+        auth_header[READ_CONSISTENCY_HEADER] = "primary"
 
         bookings = await call_service(
             BOOKING_SERVICE_URL,
@@ -327,19 +405,7 @@ async def check_room_availability(
             headers=auth_header,
         )
 
-        active_bookings = []
-        for booking in bookings:
-            if booking.get("status") in ["cancelled", "checked_out", "completed"]:
-                continue
-
-            bci = _safe_parse_date(booking.get("check_in", ""))
-            bco = _safe_parse_date(booking.get("check_out", ""))
-            if not bci or not bco:
-                continue
-
-            # overlap: NOT (requested ends before booking starts OR requested starts after booking ends)
-            if not (check_out <= bci or check_in >= bco):
-                active_bookings.append(booking)
+        active_bookings = _conflicting_bookings(bookings, check_in, check_out)
 
         if active_bookings:
             return RoomAvailability(
@@ -384,17 +450,28 @@ async def check_room_availability(
 @app.get("/rooms/{room_id}", response_model=RoomResponse)
 async def get_room(
     room_id: int,
+    request: Request,
     current_user: Optional[dict] = Depends(get_optional_user),
-    db: Session = Depends(get_db),
 ):
     """Get room by ID (Public endpoint)"""
-    room = db.query(Room).filter(Room.id == room_id).first()
+
+    async def load():
+        query = select(Room).options(selectinload(Room.room_type)).where(Room.id == room_id)
+        async with AsyncSessionLocal() as db:
+            room = (await db.execute(query)).scalar_one_or_none()
+        return RoomResponse.model_validate(room).model_dump(mode="json") if room else None
+
+    # Callers about to book ask for primary data: skip the cache
+    if wants_primary(request):
+        room = await load()
+    else:
+        room = await cache.get_or_load("rooms", room_id, load)
     if not room:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Room not found",
         )
-    return RoomResponse.model_validate(room)
+    return room
 
 
 @app.put("/rooms/{room_id}", response_model=RoomResponse)
@@ -436,6 +513,7 @@ async def update_room(
 
     db.commit()
     db.refresh(room)
+    await cache.invalidate("rooms", room_id)
     return RoomResponse.model_validate(room)
 
 
@@ -464,6 +542,7 @@ async def delete_room(
 
     db.delete(room)
     db.commit()
+    await cache.invalidate("rooms", room_id)
     return None
 
 
@@ -498,6 +577,7 @@ async def update_room_status(
     room.status = new_status
     db.commit()
     db.refresh(room)
+    await cache.invalidate("rooms", room_id)
     return RoomResponse.model_validate(room)
 
 
@@ -505,3 +585,15 @@ async def update_room_status(
 async def health_check():
     """Health check endpoint"""
     return {"status": "healthy", "service": "room-service"}
+
+
+@app.get("/debug/db-pool")
+async def db_pool_stats():
+    """Connection pool gauges (checked out, overflow, wait and connect time) of both engines and the read replica"""
+    return {"sync": pool_stats(engine), "async": pool_stats(async_engine), "read": read_replica.stats()}
+
+
+@app.get("/debug/cache")
+async def cache_stats():
+    """Hit/miss counters and size of the room and room type cache"""
+    return cache.stats()
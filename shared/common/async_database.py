@@ -0,0 +1,71 @@
+"""
+Async database access - non-blocking SQLAlchemy sessions for async handlers
+
+The services' synchronous SessionLocal (pymysql) blocks the event loop for the
+whole duration of every query, stalling every other request and in-flight
+call_service await of the worker. Handlers ported to the async session await
+their queries instead, so one worker overlaps database I/O across requests.
+
+The async URL is derived from DATABASE_URL by swapping in the async driver of
+the same database (pymysql -> aiomysql, sqlite -> aiosqlite for local runs);
+DATABASE_ASYNC_URL overrides it.
+
+The async engine gets the same DB_POOL_* sizing and telemetry as the sync
+one (shared/common/db_pool.py).
+
+Async sessions cannot lazy-load relationships: ported queries load the
+relationships their response models need eagerly (selectinload/joinedload).
+"""
+import os
+from typing import AsyncIterator, Callable, Tuple
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+
+from shared.common.db_pool import instrument_pool, pool_options
+
+# Sync driver -> async driver for the same database
+ASYNC_DRIVERS = {
+    "mysql": "mysql+aiomysql",
+    "mysql+pymysql": "mysql+aiomysql",
+    "mysql+mysqldb": "mysql+aiomysql",
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+}
+
+
+def async_database_url(database_url: str, override_env: str = "DATABASE_ASYNC_URL") -> str:
+    """$override_env, or database_url with its driver replaced by the async one"""
+    override = os.getenv(override_env, "").strip()
+    if override:
+        return override
+    url = make_url(database_url)
+    driver = ASYNC_DRIVERS.get(url.drivername)
+    if driver is None:
+        # Already async (or unknown): use as given
+        return database_url
+    return url.set(drivername=driver).render_as_string(hide_password=False)
+
+
+def create_async_database(database_url: str, url_override_env: str = "DATABASE_ASYNC_URL",
+                          **engine_kwargs) -> Tuple[AsyncEngine, async_sessionmaker]:
+    """Async engine (env-configured, instrumented pool) and session factory for the database behind database_url"""
+    url = async_database_url(database_url, url_override_env)
+    engine = create_async_engine(url, **{"echo": False, **pool_options(url, asynchronous=True), **engine_kwargs})
+    instrument_pool(engine)
+    # expire_on_commit=False: committed objects stay readable without a
+    # (not allowed) implicit refresh from an async context
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+    return engine, session_factory
+
+
+def async_session_dependency(session_factory: async_sessionmaker) -> Callable[[], AsyncIterator[AsyncSession]]:
+    """FastAPI dependency yielding an AsyncSession, closed after the request (same contract as get_db)"""
+
+    async def get_async_db() -> AsyncIterator[AsyncSession]:
+        async with session_factory() as db:
+            yield db
+
+    return get_async_db
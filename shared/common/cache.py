@@ -0,0 +1,418 @@
+"""
+Two-tier cache for hot lookups (rooms by id, room types, customers by id)
+
+Cache.get_or_load(namespace, key, loader) returns the cached value or awaits
+loader() once and stores its result:
+
+- tier 1 is an in-process LRU dict with per-entry TTL (CACHE_LOCAL_MAX_ENTRIES);
+- tier 2 is an optional shared backend selected by CACHE_URL: empty or
+  "memory" keeps only tier 1 (the default), "redis://[:password@]host:port/db"
+  uses any server speaking the Redis protocol (RedisBackend, no client
+  library needed; scripts/resp_stub.py is a local stand-in). Values are
+  stored there as JSON, so loaders return JSON-compatible data (model_dump(mode="json")).
+
+Concurrent misses for the same key share one load (no stampede on a hot key
+expiring). That load runs in its own task and can outlive the request that
+started it, so loaders open their own database session rather than using
+the request's. invalidate() drops one key; invalidate_namespace() drops a whole
+namespace by bumping its generation, which is part of every key, so nothing
+has to be scanned. An invalidation only reaches the other workers' tier 1
+when it expires, so tier-1 entries are kept for at most CACHE_LOCAL_TTL
+seconds (5), backend or not: that bounds how long another worker serves a
+deleted or updated value. With a shared backend, generations are re-read
+from it just as often and entries live there for CACHE_TTL.
+
+A failing backend never fails a request: lookups fall through to the loader
+and the backend is skipped for CACHE_BACKEND_RETRY_AFTER seconds.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+from urllib.parse import unquote, urlparse
+
+T = TypeVar("T")
+
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "true").strip().lower() in ("1", "true", "yes", "on")
+CACHE_URL = os.getenv("CACHE_URL", "").strip()
+CACHE_TTL = float(os.getenv("CACHE_TTL", "30"))
+CACHE_LOCAL_TTL = float(os.getenv("CACHE_LOCAL_TTL", "5"))
+CACHE_LOCAL_MAX_ENTRIES = int(os.getenv("CACHE_LOCAL_MAX_ENTRIES", "1024"))
+CACHE_BACKEND_TIMEOUT = float(os.getenv("CACHE_BACKEND_TIMEOUT", "0.25"))
+CACHE_BACKEND_MAX_CONNECTIONS = int(os.getenv("CACHE_BACKEND_MAX_CONNECTIONS", "10"))
+CACHE_BACKEND_RETRY_AFTER = float(os.getenv("CACHE_BACKEND_RETRY_AFTER", "10"))
+
+logger = logging.getLogger(__name__)
+
+
+class _Load:
+    """One in-flight load; stale once an invalidation hits its key"""
+
+    __slots__ = ("task", "stale")
+
+    def __init__(self):
+        self.task: Optional["asyncio.Task"] = None
+        self.stale = False
+
+
+class CacheBackendError(Exception):
+    """The shared backend failed or answered with an error"""
+
+
+class CacheBackend(ABC):
+    """Shared store behind the in-process tier (bytes values, per-key TTL)"""
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[bytes]:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, value: bytes, ttl: float):
+        ...
+
+    @abstractmethod
+    async def delete(self, *keys: str):
+        ...
+
+    @abstractmethod
+    async def incr(self, key: str) -> int:
+        ...
+
+    async def close(self):
+        pass
+
+
+def _encode_command(*args) -> bytes:
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if not isinstance(arg, bytes):
+            arg = str(arg).encode("utf-8")
+        parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+    return b"".join(parts)
+
+
+async def _read_reply(reader: asyncio.StreamReader):
+    line = await reader.readline()
+    if not line.endswith(b"\r\n"):
+        raise ConnectionError("connection closed")
+    kind, rest = line[:1], line[1:-2]
+    if kind == b"+":
+        return rest.decode("utf-8")
+    if kind == b"-":
+        raise CacheBackendError(rest.decode("utf-8", "replace"))
+    if kind == b":":
+        return int(rest)
+    if kind == b"$":
+        length = int(rest)
+        if length < 0:
+            return None
+        return (await reader.readexactly(length + 2))[:-2]
+    if kind == b"*":
+        length = int(rest)
+        if length < 0:
+            return None
+        return [await _read_reply(reader) for _ in range(length)]
+    raise ValueError(f"unexpected reply {line[:20]!r}")
+
+
+class RedisBackend(CacheBackend):
+    """Minimal Redis-protocol (RESP) client: GET/SET/DEL/INCR over pooled connections"""
+
+    def __init__(self, url: str, timeout: float = CACHE_BACKEND_TIMEOUT,
+                 max_connections: int = CACHE_BACKEND_MAX_CONNECTIONS):
+        parsed = urlparse(url)
+        if parsed.scheme not in ("redis", "tcp"):
+            raise ValueError(f"Unsupported cache URL {url!r}")
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.username = unquote(parsed.username) if parsed.username else None
+        path = parsed.path.strip("/")
+        self.db = int(path) if path else 0
+        self.timeout = timeout
+        self._idle: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+        self._slots = asyncio.Semaphore(max_connections)
+
+    async def _connect(self) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        setup = []
+        if self.password is not None:
+            setup.append(("AUTH", self.username, self.password) if self.username else ("AUTH", self.password))
+        if self.db:
+            setup.append(("SELECT", self.db))
+        for command in setup:
+            writer.write(_encode_command(*command))
+            await writer.drain()
+            await _read_reply(reader)
+        return reader, writer
+
+    async def _call(self, *args):
+        async with self._slots:
+            connection = self._idle.pop() if self._idle else None
+            try:
+                if connection is None:
+                    connection = await asyncio.wait_for(self._connect(), self.timeout)
+                reader, writer = connection
+                writer.write(_encode_command(*args))
+                reply = await asyncio.wait_for(_read_reply(reader), self.timeout)
+            except CacheBackendError:
+                # An error reply leaves the connection usable
+                self._idle.append(connection)
+                raise
+            except BaseException as e:
+                # Closed, timed out mid-reply or cancelled: the connection's
+                # stream position is unknown
+                if connection is not None:
+                    connection[1].close()
+                if isinstance(e, (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError)):
+                    raise CacheBackendError(f"{type(e).__name__}: {e}") from e
+                raise
+            self._idle.append(connection)
+            return reply
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self._call("GET", key)
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        await self._call("SET", key, value, "PX", max(1, int(ttl * 1000)))
+
+    async def delete(self, *keys: str):
+        if keys:
+            await self._call("DEL", *keys)
+
+    async def incr(self, key: str) -> int:
+        return await self._call("INCR", key)
+
+    async def close(self):
+        idle, self._idle = self._idle, []
+        for _, writer in idle:
+            writer.close()
+
+
+def backend_from_url(url: str) -> Optional[CacheBackend]:
+    """Shared backend for CACHE_URL, or None for the in-process tier only"""
+    if not url or url == "memory":
+        return None
+    return RedisBackend(url)
+
+
+class Cache:
+    """Get-or-load cache: in-process LRU + TTL in front of an optional shared backend
+
+    Args:
+        prefix: prepended to every backend key (the service name), so
+            services can share one backend
+        backend: shared tier; None keeps only the in-process one
+        ttl: default entry lifetime in seconds
+        local_ttl: cap on in-process lifetimes (the staleness bound across workers)
+    """
+
+    def __init__(self, prefix: str, backend: Optional[CacheBackend] = None, ttl: float = CACHE_TTL,
+                 local_ttl: float = CACHE_LOCAL_TTL, max_entries: int = CACHE_LOCAL_MAX_ENTRIES,
+                 enabled: bool = CACHE_ENABLED):
+        self.prefix = prefix
+        self.backend = backend
+        self.ttl = ttl
+        self.local_ttl = local_ttl
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        # namespace -> (generation, monotonic time it was read from the backend)
+        self._generations: Dict[str, Tuple[int, float]] = {}
+        self._inflight: Dict[str, _Load] = {}
+        self._backend_down_until = 0.0
+        self.local_hits = 0
+        self.backend_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.load_errors = 0
+        self.backend_errors = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    # -- tier 1 ---------------------------------------------------------
+
+    def _local_get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _local_put(self, key: str, value: Any, ttl: float):
+        ttl = min(ttl, self.local_ttl)
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    # -- tier 2 ---------------------------------------------------------
+
+    def _backend_available(self) -> bool:
+        return self.backend is not None and time.monotonic() >= self._backend_down_until
+
+    def _backend_failed(self, error: Exception):
+        self.backend_errors += 1
+        self._backend_down_until = time.monotonic() + CACHE_BACKEND_RETRY_AFTER
+        logger.warning("Cache backend unavailable, skipping it for %.0fs: %s", CACHE_BACKEND_RETRY_AFTER, error)
+
+    async def _backend_call(self, call: Callable[[], Awaitable[T]]) -> Optional[T]:
+        if not self._backend_available():
+            return None
+        try:
+            return await call()
+        except CacheBackendError as e:
+            self._backend_failed(e)
+            return None
+
+    # -- keys -----------------------------------------------------------
+
+    def _generation_key(self, namespace: str) -> str:
+        return f"{self.prefix}:{namespace}:generation"
+
+    async def _generation(self, namespace: str) -> int:
+        cached = self._generations.get(namespace)
+        if cached is not None and (self.backend is None or time.monotonic() - cached[1] < self.local_ttl):
+            return cached[0]
+        generation = cached[0] if cached is not None else 0
+        if self._backend_available():
+            raw = await self._backend_call(lambda: self.backend.get(self._generation_key(namespace)))
+            if raw is not None:
+                # Never go back: a restarted backend must not resurrect old entries
+                generation = max(generation, int(raw))
+        self._generations[namespace] = (generation, time.monotonic())
+        return generation
+
+    async def _key(self, namespace: str, key: Any) -> str:
+        return f"{self.prefix}:{namespace}:{await self._generation(namespace)}:{key}"
+
+    # -- public API -----------------------------------------------------
+
+    async def get_or_load(self, namespace: str, key: Any, loader: Callable[[], Awaitable[T]],
+                          ttl: Optional[float] = None) -> T:
+        """Cached value for (namespace, key), else the result of loader() (None results are not cached)
+
+        loader is shared by concurrent callers and may outlive the first one:
+        it must not use request-scoped resources such as the request's session.
+        """
+        if not self.enabled:
+            return await loader()
+        full_key = await self._key(namespace, key)
+        entry = self._local_get(full_key)
+        if entry is not None:
+            self.local_hits += 1
+            return entry[1]
+
+        load = self._inflight.get(full_key)
+        if load is None:
+            # The load runs in its own task so a disconnecting first caller
+            # does not cancel it for the callers waiting on it
+            load = _Load()
+            load.task = asyncio.ensure_future(self._load(full_key, loader, self.ttl if ttl is None else ttl, load))
+            self._inflight[full_key] = load
+            load.task.add_done_callback(lambda done: self._finished(full_key, load))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(load.task)
+
+    async def _load(self, full_key: str, loader: Callable[[], Awaitable[T]], ttl: float, load: _Load) -> T:
+        raw = await self._backend_call(lambda: self.backend.get(full_key))
+        if raw is not None:
+            try:
+                value = json.loads(raw)
+            except ValueError:
+                value = None
+            if value is not None:
+                self.backend_hits += 1
+                if not load.stale:
+                    self._local_put(full_key, value, ttl)
+                return value
+
+        self.misses += 1
+        try:
+            value = await loader()
+        except BaseException:
+            self.load_errors += 1
+            raise
+        # Invalidated while loading: the value may predate the write, so it
+        # goes to the callers already waiting but is not stored
+        if value is None or load.stale:
+            return value
+        self._local_put(full_key, value, ttl)
+        if self._backend_available():
+            data = json.dumps(value, default=str).encode("utf-8")
+            await self._backend_call(lambda: self.backend.set(full_key, data, ttl))
+        return value
+
+    def _finished(self, key: str, load: _Load):
+        if self._inflight.get(key) is load:
+            del self._inflight[key]
+        # Mark the exception as retrieved even if every waiter went away
+        if not load.task.cancelled():
+            load.task.exception()
+
+    def _detach_load(self, full_key: str):
+        """Mark the in-flight load of full_key stale; later lookups start a new one"""
+        load = self._inflight.pop(full_key, None)
+        if load is not None:
+            load.stale = True
+
+    async def invalidate(self, namespace: str, key: Any):
+        """Drop one entry (call after the write is committed)"""
+        self.invalidations += 1
+        full_key = await self._key(namespace, key)
+        self._detach_load(full_key)
+        self._entries.pop(full_key, None)
+        await self._backend_call(lambda: self.backend.delete(full_key))
+
+    async def invalidate_namespace(self, namespace: str):
+        """Drop every entry of a namespace by moving it to a new generation"""
+        self.invalidations += 1
+        prefix = f"{self.prefix}:{namespace}:"
+        for full_key in [k for k in self._inflight if k.startswith(prefix)]:
+            self._detach_load(full_key)
+        generation = (await self._generation(namespace)) + 1
+        if self._backend_available():
+            bumped = await self._backend_call(lambda: self.backend.incr(self._generation_key(namespace)))
+            if bumped is not None:
+                generation = max(generation, bumped)
+        # Old-generation local entries are unreachable now and age out of the LRU
+        self._generations[namespace] = (generation, time.monotonic())
+
+    async def close(self):
+        if self.backend is not None:
+            await self.backend.close()
+
+    def stats(self) -> dict:
+        lookups = self.local_hits + self.backend_hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "backend": type(self.backend).__name__ if self.backend is not None else "memory",
+            "backend_available": self._backend_available() if self.backend is not None else None,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "local_hits": self.local_hits,
+            "backend_hits": self.backend_hits,
+            "misses": self.misses,
+            "hit_ratio": round((lookups - self.misses) / lookups, 4) if lookups else 0.0,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._inflight),
+            "load_errors": self.load_errors,
+            "backend_errors": self.backend_errors,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+def create_cache(prefix: str) -> Cache:
+    """Cache for one service, configured from the CACHE_* environment"""
+    return Cache(prefix, backend_from_url(CACHE_URL))
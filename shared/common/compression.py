@@ -0,0 +1,216 @@
+"""
+Response compression middleware negotiated from Accept-Encoding
+
+Compresses response bodies with brotli (when the optional "brotli" package is
+installed) or gzip, whichever the client prefers. Bodies are compressed
+incrementally as they are sent, so streaming responses stay streaming.
+
+A response is left untouched when it is smaller than the minimum size, has a
+content type that does not compress well, or already carries a
+Content-Encoding - the API Gateway relays compressed upstream bodies as-is,
+so every body is compressed exactly once, by whichever hop produced it.
+"""
+import os
+import zlib
+from typing import List, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").strip().lower() in ("1", "true", "yes", "on")
+# Bodies smaller than this are sent uncompressed
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+# gzip level 1-9 and brotli quality 0-11; mid values trade little ratio for much less CPU
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+    "text/",
+)
+
+
+def negotiate(accept_encoding: Optional[str]) -> Optional[str]:
+    """Preferred supported coding ("br" or "gzip") from an Accept-Encoding value"""
+    best, best_q = None, 0.0
+    for item in (accept_encoding or "").split(","):
+        coding, _, params = item.strip().partition(";")
+        coding = coding.strip().lower()
+        q = 1.0
+        params = params.replace(" ", "")
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                continue
+        if coding == "*":
+            coding = "br" if brotli is not None else "gzip"
+        if coding not in ("gzip", "br") or (coding == "br" and brotli is None) or q <= 0:
+            continue
+        # brotli wins ties: smaller output for JSON at a comparable cost
+        if q > best_q or (q == best_q and coding == "br"):
+            best, best_q = coding, q
+    return best
+
+
+class _Encoder:
+    def __init__(self, coding: str, gzip_level: int, brotli_quality: int):
+        if coding == "br":
+            self._compressor = brotli.Compressor(quality=brotli_quality)
+            self._compress = self._compressor.process
+            self._flush = self._compressor.finish
+        else:
+            # wbits=31: gzip container
+            self._compressor = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+            self._compress = self._compressor.compress
+            self._flush = self._compressor.flush
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compress(data) if data else b""
+
+    def finish(self) -> bytes:
+        return self._flush()
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing eligible responses with gzip or brotli
+
+    Args:
+        minimum_size: smallest body (bytes) worth compressing
+        gzip_level: zlib compression level for gzip
+        brotli_quality: brotli quality level
+    """
+
+    def __init__(
+        self,
+        app,
+        minimum_size: int = COMPRESSION_MIN_SIZE,
+        gzip_level: int = COMPRESSION_GZIP_LEVEL,
+        brotli_quality: int = COMPRESSION_BROTLI_QUALITY,
+        enabled: bool = COMPRESSION_ENABLED,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.enabled = enabled
+
+    async def __call__(self, scope, receive, send):
+        if not self.enabled or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        coding = None
+        for name, value in scope.get("headers", ()):
+            if name == b"accept-encoding":
+                coding = negotiate(value.decode("latin-1"))
+                break
+        if coding is None or scope.get("method") == "HEAD":
+            await self.app(scope, receive, send)
+            return
+
+        responder = _CompressingResponder(self, coding, send)
+        await self.app(scope, receive, responder)
+
+
+class _CompressingResponder:
+    """Wraps ASGI send for one response; decides at the first body chunks"""
+
+    def __init__(self, middleware: CompressionMiddleware, coding: str, send):
+        self.middleware = middleware
+        self.coding = coding
+        self.send = send
+        self.start = None
+        self.pending: List[bytes] = []
+        self.pending_size = 0
+        # Set once the body turned out large enough to compress
+        self.encoder: Optional[_Encoder] = None
+        self.passthrough = False
+
+    async def __call__(self, message):
+        if message["type"] == "http.response.start":
+            self.start = message
+            if not self._eligible(message):
+                self.passthrough = True
+                await self.send(message)
+            return
+
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.encoder is not None:
+            chunk = self.encoder.compress(body)
+            if not more_body:
+                chunk += self.encoder.finish()
+            if chunk or not more_body:
+                await self.send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+            return
+
+        # Hold back small leading chunks until it is clear whether the body
+        # reaches the minimum size
+        self.pending.append(body)
+        self.pending_size += len(body)
+        if self.pending_size < self.middleware.minimum_size and more_body:
+            return
+
+        buffered = b"".join(self.pending)
+        self.pending = []
+        if self.pending_size < self.middleware.minimum_size:
+            self.passthrough = True
+            await self.send(self.start)
+            await self.send({"type": "http.response.body", "body": buffered, "more_body": False})
+            return
+
+        self.encoder = _Encoder(self.coding, self.middleware.gzip_level, self.middleware.brotli_quality)
+        await self.send(self._compressed_start())
+        chunk = self.encoder.compress(buffered)
+        if not more_body:
+            chunk += self.encoder.finish()
+        await self.send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+    def _eligible(self, message) -> bool:
+        status = message.get("status", 200)
+        if status < 200 or status in (204, 206, 304):
+            return False
+        content_type = b""
+        for name, value in message.get("headers", ()):
+            name = name.lower()
+            if name == b"content-encoding":
+                # Already compressed (e.g. relayed from an upstream service)
+                return False
+            if name == b"content-length" and int(value or 0) < self.middleware.minimum_size:
+                return False
+            if name == b"content-type":
+                content_type = value.lower()
+        return content_type.decode("latin-1").startswith(COMPRESSIBLE_TYPES)
+
+    def _compressed_start(self):
+        headers: List[Tuple[bytes, bytes]] = []
+        vary = None
+        for name, value in self.start.get("headers", ()):
+            lowered = name.lower()
+            if lowered == b"content-length":
+                continue
+            if lowered == b"vary":
+                vary = value
+                continue
+            if lowered == b"etag" and not value.startswith(b"W/"):
+                # The compressed body is a different representation
+                value = b"W/" + value
+            headers.append((name, value))
+        if vary is None:
+            vary = b"Accept-Encoding"
+        elif b"accept-encoding" not in vary.lower():
+            vary = vary + b", Accept-Encoding"
+        headers.append((b"content-encoding", self.coding.encode("latin-1")))
+        headers.append((b"vary", vary))
+        return {**self.start, "headers": headers}
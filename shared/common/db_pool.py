@@ -0,0 +1,274 @@
+"""
+Database connection pools - env-driven sizing and pool telemetry
+
+Every service used to build its engine with SQLAlchemy's default pool (5
+connections + 10 overflow, 30 s timeout, a ping on every checkout). Under
+load the pool is where requests queue, but nothing showed it. The engines are
+now built by create_service_engine() / create_async_database(), sized from
+the environment (the same settings for every service, overridable per
+container):
+
+    DB_POOL_SIZE        connections kept open (5)
+    DB_MAX_OVERFLOW     extra connections opened under load (10)
+    DB_POOL_TIMEOUT     seconds to wait for a free connection (30)
+    DB_POOL_RECYCLE     seconds before a connection is reopened (300)
+    DB_POOL_USE_LIFO    reuse the most recent connection first, so idle ones
+                        age out and get recycled (false)
+    DB_POOL_PRE_PING    always: ping on every checkout (SQLAlchemy pre_ping)
+                        idle:   ping only connections idle for more than
+                                DB_POOL_PING_IDLE seconds (30)
+                        never:  no ping; dead connections are invalidated
+                                when a query fails
+
+The pool classes record checkout wait time (excluding time spent opening a
+connection), connect latency, timeouts, peak usage and invalidations;
+pool_stats() returns them with the live gauges for a service's
+/debug/db-pool endpoint.
+"""
+import os
+import threading
+import time
+import weakref
+from typing import Optional
+
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "300"))
+DB_POOL_USE_LIFO = os.getenv("DB_POOL_USE_LIFO", "false").strip().lower() in ("1", "true", "yes", "on")
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "always").strip().lower()
+DB_POOL_PING_IDLE = float(os.getenv("DB_POOL_PING_IDLE", "30"))
+
+PRE_PING_STRATEGIES = ("always", "idle", "never")
+if DB_POOL_PRE_PING not in PRE_PING_STRATEGIES:
+    raise ValueError(f"DB_POOL_PRE_PING must be one of {', '.join(PRE_PING_STRATEGIES)}, got {DB_POOL_PRE_PING!r}")
+
+
+# Engines built here, so a forked worker can drop the connections it inherited
+_engines: "weakref.WeakSet" = weakref.WeakSet()
+
+
+def _reset_pools_after_fork():
+    # Connections opened by the parent (e.g. create_all in the gunicorn
+    # arbiter) must not be shared: the child starts with empty pools and
+    # leaves the parent's sockets alone
+    for engine in list(_engines):
+        engine.dispose(close=False)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_pools_after_fork)
+
+
+class PoolStats:
+    """Counters of one engine's pool (shared by the pools it recreates)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.waiting = 0
+        self.peak_checked_out = 0
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.connects = 0
+        self.connect_seconds = 0.0
+        self.max_connect_seconds = 0.0
+        self.invalidations = 0
+        self.pings = 0
+        self.ping_failures = 0
+
+    def wait_started(self):
+        with self._lock:
+            self.waiting += 1
+
+    def checked_out(self, wait_seconds: float, checked_out: int):
+        with self._lock:
+            self.waiting -= 1
+            self.checkouts += 1
+            self.wait_seconds += wait_seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, wait_seconds)
+            self.peak_checked_out = max(self.peak_checked_out, checked_out)
+
+    def checkout_failed(self, timed_out: bool):
+        with self._lock:
+            self.waiting -= 1
+            if timed_out:
+                self.timeouts += 1
+
+    def connected(self, seconds: float):
+        with self._lock:
+            self.connects += 1
+            self.connect_seconds += seconds
+            self.max_connect_seconds = max(self.max_connect_seconds, seconds)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "waiting": self.waiting,
+                "peak_checked_out": self.peak_checked_out,
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_ms": {
+                    "total": round(self.wait_seconds * 1000, 1),
+                    "avg": round(self.wait_seconds * 1000 / self.checkouts, 3) if self.checkouts else 0.0,
+                    "max": round(self.max_wait_seconds * 1000, 1),
+                },
+                "connects": self.connects,
+                "connect_ms": {
+                    "avg": round(self.connect_seconds * 1000 / self.connects, 1) if self.connects else 0.0,
+                    "max": round(self.max_connect_seconds * 1000, 1),
+                },
+                "invalidations": self.invalidations,
+                "pings": self.pings,
+                "ping_failures": self.ping_failures,
+            }
+
+
+class _InstrumentedPool:
+    """Times every checkout; mixed into the QueuePool classes below"""
+
+    def __init__(self, *args, **kwargs):
+        self.stats = PoolStats()
+        super().__init__(*args, **kwargs)
+
+    def connect(self):
+        self.stats.wait_started()
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            self.stats.checkout_failed(timed_out=True)
+            raise
+        except BaseException:
+            self.stats.checkout_failed(timed_out=False)
+            raise
+        # Time spent opening a new connection is connect latency, not waiting
+        connect_seconds = connection.info.pop("_pool_connect_seconds", 0.0)
+        self.stats.checked_out(max(0.0, time.perf_counter() - started - connect_seconds), self.checkedout())
+        return connection
+
+    def recreate(self):
+        # engine.dispose() swaps in a fresh pool: keep the counters
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+class InstrumentedQueuePool(_InstrumentedPool, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_InstrumentedPool, AsyncAdaptedQueuePool):
+    pass
+
+
+def _pooled(database_url: str, asynchronous: bool) -> bool:
+    """Whether database_url gets the configured QueuePool
+
+    Not for in-memory SQLite, which must keep SQLAlchemy's single-connection
+    pool, nor aiosqlite (local runs): each of its connections holds a
+    non-daemon thread, so pooled ones would keep the process from exiting.
+    """
+    url = make_url(database_url)
+    if url.get_backend_name() != "sqlite":
+        return True
+    return not asynchronous and url.database not in (None, "", ":memory:")
+
+
+def pool_options(database_url: str, asynchronous: bool = False) -> dict:
+    """create_engine()/create_async_engine() pool arguments from the DB_POOL_* settings"""
+    options = {"pool_pre_ping": DB_POOL_PRE_PING == "always"}
+    if _pooled(database_url, asynchronous):
+        options.update(
+            poolclass=InstrumentedAsyncQueuePool if asynchronous else InstrumentedQueuePool,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+            pool_use_lifo=DB_POOL_USE_LIFO,
+        )
+    return options
+
+
+def instrument_pool(engine, pre_ping: str = DB_POOL_PRE_PING):
+    """Connect latency, invalidation and idle-ping hooks for engine's pool"""
+    engine = getattr(engine, "sync_engine", engine)
+    _engines.add(engine)
+
+    def stats() -> Optional[PoolStats]:
+        return getattr(engine.pool, "stats", None)
+
+    @event.listens_for(engine, "do_connect")
+    def _connecting(dialect, connection_record, cargs, cparams):
+        if connection_record is not None:
+            connection_record.info["_pool_connect_started"] = time.perf_counter()
+
+    @event.listens_for(engine, "connect")
+    def _connected(dbapi_connection, connection_record):
+        started = connection_record.info.pop("_pool_connect_started", None)
+        connection_record.info["_pool_idle_since"] = time.monotonic()
+        if started is None or stats() is None:
+            return
+        seconds = time.perf_counter() - started
+        connection_record.info["_pool_connect_seconds"] = seconds
+        stats().connected(seconds)
+
+    @event.listens_for(engine, "invalidate")
+    def _invalidated(dbapi_connection, connection_record, exception):
+        if stats() is not None:
+            stats().invalidations += 1
+
+    if pre_ping != "idle":
+        return
+
+    @event.listens_for(engine, "checkin")
+    def _checked_in(dbapi_connection, connection_record):
+        connection_record.info["_pool_idle_since"] = time.monotonic()
+
+    @event.listens_for(engine, "checkout")
+    def _checked_out(dbapi_connection, connection_record, connection_proxy):
+        idle_since = connection_record.info.get("_pool_idle_since")
+        if idle_since is None or time.monotonic() - idle_since <= DB_POOL_PING_IDLE:
+            return
+        pool_stats = stats()
+        if pool_stats is not None:
+            pool_stats.pings += 1
+        try:
+            engine.dialect.do_ping(dbapi_connection)
+        except Exception:
+            if pool_stats is not None:
+                pool_stats.ping_failures += 1
+            # The pool discards the connection and checks out another one
+            raise exc.DisconnectionError("connection failed idle ping")
+
+
+def create_service_engine(database_url: str, **engine_kwargs) -> Engine:
+    """Engine for database_url with the env-configured, instrumented pool"""
+    engine = create_engine(database_url, **{"echo": False, **pool_options(database_url), **engine_kwargs})
+    instrument_pool(engine)
+    return engine
+
+
+def pool_stats(engine) -> dict:
+    """Live gauges and counters of engine's pool (sync Engine or AsyncEngine)"""
+    pool = getattr(engine, "sync_engine", engine).pool
+    snapshot = {"pool": type(pool).__name__, "pre_ping": DB_POOL_PRE_PING}
+    if isinstance(pool, QueuePool):
+        snapshot.update(
+            size=pool.size(),
+            max_overflow=pool._max_overflow,
+            timeout=pool.timeout(),
+            checked_out=pool.checkedout(),
+            checked_in=pool.checkedin(),
+            # QueuePool counts overflow from -size: connections beyond size
+            overflow=max(0, pool.overflow()),
+        )
+    stats = getattr(pool, "stats", None)
+    if stats is not None:
+        snapshot.update(stats.snapshot())
+    return snapshot
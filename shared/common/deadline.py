@@ -0,0 +1,103 @@
+"""
+Request deadlines - propagate the caller's remaining time budget across hops
+
+A request may carry X-Request-Deadline: the number of milliseconds the caller
+is still willing to wait. DeadlineMiddleware turns it into a deadline for the
+request being handled; outgoing calls (call_service, the gateway proxy) send
+what is left of it to the next hop and cap their own timeouts with it, so
+nested calls never outlive the original client's budget. Requests that arrive
+with no time left are answered with 504 at once.
+"""
+import json
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+DEADLINE_HEADER = "X-Request-Deadline"
+
+# time.monotonic() value by which the current request must be answered
+current_deadline: ContextVar[Optional[float]] = ContextVar("current_deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """The current request's deadline passed before an outgoing call was made"""
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current request's deadline (None: no deadline)"""
+    deadline = current_deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def header_value() -> Optional[str]:
+    """X-Request-Deadline value for an outgoing call, or None without a deadline
+
+    Raises DeadlineExceeded when no time is left.
+    """
+    budget = remaining()
+    if budget is None:
+        return None
+    if budget <= 0:
+        raise DeadlineExceeded("Request deadline exceeded")
+    return str(max(1, int(budget * 1000)))
+
+
+def parse_header(value: Optional[str]) -> Optional[float]:
+    """Budget in seconds from an X-Request-Deadline value (None if absent or invalid)"""
+    if not value:
+        return None
+    try:
+        return int(value.strip()) / 1000.0
+    except ValueError:
+        return None
+
+
+class DeadlineMiddleware:
+    """ASGI middleware that sets current_deadline from X-Request-Deadline
+
+    Args:
+        default_budget: budget (seconds) for requests without the header
+        max_budget: upper bound on a client-supplied budget
+    """
+
+    def __init__(self, app, default_budget: Optional[float] = None, max_budget: Optional[float] = None):
+        self.app = app
+        self.default_budget = default_budget
+        self.max_budget = max_budget
+        self._header = DEADLINE_HEADER.lower().encode("latin-1")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        budget = None
+        for name, value in scope.get("headers", ()):
+            if name == self._header:
+                budget = parse_header(value.decode("latin-1"))
+                break
+        if budget is None:
+            budget = self.default_budget
+        elif self.max_budget is not None:
+            budget = min(budget, self.max_budget)
+
+        if budget is None:
+            await self.app(scope, receive, send)
+            return
+        if budget <= 0:
+            body = json.dumps({"detail": "Request deadline exceeded"}).encode("utf-8")
+            await send({
+                "type": "http.response.start",
+                "status": 504,
+                "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        token = current_deadline.set(time.monotonic() + budget)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_deadline.reset(token)
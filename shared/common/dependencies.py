@@ -3,14 +3,41 @@ FastAPI Dependencies - Shared dependencies for JWT authentication
 """
 from fastapi import Depends, HTTPException, status, Request, Security
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from typing import Optional, Dict, Any
 from shared.utils.jwt_handler import verify_token
+from shared.utils.identity import IDENTITY_HEADER, current_identity, sign_identity, verify_identity
 
 # IMPORTANT:
 # Use Security(...) instead of Depends(...) so Swagger/OpenAPI recognizes Bearer auth
 security = HTTPBearer(auto_error=True)
 
 
+def resolve_token_payload(request: Request, token: str) -> Optional[Dict[str, Any]]:
+    """
+    Verify a bearer token for the current request
+
+    Uses the edge identity header (one HMAC check) when the caller forwarded a
+    valid one for this token, and falls back to full JWT decoding otherwise.
+    The result is remembered so inter-service calls made with the same token
+    forward the identity header to the next hop.
+    """
+    identity = request.headers.get(IDENTITY_HEADER)
+    if identity:
+        payload = verify_identity(identity, token)
+        if payload is not None:
+            current_identity.set((token, identity))
+            return payload
+
+    payload = verify_token(token)
+    if payload is not None:
+        identity = sign_identity(payload, token)
+        if identity:
+            current_identity.set((token, identity))
+    return payload
+
+
 async def get_current_user(
+    request: Request,
     credentials: HTTPAuthorizationCredentials = Security(security),
 ):
     """
@@ -22,7 +49,7 @@ async def get_current_user(
             return current_user
     """
     token = credentials.credentials
-    payload = verify_token(token)
+    payload = resolve_token_payload(request, token)
 
     if payload is None:
         raise HTTPException(
@@ -47,10 +74,11 @@ def require_role(required_role: str):
     """
 
     async def role_checker(
+        request: Request,
         credentials: HTTPAuthorizationCredentials = Security(security),
     ):
         token = credentials.credentials
-        payload = verify_token(token)
+        payload = resolve_token_payload(request, token)
 
         if payload is None:
             raise HTTPException(
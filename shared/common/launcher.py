@@ -0,0 +1,189 @@
+"""
+Production launcher shared by every service
+
+    python -m shared.common.launcher main:app [--port 8000]
+
+Runs the ASGI app with one worker process per available CPU (or
+WEB_CONCURRENCY), uvloop and httptools when they are installed, a larger
+listen backlog and a keep-alive timeout longer than the callers' connection
+pool expiry, so pooled connections are not closed under an in-flight request.
+
+When gunicorn is installed the workers are supervised by it: a worker that
+dies is replaced and, with SERVER_MAX_REQUESTS set, workers are recycled
+gracefully after that many requests (plus jitter, so they do not all restart
+at once). Without gunicorn, uvicorn's own process manager is used and worker
+recycling is disabled, because uvicorn does not replace exited workers.
+
+Under gunicorn the app is imported once, in the arbiter (preload_app), and
+the workers are forked from it. Import-time setup (create_all, auth's default
+roles) therefore runs once per container instead of once per worker at the
+same time, where workers racing on CREATE TABLE or a unique seed row failed
+to boot and took the whole service down. Database pools drop the connections
+inherited across the fork (shared/common/db_pool.py). uvicorn's process
+manager imports the app in every worker, so the seed steps also tolerate a
+concurrent insert; boot several workers on a fresh database to check:
+
+    DATABASE_URL=sqlite:////tmp/auth.db WEB_CONCURRENCY=4 \
+        python -m shared.common.launcher main:app --port 8001
+
+Every worker keeps its own in-process state (gateway caches, circuit
+breakers, concurrency limits, database pool). The API Gateway depends on that
+state being process-wide, so its image pins WEB_CONCURRENCY=1 and it is scaled
+with replicas; the services are stateless apart from their pools and caches.
+"""
+import argparse
+import importlib.util
+import logging
+import math
+import os
+from typing import Optional
+
+logger = logging.getLogger("launcher")
+
+SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
+SERVER_PORT = int(os.getenv("PORT", "8000"))
+# Pending connections the kernel queues while every worker is busy accepting
+SERVER_BACKLOG = int(os.getenv("SERVER_BACKLOG", "2048"))
+# Must outlive the keep-alive expiry of the gateway/call_service pools (5s)
+SERVER_KEEPALIVE = int(os.getenv("SERVER_KEEPALIVE", "75"))
+# Recycle a worker after this many requests (0: never)
+SERVER_MAX_REQUESTS = int(os.getenv("SERVER_MAX_REQUESTS", "0"))
+SERVER_MAX_REQUESTS_JITTER = int(os.getenv("SERVER_MAX_REQUESTS_JITTER", "0"))
+# Seconds in-flight requests get to finish on shutdown or recycling
+SERVER_GRACEFUL_TIMEOUT = int(os.getenv("SERVER_GRACEFUL_TIMEOUT", "30"))
+SERVER_LOG_LEVEL = os.getenv("SERVER_LOG_LEVEL", "info").strip().lower()
+
+
+def _installed(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def available_cpus() -> int:
+    """CPUs this process may use: affinity mask, capped by a cgroup CPU quota"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:  # not available on every platform
+        cpus = os.cpu_count() or 1
+
+    quota = None
+    try:
+        # cgroup v2: "<quota> <period>" or "max <period>"
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            limit, period = f.read().split()
+        if limit != "max":
+            quota = int(limit) / int(period)
+    except (OSError, ValueError):
+        try:
+            # cgroup v1
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+                limit = int(f.read())
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+                period = int(f.read())
+            if limit > 0:
+                quota = limit / period
+        except (OSError, ValueError):
+            pass
+
+    if quota is not None:
+        cpus = min(cpus, math.ceil(quota))
+    return max(1, cpus)
+
+
+def worker_count() -> int:
+    """WEB_CONCURRENCY if set, otherwise one worker per available CPU"""
+    configured = os.getenv("WEB_CONCURRENCY", "").strip()
+    if configured:
+        return max(1, int(configured))
+    return available_cpus()
+
+
+def server_options() -> dict:
+    """uvicorn options common to both process managers"""
+    return {
+        "loop": "uvloop" if _installed("uvloop") else "asyncio",
+        "http": "httptools" if _installed("httptools") else "h11",
+        "backlog": SERVER_BACKLOG,
+        "timeout_keep_alive": SERVER_KEEPALIVE,
+        "timeout_graceful_shutdown": SERVER_GRACEFUL_TIMEOUT,
+        "log_level": SERVER_LOG_LEVEL,
+        "proxy_headers": True,
+    }
+
+
+if _installed("gunicorn") and _installed("uvicorn"):
+    from uvicorn.workers import UvicornWorker
+
+    class ServiceWorker(UvicornWorker):
+        """UvicornWorker with the launcher's loop/http choice (gunicorn loads it by path)"""
+        CONFIG_KWARGS = {
+            "loop": "uvloop" if _installed("uvloop") else "asyncio",
+            "http": "httptools" if _installed("httptools") else "h11",
+            "proxy_headers": True,
+        }
+
+
+def _run_gunicorn(app_path: str, host: str, port: int, workers: int, options: dict):
+    from gunicorn.app.base import BaseApplication
+
+    class ServiceApplication(BaseApplication):
+        def load_config(self):
+            settings = {
+                "bind": f"{host}:{port}",
+                "workers": workers,
+                # gunicorn only accepts the worker class as an import path
+                "worker_class": "shared.common.launcher.ServiceWorker",
+                # Import the app (schema creation, seed data) once, before forking
+                "preload_app": True,
+                "backlog": options["backlog"],
+                "keepalive": options["timeout_keep_alive"],
+                "graceful_timeout": options["timeout_graceful_shutdown"],
+                "max_requests": SERVER_MAX_REQUESTS,
+                "max_requests_jitter": SERVER_MAX_REQUESTS_JITTER,
+                "loglevel": options["log_level"],
+                "accesslog": "-",
+                "errorlog": "-",
+            }
+            for key, value in settings.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from gunicorn.util import import_app
+            return import_app(app_path)
+
+    ServiceApplication().run()
+
+
+def run(app_path: str, host: str = SERVER_HOST, port: int = SERVER_PORT, workers: Optional[int] = None):
+    """Serve the ASGI app at app_path ("module:attribute")"""
+    workers = workers or worker_count()
+    options = server_options()
+    logger.info(
+        "Serving %s on %s:%s with %d worker(s), loop=%s http=%s",
+        app_path, host, port, workers, options["loop"], options["http"],
+    )
+
+    if _installed("gunicorn") and os.name == "posix":
+        _run_gunicorn(app_path, host, port, workers, options)
+        return
+
+    if SERVER_MAX_REQUESTS:
+        logger.warning("SERVER_MAX_REQUESTS ignored: worker recycling needs gunicorn")
+
+    import uvicorn
+    uvicorn.run(app_path, host=host, port=port, workers=workers, **options)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a service with the production server settings")
+    parser.add_argument("app", help='ASGI application, e.g. "main:app"')
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--workers", type=int, default=None, help="defaults to WEB_CONCURRENCY or the CPU count")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    run(args.app, host=args.host, port=args.port, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""
+Read replica routing - read-only sessions for list endpoints
+
+List and report reads (GET /bookings, /payments, /rooms, ...) shared the
+primary database with the booking and payment writes. Endpoints that only
+read take get_read_db / get_async_read_db instead of get_db / get_async_db;
+those sessions go to the DATABASE_READ_URL replica when
+
+- a replica is configured (otherwise they are plain primary sessions),
+- it accepted a connection recently: after a failure reads fall back to the
+  primary for DATABASE_READ_RETRY_AFTER seconds (30),
+- with DATABASE_READ_MAX_LAG set (seconds, 0 = no bound), its replication
+  lag is known and within the bound. MySQL lag is read from SHOW REPLICA
+  STATUS at most every DATABASE_READ_LAG_CHECK_INTERVAL seconds (5),
+- the caller did not ask for fresh data with `X-Read-Consistency: primary`
+  (callers deciding on availability do).
+
+Replica engines use the same DB_POOL_* settings as the primary
+(shared/common/db_pool.py); DATABASE_READ_ASYNC_URL overrides the async URL
+derived from DATABASE_READ_URL.
+"""
+import logging
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Iterator, List, Optional
+
+from fastapi import Request
+from sqlalchemy import exc
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+
+from shared.common.async_database import create_async_database
+from shared.common.db_pool import create_service_engine, pool_stats
+
+READ_CONSISTENCY_HEADER = "X-Read-Consistency"
+
+DATABASE_READ_MAX_LAG = float(os.getenv("DATABASE_READ_MAX_LAG", "0"))
+DATABASE_READ_LAG_CHECK_INTERVAL = float(os.getenv("DATABASE_READ_LAG_CHECK_INTERVAL", "5"))
+DATABASE_READ_RETRY_AFTER = float(os.getenv("DATABASE_READ_RETRY_AFTER", "30"))
+
+logger = logging.getLogger(__name__)
+
+# MySQL 8.0.22+ names first, then the older ones
+_LAG_STATEMENTS = (("SHOW REPLICA STATUS", "Seconds_Behind_Source"), ("SHOW SLAVE STATUS", "Seconds_Behind_Master"))
+
+
+def wants_primary(request: Optional[Request]) -> bool:
+    """True if the caller asked to read from the primary"""
+    if request is None:
+        return False
+    return request.headers.get(READ_CONSISTENCY_HEADER, "").strip().lower() == "primary"
+
+
+def _lag_from_row(row, column: str) -> Optional[float]:
+    if row is None:
+        # Not replicating (e.g. the read URL points at the primary): current
+        return 0.0
+    value = row.get(column)
+    # NULL: replication stopped, lag unknown
+    return None if value is None else float(value)
+
+
+class ReadReplica:
+    """Routes read-only sessions to a replica, falling back to the primary
+
+    Args:
+        read_url: replica URL (DATABASE_READ_URL); empty: always the primary
+        primary_sessions: the service's SessionLocal
+        async_primary_sessions: the service's AsyncSessionLocal
+        max_lag: staleness bound in seconds, 0 for none
+    """
+
+    def __init__(self, read_url: str, primary_sessions: sessionmaker,
+                 async_primary_sessions: Optional[async_sessionmaker] = None,
+                 max_lag: float = DATABASE_READ_MAX_LAG):
+        self.read_url = read_url.strip()
+        self.primary_sessions = primary_sessions
+        self.async_primary_sessions = async_primary_sessions
+        self.max_lag = max_lag
+        self.engine = self.async_engine = None
+        self.sessions: Optional[sessionmaker] = None
+        self.async_sessions: Optional[async_sessionmaker] = None
+        if self.read_url:
+            self.engine = create_service_engine(self.read_url)
+            self.sessions = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+            if async_primary_sessions is not None:
+                self.async_engine, self.async_sessions = create_async_database(
+                    self.read_url, url_override_env="DATABASE_READ_ASYNC_URL"
+                )
+        self._lock = threading.Lock()
+        self._down_until = 0.0
+        self._lag: Optional[float] = None
+        self._lag_checked_at: Optional[float] = None
+        self.replica_reads = 0
+        self.primary_reads = 0
+        self.fallbacks = 0
+
+    def engines(self) -> List:
+        """Replica engines (for instrumentation); empty without a replica"""
+        return [engine for engine in (self.engine, self.async_engine) if engine is not None]
+
+    def _should_try(self, request: Optional[Request]) -> bool:
+        return self.sessions is not None and not wants_primary(request) and time.monotonic() >= self._down_until
+
+    def _lag_due(self) -> bool:
+        return self.max_lag > 0 and (
+            self._lag_checked_at is None
+            or time.monotonic() - self._lag_checked_at >= DATABASE_READ_LAG_CHECK_INTERVAL
+        )
+
+    def _record_lag(self, lag: Optional[float]):
+        self._lag = lag
+        self._lag_checked_at = time.monotonic()
+
+    def _fresh(self) -> bool:
+        return self.max_lag <= 0 or (self._lag is not None and self._lag <= self.max_lag)
+
+    def _mark_down(self, error: Exception):
+        logger.warning("Read replica unavailable, reading from the primary for %.0fs: %s",
+                       DATABASE_READ_RETRY_AFTER, error)
+        with self._lock:
+            self._down_until = time.monotonic() + DATABASE_READ_RETRY_AFTER
+            self.fallbacks += 1
+
+    def _count(self, replica: bool):
+        with self._lock:
+            if replica:
+                self.replica_reads += 1
+            else:
+                self.primary_reads += 1
+
+    def _probe_lag(self, connection) -> Optional[float]:
+        if connection.dialect.name != "mysql":
+            # Only MySQL replication status is read; others count as current
+            return 0.0
+        for statement, column in _LAG_STATEMENTS:
+            try:
+                row = connection.exec_driver_sql(statement).mappings().first()
+            except exc.DBAPIError:
+                continue
+            return _lag_from_row(row, column)
+        # No privilege to read replication status: unknown
+        return None
+
+    def _replica_session(self, request: Optional[Request]) -> Optional[Session]:
+        if not self._should_try(request):
+            return None
+        db = self.sessions()
+        try:
+            connection = db.connection()
+        except exc.TimeoutError:
+            # Replica pool exhausted: this read goes to the primary
+            db.close()
+            return None
+        except exc.DBAPIError as e:
+            db.close()
+            self._mark_down(e)
+            return None
+        if self._lag_due():
+            self._record_lag(self._probe_lag(connection))
+        if self._fresh():
+            return db
+        db.close()
+        return None
+
+    async def _async_replica_session(self, request: Optional[Request]) -> Optional[AsyncSession]:
+        if self.async_sessions is None or not self._should_try(request):
+            return None
+        db = self.async_sessions()
+        try:
+            connection = await db.connection()
+        except exc.TimeoutError:
+            # Replica pool exhausted: this read goes to the primary
+            await db.close()
+            return None
+        except exc.DBAPIError as e:
+            await db.close()
+            self._mark_down(e)
+            return None
+        if self._lag_due():
+            self._record_lag(await connection.run_sync(self._probe_lag))
+        if self._fresh():
+            return db
+        await db.close()
+        return None
+
+    def session_dependency(self):
+        """FastAPI dependency yielding a read-only Session (replica or primary)"""
+
+        def get_read_db(request: Request) -> Iterator[Session]:
+            db = self._replica_session(request)
+            self._count(replica=db is not None)
+            if db is None:
+                db = self.primary_sessions()
+            try:
+                yield db
+            finally:
+                db.close()
+
+        return get_read_db
+
+    @asynccontextmanager
+    async def async_session(self, request: Optional[Request] = None) -> AsyncIterator[AsyncSession]:
+        """Read-only AsyncSession (replica or primary), for reads outside a request's dependencies"""
+        db = await self._async_replica_session(request)
+        self._count(replica=db is not None)
+        if db is None:
+            db = self.async_primary_sessions()
+        async with db:
+            yield db
+
+    def async_session_dependency(self):
+        """FastAPI dependency yielding a read-only AsyncSession (replica or primary)"""
+
+        async def get_async_read_db(request: Request) -> AsyncIterator[AsyncSession]:
+            async with self.async_session(request) as db:
+                yield db
+
+        return get_async_read_db
+
+    def stats(self) -> dict:
+        """Routing state and replica pool gauges for /debug/db-pool"""
+        if self.sessions is None:
+            return {"configured": False, "primary_reads": self.primary_reads}
+        down_for = max(0.0, self._down_until - time.monotonic())
+        snapshot = {
+            "configured": True,
+            "max_lag": self.max_lag,
+            "lag": self._lag,
+            "fallback_for": round(down_for, 1),
+            "replica_reads": self.replica_reads,
+            "primary_reads": self.primary_reads,
+            "fallbacks": self.fallbacks,
+            "sync": pool_stats(self.engine),
+        }
+        if self.async_engine is not None:
+            snapshot["async"] = pool_stats(self.async_engine)
+        return snapshot
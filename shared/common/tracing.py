@@ -0,0 +1,339 @@
+"""
+Distributed tracing - W3C trace context, spans and Server-Timing
+
+TracingMiddleware continues the caller's trace from the `traceparent` header
+(or starts a new one) and records a server span for the request. Outgoing
+calls (call_service, the gateway proxy) record client spans and send their
+span id onward with inject(); instrument_engine() records one span per SQL
+statement. Spans are written as JSON lines (OTLP-style fields: traceId,
+spanId, parentSpanId, startTimeUnixNano, ...) to TRACING_EXPORT_FILE; several
+services may share one file, so a whole request across gateway and services
+can be read back with scripts/trace_view.py.
+
+Every response also gets a Server-Timing header with the service's total,
+SQL and outbound-call time, and X-Trace-Id to look the trace up. The gateway
+relays the services' headers, so one response shows every hop.
+"""
+import json
+import os
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional, Tuple
+
+TRACEPARENT_HEADER = "traceparent"
+TRACE_ID_HEADER = "X-Trace-Id"
+
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").strip().lower() in ("1", "true", "yes", "on")
+# JSON-lines span file; empty: spans are not exported (propagation and
+# Server-Timing still work)
+TRACING_EXPORT_FILE = os.getenv("TRACING_EXPORT_FILE", "").strip()
+# Share of new traces that are exported; callers' sampling decisions are kept
+TRACING_SAMPLE_RATE = float(os.getenv("TRACING_SAMPLE_RATE", "1.0"))
+# SQL statements are truncated to this many characters in span attributes
+TRACING_MAX_STATEMENT = int(os.getenv("TRACING_MAX_STATEMENT", "500"))
+
+
+def _new_id(nbytes: int) -> str:
+    return "%0*x" % (nbytes * 2, random.getrandbits(nbytes * 8) or 1)
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[Tuple[str, str, bool]]:
+    """(trace_id, parent_span_id, sampled) from a traceparent header, or None if invalid"""
+    if not value:
+        return None
+    parts = value.strip().lower().split("-")
+    if len(parts) < 4 or len(parts[0]) != 2 or parts[0] == "ff":
+        return None
+    trace_id, span_id, flags = parts[1], parts[2], parts[3]
+    if len(trace_id) != 32 or len(span_id) != 16 or len(flags) != 2:
+        return None
+    try:
+        int(trace_id, 16), int(span_id, 16)
+        sampled = bool(int(flags, 16) & 1)
+    except ValueError:
+        return None
+    if trace_id == "0" * 32 or span_id == "0" * 16:
+        return None
+    return trace_id, span_id, sampled
+
+
+class Span:
+    """One timed operation of a trace"""
+    __slots__ = (
+        "name", "kind", "trace_id", "span_id", "parent_id", "sampled",
+        "attributes", "status", "start_ns", "end_ns", "_started",
+    )
+
+    def __init__(self, name: str, kind: str, trace_id: str, parent_id: Optional[str], sampled: bool,
+                 attributes: Optional[dict] = None):
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id
+        self.span_id = _new_id(8)
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.attributes = dict(attributes or {})
+        self.status = "OK"
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self._started = time.perf_counter()
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def set_error(self, description: str):
+        self.status = "ERROR"
+        self.attributes["error"] = description
+
+    def end(self) -> float:
+        """Finish the span, export it and return its duration in seconds"""
+        if self.end_ns is not None:
+            return (self.end_ns - self.start_ns) / 1e9
+        elapsed = time.perf_counter() - self._started
+        self.end_ns = self.start_ns + int(elapsed * 1e9)
+        if self.sampled:
+            exporter.export(self)
+        return elapsed
+
+
+class RequestTrace:
+    """Per-request totals behind the Server-Timing header
+
+    Shared by every task of the request (contextvars are copied by reference).
+    """
+    __slots__ = ("service", "db_seconds", "db_calls", "outbound_seconds", "outbound_calls")
+
+    def __init__(self, service: str):
+        self.service = service
+        self.db_seconds = 0.0
+        self.db_calls = 0
+        self.outbound_seconds = 0.0
+        self.outbound_calls = 0
+
+    def server_timing(self, total_seconds: float) -> str:
+        entries = [f"{self.service};dur={total_seconds * 1000:.1f}"]
+        if self.db_calls:
+            entries.append(f'{self.service}-db;dur={self.db_seconds * 1000:.1f};desc="{self.db_calls} queries"')
+        if self.outbound_calls:
+            entries.append(
+                f'{self.service}-upstream;dur={self.outbound_seconds * 1000:.1f};desc="{self.outbound_calls} calls"'
+            )
+        return ", ".join(entries)
+
+
+current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+current_request_trace: ContextVar[Optional[RequestTrace]] = ContextVar("current_request_trace", default=None)
+
+
+@contextmanager
+def start_span(name: str, kind: str = "internal", attributes: Optional[dict] = None) -> Iterator[Optional[Span]]:
+    """Child span of the current one for the duration of the block (None outside a trace)"""
+    parent = current_span.get()
+    if parent is None:
+        yield None
+        return
+    span = Span(name, kind, parent.trace_id, parent.span_id, parent.sampled, attributes)
+    token = current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.set_error(type(e).__name__)
+        raise
+    finally:
+        current_span.reset(token)
+        elapsed = span.end()
+        if kind == "client":
+            trace = current_request_trace.get()
+            if trace is not None:
+                trace.outbound_seconds += elapsed
+                trace.outbound_calls += 1
+
+
+def inject(headers: Dict[str, str], span: Optional[Span] = None) -> Dict[str, str]:
+    """Add traceparent for `span` (default: the current span) to outgoing headers"""
+    span = span or current_span.get()
+    if span is not None:
+        headers[TRACEPARENT_HEADER] = span.traceparent
+    return headers
+
+
+class JsonlSpanExporter:
+    """Appends finished spans to a JSON-lines file from a background thread"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.service = "unknown"
+        self._queue: "queue.SimpleQueue[Optional[dict]]" = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        if not self.path:
+            return
+        self._queue.put({
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "parentSpanId": span.parent_id or "",
+            "name": span.name,
+            "kind": span.kind,
+            "startTimeUnixNano": span.start_ns,
+            "endTimeUnixNano": span.end_ns,
+            "status": span.status,
+            "service": self.service,
+            "attributes": span.attributes,
+        })
+        if self._thread is None:
+            self._start()
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # One write() per batch on an O_APPEND descriptor, so lines from
+        # several processes sharing the file do not interleave
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        while True:
+            record = self._queue.get()
+            lines = [record]
+            # Drain whatever else is waiting into the same write
+            while True:
+                try:
+                    lines.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            data = "".join(json.dumps(line, default=str) + "\n" for line in lines)
+            try:
+                os.write(fd, data.encode("utf-8"))
+            except OSError:
+                pass
+
+
+exporter = JsonlSpanExporter(TRACING_EXPORT_FILE)
+
+
+def instrument_engine(engine):
+    """Record a span (and Server-Timing "db" time) for every SQL statement run on engine"""
+    from sqlalchemy import event
+
+    if not TRACING_ENABLED:
+        return
+    # AsyncEngine: cursor events fire on the wrapped sync engine
+    engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        parent = current_span.get()
+        if parent is None:
+            conn.info.setdefault("trace_spans", []).append(None)
+            return
+        span = Span(
+            statement.split(None, 1)[0].upper() if statement else "SQL",
+            "client",
+            parent.trace_id,
+            parent.span_id,
+            parent.sampled,
+            {"db.system": engine.dialect.name, "db.statement": statement[:TRACING_MAX_STATEMENT]},
+        )
+        conn.info.setdefault("trace_spans", []).append(span)
+
+    def _finish(conn, failed: bool = False):
+        spans = conn.info.get("trace_spans")
+        span = spans.pop() if spans else None
+        if span is None:
+            return
+        if failed:
+            span.status = "ERROR"
+        elapsed = span.end()
+        trace = current_request_trace.get()
+        if trace is not None:
+            trace.db_seconds += elapsed
+            trace.db_calls += 1
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        _finish(conn)
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        if context.connection is not None:
+            _finish(context.connection, failed=True)
+
+
+class TracingMiddleware:
+    """ASGI middleware: server span per request, traceparent in, Server-Timing out
+
+    Args:
+        service_name: name used for exported spans and Server-Timing entries
+    """
+
+    def __init__(self, app, service_name: str, enabled: bool = TRACING_ENABLED):
+        self.app = app
+        self.service_name = service_name
+        self.enabled = enabled
+        if enabled:
+            exporter.service = service_name
+
+    async def __call__(self, scope, receive, send):
+        if not self.enabled or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming = None
+        for name, value in scope.get("headers", ()):
+            if name == b"traceparent":
+                incoming = parse_traceparent(value.decode("latin-1"))
+                break
+        if incoming is not None:
+            trace_id, parent_id, sampled = incoming
+        else:
+            trace_id, parent_id, sampled = _new_id(16), None, random.random() < TRACING_SAMPLE_RATE
+
+        method = scope.get("method", "")
+        span = Span(
+            f"{method} {scope.get('path', '')}",
+            "server",
+            trace_id,
+            parent_id,
+            sampled,
+            {"http.method": method, "http.target": scope.get("path", ""), "service.name": self.service_name},
+        )
+        request_trace = RequestTrace(self.service_name)
+        span_token = current_span.set(span)
+        trace_token = current_request_trace.set(request_trace)
+
+        async def traced_send(message):
+            if message["type"] == "http.response.start":
+                status = message.get("status", 200)
+                span.attributes["http.status_code"] = status
+                if status >= 500:
+                    span.status = "ERROR"
+                elapsed = time.perf_counter() - span._started
+                headers = list(message.get("headers", ()))
+                headers.append((b"server-timing", request_trace.server_timing(elapsed).encode("latin-1")))
+                if not any(name.lower() == b"x-trace-id" for name, _ in headers):
+                    headers.append((b"x-trace-id", trace_id.encode("latin-1")))
+                message = {**message, "headers": headers}
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                span.end()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, traced_send)
+        except BaseException as e:
+            span.set_error(type(e).__name__)
+            raise
+        finally:
+            span.end()
+            current_request_trace.reset(trace_token)
+            current_span.reset(span_token)
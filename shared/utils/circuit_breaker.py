@@ -0,0 +1,204 @@
+"""
+Circuit Breaker - Fail fast instead of queueing behind an unhealthy dependency
+
+Each upstream gets a breaker that watches a rolling window of call outcomes.
+When the error rate or the share of slow calls crosses its threshold the
+breaker opens and callers are rejected immediately (CircuitOpenError) for a
+cool-down period. After that a few probe calls are let through (half-open):
+if they succeed the breaker closes again, if any of them fails it re-opens.
+
+Shared by the API Gateway (one breaker per upstream pool) and call_service
+(one breaker per target service URL).
+"""
+from __future__ import annotations
+
+import os
+import time
+from typing import Dict, List, Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, str(default)))
+
+
+CIRCUIT_BREAKER_ENABLED = os.getenv("CIRCUIT_BREAKER_ENABLED", "true").strip().lower() in ("1", "true", "yes", "on")
+# Rolling window (seconds) over which error and slow-call rates are computed
+CIRCUIT_BREAKER_WINDOW = int(_env_float("CIRCUIT_BREAKER_WINDOW", 10))
+# No decision is taken on fewer calls than this within the window
+CIRCUIT_BREAKER_MIN_CALLS = int(_env_float("CIRCUIT_BREAKER_MIN_CALLS", 20))
+CIRCUIT_BREAKER_ERROR_RATE = _env_float("CIRCUIT_BREAKER_ERROR_RATE", 0.5)
+# A call slower than this counts as slow; open when the slow share reaches the rate
+CIRCUIT_BREAKER_SLOW_CALL_SECONDS = _env_float("CIRCUIT_BREAKER_SLOW_CALL_SECONDS", 5.0)
+CIRCUIT_BREAKER_SLOW_CALL_RATE = _env_float("CIRCUIT_BREAKER_SLOW_CALL_RATE", 0.8)
+# How long an open breaker rejects calls before probing
+CIRCUIT_BREAKER_OPEN_SECONDS = _env_float("CIRCUIT_BREAKER_OPEN_SECONDS", 15.0)
+# Concurrent probes allowed while half-open; this many successes close the breaker
+CIRCUIT_BREAKER_HALF_OPEN_CALLS = int(_env_float("CIRCUIT_BREAKER_HALF_OPEN_CALLS", 3))
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose breaker is open"""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Circuit breaker open for {name}")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Error-rate and slow-call-rate breaker over per-second buckets"""
+
+    def __init__(
+        self,
+        name: str,
+        window: int = CIRCUIT_BREAKER_WINDOW,
+        min_calls: int = CIRCUIT_BREAKER_MIN_CALLS,
+        error_rate: float = CIRCUIT_BREAKER_ERROR_RATE,
+        slow_call_seconds: float = CIRCUIT_BREAKER_SLOW_CALL_SECONDS,
+        slow_call_rate: float = CIRCUIT_BREAKER_SLOW_CALL_RATE,
+        open_seconds: float = CIRCUIT_BREAKER_OPEN_SECONDS,
+        half_open_calls: int = CIRCUIT_BREAKER_HALF_OPEN_CALLS,
+        enabled: bool = CIRCUIT_BREAKER_ENABLED,
+    ):
+        self.name = name
+        self.window = max(1, window)
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self.half_open_calls = max(1, half_open_calls)
+        self.enabled = enabled
+
+        self.state = CLOSED
+        self.opened_at = 0.0
+        # ring of [second, calls, failures, slow_calls]
+        self._buckets: List[List[int]] = [[0, 0, 0, 0] for _ in range(self.window)]
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self.rejected = 0
+        self.times_opened = 0
+
+    def before_call(self):
+        """Reserve permission for one call; raise CircuitOpenError when rejected
+
+        Every permitted call must be followed by record() or cancel().
+        """
+        if not self.enabled:
+            return
+        if self.state == OPEN:
+            remaining = self.opened_at + self.open_seconds - time.monotonic()
+            if remaining > 0:
+                self.rejected += 1
+                raise CircuitOpenError(self.name, remaining)
+            self._transition(HALF_OPEN)
+        if self.state == HALF_OPEN:
+            if self._probes_in_flight >= self.half_open_calls:
+                self.rejected += 1
+                raise CircuitOpenError(self.name, 1.0)
+            self._probes_in_flight += 1
+
+    def record(self, success: bool, duration: float):
+        """Report the outcome of a permitted call"""
+        if not self.enabled:
+            return
+        slow = duration >= self.slow_call_seconds
+        if self.state == HALF_OPEN:
+            self._probes_in_flight = max(0, self._probes_in_flight - 1)
+            if not success or slow:
+                self._trip()
+                return
+            self._probe_successes += 1
+            if self._probe_successes >= self.half_open_calls:
+                self._transition(CLOSED)
+            return
+        if self.state == OPEN:
+            # A call permitted before the breaker opened
+            return
+
+        bucket = self._bucket(int(time.monotonic()))
+        bucket[1] += 1
+        bucket[2] += 0 if success else 1
+        bucket[3] += 1 if slow else 0
+
+        calls, failures, slow_calls = self._totals()
+        if calls >= self.min_calls and (
+            failures / calls >= self.error_rate or slow_calls / calls >= self.slow_call_rate
+        ):
+            self._trip()
+
+    def cancel(self):
+        """Release a permitted call that was abandoned without an outcome"""
+        if self.state == HALF_OPEN:
+            self._probes_in_flight = max(0, self._probes_in_flight - 1)
+
+    def _bucket(self, second: int) -> List[int]:
+        bucket = self._buckets[second % self.window]
+        if bucket[0] != second:
+            bucket[:] = [second, 0, 0, 0]
+        return bucket
+
+    def _totals(self):
+        oldest = int(time.monotonic()) - self.window + 1
+        calls = failures = slow_calls = 0
+        for second, bucket_calls, bucket_failures, bucket_slow in self._buckets:
+            if second >= oldest:
+                calls += bucket_calls
+                failures += bucket_failures
+                slow_calls += bucket_slow
+        return calls, failures, slow_calls
+
+    def _trip(self):
+        self.times_opened += 1
+        self.opened_at = time.monotonic()
+        self._transition(OPEN)
+
+    def _transition(self, state: str):
+        self.state = state
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        if state != HALF_OPEN:
+            for bucket in self._buckets:
+                bucket[:] = [0, 0, 0, 0]
+
+    def stats(self) -> dict:
+        calls, failures, slow_calls = self._totals()
+        retry_after = None
+        if self.state == OPEN:
+            retry_after = round(max(0.0, self.opened_at + self.open_seconds - time.monotonic()), 3)
+        return {
+            "name": self.name,
+            "enabled": self.enabled,
+            "state": self.state,
+            "window_calls": calls,
+            "window_failures": failures,
+            "window_slow_calls": slow_calls,
+            "retry_after": retry_after,
+            "rejected": self.rejected,
+            "times_opened": self.times_opened,
+        }
+
+
+class CircuitBreakerRegistry:
+    """Breakers created on first use, one per upstream name"""
+
+    def __init__(self, **defaults):
+        self._defaults = defaults
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def get(self, name: str) -> CircuitBreaker:
+        breaker = self._breakers.get(name)
+        if breaker is None:
+            breaker = self._breakers[name] = CircuitBreaker(name, **self._defaults)
+        return breaker
+
+    def stats(self, name: Optional[str] = None) -> dict:
+        return {key: breaker.stats() for key, breaker in self._breakers.items() if name in (None, key)}
+
+
+# Process-wide registry used by call_service and the API Gateway
+breakers = CircuitBreakerRegistry()
@@ -1,8 +1,47 @@
 """
 HTTP Client - Utility for inter-service communication
+
+ServiceClient keeps one pooled keep-alive httpx.AsyncClient per target
+service, so repeated calls reuse connections instead of opening a new one per
+call. Clients are created on first use and closed by the service's shutdown
+hook (service_clients.close()); call_service() is the call-style wrapper the
+services use.
 """
+import asyncio
+import logging
+import os
+import re
+import time
+from urllib.parse import urlsplit
+
 import httpx
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Awaitable, List, NamedTuple, Sequence
+
+from shared.common.deadline import (
+    DEADLINE_HEADER, DeadlineExceeded, header_value as deadline_header_value, remaining as deadline_remaining
+)
+from shared.common.tracing import inject as inject_traceparent, start_span
+from shared.utils.circuit_breaker import CircuitOpenError, breakers
+from shared.utils.identity import IDENTITY_HEADER, identity_header_for
+from shared.utils.load_balancer import balancers
+from shared.utils.retry import hedged, latency_trackers, retry_connect
+
+logger = logging.getLogger(__name__)
+
+# Retries after a connection failure (each one may pick another replica)
+CALL_SERVICE_CONNECT_RETRIES = int(os.getenv("CALL_SERVICE_CONNECT_RETRIES", "2"))
+# Opt-in: send a second GET when the first is slower than the service's recent p95
+CALL_SERVICE_HEDGE_GETS = os.getenv("CALL_SERVICE_HEDGE_GETS", "false").strip().lower() in ("1", "true", "yes", "on")
+# Defaults for every target; CALL_SERVICE_TIMEOUT_<SERVICE> overrides the total
+# timeout per target, e.g. CALL_SERVICE_TIMEOUT_ROOM_SERVICE=5 for room-service
+CALL_SERVICE_TIMEOUT = float(os.getenv("CALL_SERVICE_TIMEOUT", "30"))
+CALL_SERVICE_CONNECT_TIMEOUT = float(os.getenv("CALL_SERVICE_CONNECT_TIMEOUT", "5"))
+CALL_SERVICE_MAX_CONNECTIONS = int(os.getenv("CALL_SERVICE_MAX_CONNECTIONS", "100"))
+CALL_SERVICE_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("CALL_SERVICE_MAX_KEEPALIVE_CONNECTIONS", "20"))
+# Idle pooled connections are dropped after this long (below the services' keep-alive)
+CALL_SERVICE_KEEPALIVE_EXPIRY = float(os.getenv("CALL_SERVICE_KEEPALIVE_EXPIRY", "5"))
+# Calls of one call_service_many() batch in flight at once
+CALL_SERVICE_MANY_CONCURRENCY = int(os.getenv("CALL_SERVICE_MANY_CONCURRENCY", "10"))
 
 
 class ServiceHTTPError(Exception):
@@ -13,37 +52,143 @@ class ServiceHTTPError(Exception):
         self.url = url
 
 
-async def call_service(
-    service_url: str,
-    endpoint: str,
-    method: str = "GET",
-    data: Optional[Dict[str, Any]] = None,
-    headers: Optional[Dict[str, str]] = None,
-    params: Optional[Dict[str, Any]] = None,
-    timeout: int = 30
-) -> Any:
-    """
-    Make HTTP request to another service.
-    Returns:
-      - dict/list if response is JSON
-      - {} if 204 No Content
-      - raw text if non-JSON body
-    Raises:
-      ServiceHTTPError for non-2xx responses (with status + detail)
+def _service_name(service_url: str) -> str:
+    """Host of the first replica, e.g. "room-service" for http://room-service:8000"""
+    first = service_url.split(",")[0].strip()
+    return urlsplit(first).hostname or first
+
+
+class ServiceClient:
+    """Pooled client for one target service (one or more replicas)
+
+    Holds the target's keep-alive connection pool together with its circuit
+    breaker, load balancer and latency tracker.
     """
-    url = f"{service_url.rstrip('/')}/{endpoint.lstrip('/')}"
 
-    async with httpx.AsyncClient(timeout=timeout) as client:
-        try:
-            resp = await client.request(
-                method=method.upper(),
-                url=url,
-                json=data if method.upper() in ["POST", "PUT", "PATCH"] else None,
-                headers=headers,
-                params=params
+    def __init__(self, service_url: str, timeout: Optional[float] = None):
+        self.key = service_url.rstrip('/')
+        self.name = _service_name(self.key)
+        suffix = re.sub(r"[^A-Z0-9]", "_", self.name.upper())
+        self.timeout = timeout or float(os.getenv(f"CALL_SERVICE_TIMEOUT_{suffix}", str(CALL_SERVICE_TIMEOUT)))
+        self.breaker = breakers.get(self.key)
+        self.balancer = balancers.get(self.key)
+        self.latency = latency_trackers.get(self.key)
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def open(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=self._timeout(self.timeout),
+                limits=httpx.Limits(
+                    max_connections=CALL_SERVICE_MAX_CONNECTIONS,
+                    max_keepalive_connections=CALL_SERVICE_MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=CALL_SERVICE_KEEPALIVE_EXPIRY,
+                ),
             )
-        except httpx.RequestError as e:
-            raise ServiceHTTPError(status_code=0, message=f"RequestError: {str(e)}", url=url)
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    @staticmethod
+    def _timeout(total: float) -> httpx.Timeout:
+        return httpx.Timeout(total, connect=min(CALL_SERVICE_CONNECT_TIMEOUT, total))
+
+    async def request(
+        self,
+        endpoint: str,
+        method: str = "GET",
+        data: Optional[Dict[str, Any]] = None,
+        headers: Optional[Dict[str, str]] = None,
+        params: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None,
+    ) -> Any:
+        """Call the service; see call_service() for the return value and errors"""
+        key = self.key
+        method = method.upper()
+        timeout = timeout or self.timeout
+        budget = deadline_remaining()
+        if budget is not None:
+            if budget <= 0:
+                raise ServiceHTTPError(status_code=504, message="Request deadline exceeded", url=key)
+            timeout = min(timeout, budget)
+
+        breaker = self.breaker
+        balancer = self.balancer
+        latency = self.latency
+        client = self.open()
+        request_timeout = self._timeout(timeout)
+
+        # Forward the already-verified identity so the next hop skips JWT decoding
+        identity = identity_header_for(headers)
+        if identity and IDENTITY_HEADER not in headers:
+            headers = {**headers, IDENTITY_HEADER: identity}
+
+        async def attempt() -> httpx.Response:
+            try:
+                breaker.before_call()
+            except CircuitOpenError as e:
+                raise ServiceHTTPError(status_code=503, message=str(e), url=key)
+            replica = balancer.acquire()
+            url = f"{replica.url}/{endpoint.lstrip('/')}"
+            # Service-to-service bodies stay uncompressed: compressing them
+            # costs more CPU than it saves on the internal network
+            request_headers = {"Accept-Encoding": "identity", **(headers or {})}
+            try:
+                deadline = deadline_header_value()
+            except DeadlineExceeded:
+                breaker.cancel()
+                balancer.release(replica)
+                raise ServiceHTTPError(status_code=504, message="Request deadline exceeded", url=url)
+            if deadline:
+                request_headers[DEADLINE_HEADER] = deadline
+
+            started = time.perf_counter()
+            span_attributes = {"http.method": method, "http.url": url, "peer.service": self.name}
+            with start_span(f"{method} {self.name}", "client", span_attributes) as span:
+                inject_traceparent(request_headers)
+                try:
+                    resp = await client.request(
+                        method=method,
+                        url=url,
+                        json=data if method in ["POST", "PUT", "PATCH"] else None,
+                        headers=request_headers,
+                        params=params,
+                        timeout=request_timeout,
+                    )
+                except httpx.ConnectError:
+                    breaker.record(False, time.perf_counter() - started)
+                    balancer.release(replica, success=False)
+                    raise
+                except httpx.RequestError as e:
+                    breaker.record(False, time.perf_counter() - started)
+                    balancer.release(replica, success=False)
+                    raise ServiceHTTPError(status_code=0, message=f"RequestError: {str(e)}", url=url)
+                except BaseException:
+                    breaker.cancel()
+                    balancer.release(replica)
+                    raise
+                if span is not None:
+                    span.attributes["http.status_code"] = resp.status_code
+            elapsed = time.perf_counter() - started
+            breaker.record(resp.status_code < 500, elapsed)
+            balancer.release(replica, success=resp.status_code < 500)
+            latency.record(elapsed)
+            return resp
+
+        def send() -> Awaitable[httpx.Response]:
+            # Nothing reached the service when connecting failed, so any method may be retried
+            return retry_connect(attempt, CALL_SERVICE_CONNECT_RETRIES)
+
+        try:
+            if method == "GET" and CALL_SERVICE_HEDGE_GETS:
+                resp = await hedged(send, latency.hedge_delay())
+            else:
+                resp = await send()
+        except httpx.ConnectError as e:
+            raise ServiceHTTPError(status_code=0, message=f"RequestError: {str(e)}", url=key)
 
         # 204 No Content
         if resp.status_code == 204:
@@ -71,3 +216,161 @@ async def call_service(
             return resp.json()
         except Exception:
             return resp.text
+
+
+class ServiceClients:
+    """Process-wide ServiceClient per target service URL"""
+
+    def __init__(self):
+        self._clients: Dict[str, ServiceClient] = {}
+
+    def get(self, service_url: str) -> ServiceClient:
+        key = service_url.rstrip('/')
+        client = self._clients.get(key)
+        if client is None:
+            client = self._clients[key] = ServiceClient(key)
+        return client
+
+    async def start(self, *service_urls: str):
+        """Open the pools of the services this app calls (startup hook)"""
+        for url in service_urls:
+            self.get(url).open()
+
+    async def close(self):
+        """Close every pool (shutdown hook); they reopen on next use"""
+        for client in self._clients.values():
+            await client.close()
+
+
+service_clients = ServiceClients()
+
+
+async def call_service(
+    service_url: str,
+    endpoint: str,
+    method: str = "GET",
+    data: Optional[Dict[str, Any]] = None,
+    headers: Optional[Dict[str, str]] = None,
+    params: Optional[Dict[str, Any]] = None,
+    timeout: Optional[float] = None
+) -> Any:
+    """
+    Make HTTP request to another service over its pooled ServiceClient.
+    service_url may list several comma-separated replicas; one is picked per
+    call by the shared load balancer. Connection failures are retried on
+    another pick, GETs are hedged when CALL_SERVICE_HEDGE_GETS is on, and the
+    timeout (default: the target's CALL_SERVICE_TIMEOUT[_<SERVICE>]) never
+    exceeds what is left of the incoming request's deadline.
+    Returns:
+      - dict/list if response is JSON
+      - {} if 204 No Content
+      - raw text if non-JSON body
+    Raises:
+      ServiceHTTPError for non-2xx responses (with status + detail), with
+      status 503 without calling the service while its circuit breaker is open,
+      and with status 504 once the request deadline has passed
+    """
+    return await service_clients.get(service_url).request(
+        endpoint, method=method, data=data, headers=headers, params=params, timeout=timeout
+    )
+
+
+class ServiceCall(NamedTuple):
+    """One request of a call_service_many() batch"""
+    service_url: str
+    endpoint: str
+    method: str = "GET"
+    data: Optional[Dict[str, Any]] = None
+    headers: Optional[Dict[str, str]] = None
+    params: Optional[Dict[str, Any]] = None
+
+    def dedupe_key(self) -> Optional[tuple]:
+        """Identical GETs share one request; other methods always run"""
+        if self.method.upper() != "GET":
+            return None
+        return (
+            self.service_url.rstrip('/'),
+            self.endpoint.lstrip('/'),
+            tuple(sorted((self.params or {}).items())),
+            tuple(sorted((self.headers or {}).items())),
+        )
+
+
+class ServiceResult(NamedTuple):
+    """Outcome of one ServiceCall: the parsed body, or the error it raised"""
+    value: Any = None
+    error: Optional[Exception] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class ServiceResults(list):
+    """ServiceResult per call, in call order, with timings of the whole batch"""
+
+    def __init__(self, results: List[ServiceResult], elapsed: float, unique: int):
+        super().__init__(results)
+        self.elapsed = elapsed
+        self.unique = unique
+
+    @property
+    def errors(self) -> int:
+        return sum(1 for result in self if not result.ok)
+
+
+async def call_service_many(
+    calls: Sequence[ServiceCall],
+    concurrency: int = CALL_SERVICE_MANY_CONCURRENCY,
+    name: str = "call_service_many",
+) -> ServiceResults:
+    """
+    Run many inter-service calls concurrently, at most `concurrency` at a time.
+    Identical GETs are sent once and their result shared. A failing call does
+    not affect the others: its ServiceResult carries the exception (usually
+    ServiceHTTPError) instead of a value. Results come back in call order;
+    the batch's wall time is in .elapsed and is logged (debug) under `name`.
+    """
+    started = time.perf_counter()
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    tasks: Dict[Any, "asyncio.Future[ServiceResult]"] = {}
+
+    async def run(call: ServiceCall) -> ServiceResult:
+        async with semaphore:
+            try:
+                value = await call_service(
+                    call.service_url,
+                    call.endpoint,
+                    method=call.method,
+                    data=call.data,
+                    headers=call.headers,
+                    params=call.params,
+                )
+            except Exception as e:
+                return ServiceResult(error=e)
+            return ServiceResult(value=value)
+
+    pending = []
+    for index, call in enumerate(calls):
+        key = call.dedupe_key()
+        if key is None:
+            key = ("unique", index)
+        task = tasks.get(key)
+        if task is None:
+            task = tasks[key] = asyncio.ensure_future(run(call))
+        pending.append(task)
+
+    try:
+        results = await asyncio.gather(*pending)
+    except BaseException:
+        for task in tasks.values():
+            task.cancel()
+        raise
+
+    elapsed = time.perf_counter() - started
+    batch = ServiceResults(results, elapsed, unique=len(tasks))
+    logger.debug(
+        "%s: %d calls (%d unique, %d failed) in %.1f ms",
+        name, len(batch), batch.unique, batch.errors, elapsed * 1000,
+    )
+    return batch
@@ -0,0 +1,155 @@
+"""
+Load Balancer - Spread calls over the replicas of a service
+
+A service URL may list several replicas separated by commas, e.g.
+BOOKING_SERVICE_URL=http://booking-1:8000,http://booking-2:8000. Each call
+picks one replica with the configured strategy:
+
+- round_robin: replicas in turn
+- least_outstanding: the replica with the fewest calls in flight
+- p2c: power of two choices - the less busy of two random replicas
+
+Replicas that fail several calls in a row (connection errors or 5xx) are
+ejected for a while; if every replica is ejected all of them are used again.
+
+Shared by the API Gateway and call_service.
+"""
+from __future__ import annotations
+
+import os
+import random
+import time
+from typing import Dict, List, Optional
+
+ROUND_ROBIN = "round_robin"
+LEAST_OUTSTANDING = "least_outstanding"
+POWER_OF_TWO = "p2c"
+STRATEGIES = (ROUND_ROBIN, LEAST_OUTSTANDING, POWER_OF_TWO)
+
+LOAD_BALANCER_STRATEGY = os.getenv("LOAD_BALANCER_STRATEGY", ROUND_ROBIN).strip().lower()
+# Consecutive failures after which a replica is ejected, and for how long
+LOAD_BALANCER_EJECT_AFTER = int(os.getenv("LOAD_BALANCER_EJECT_AFTER", "3"))
+LOAD_BALANCER_EJECT_SECONDS = float(os.getenv("LOAD_BALANCER_EJECT_SECONDS", "15"))
+
+
+def parse_endpoints(service_url: str) -> List[str]:
+    """Split a comma-separated service URL into replica base URLs"""
+    endpoints = [url.strip().rstrip("/") for url in service_url.split(",") if url.strip()]
+    if not endpoints:
+        raise ValueError(f"No endpoints in service URL: {service_url!r}")
+    return endpoints
+
+
+class Endpoint:
+    """One replica and its passive health state"""
+    __slots__ = ("url", "outstanding", "consecutive_failures", "ejected_until", "requests", "failures", "ejections")
+
+    def __init__(self, url: str):
+        self.url = url
+        self.outstanding = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.ejections = 0
+
+    def stats(self, now: float) -> dict:
+        return {
+            "url": self.url,
+            "healthy": self.ejected_until <= now,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "failures": self.failures,
+            "ejections": self.ejections,
+        }
+
+
+class LoadBalancer:
+    """Replica selection for one service"""
+
+    def __init__(
+        self,
+        name: str,
+        endpoints: List[str],
+        strategy: str = LOAD_BALANCER_STRATEGY,
+        eject_after: int = LOAD_BALANCER_EJECT_AFTER,
+        eject_seconds: float = LOAD_BALANCER_EJECT_SECONDS,
+    ):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown load balancing strategy {strategy!r}, expected one of {STRATEGIES}")
+        self.name = name
+        self.endpoints = [Endpoint(url) for url in endpoints]
+        self.strategy = strategy
+        self.eject_after = eject_after
+        self.eject_seconds = eject_seconds
+        self._next = 0
+
+    def acquire(self) -> Endpoint:
+        """Pick a replica and count the call as outstanding until release()"""
+        endpoint = self._pick()
+        endpoint.outstanding += 1
+        endpoint.requests += 1
+        return endpoint
+
+    def release(self, endpoint: Endpoint, success: bool = True):
+        endpoint.outstanding -= 1
+        if success:
+            endpoint.consecutive_failures = 0
+            return
+        endpoint.failures += 1
+        endpoint.consecutive_failures += 1
+        if self.eject_after and endpoint.consecutive_failures >= self.eject_after and len(self.endpoints) > 1:
+            endpoint.ejected_until = time.monotonic() + self.eject_seconds
+            endpoint.consecutive_failures = 0
+            endpoint.ejections += 1
+
+    def _pick(self) -> Endpoint:
+        if len(self.endpoints) == 1:
+            return self.endpoints[0]
+
+        now = time.monotonic()
+        candidates = [e for e in self.endpoints if e.ejected_until <= now] or self.endpoints
+
+        if self.strategy == POWER_OF_TWO and len(candidates) > 1:
+            first, second = random.sample(candidates, 2)
+            return first if first.outstanding <= second.outstanding else second
+
+        start = self._next
+        self._next += 1
+        ordered = [candidates[(start + i) % len(candidates)] for i in range(len(candidates))]
+        if self.strategy == LEAST_OUTSTANDING:
+            # Ties are broken in round-robin order
+            return min(ordered, key=lambda e: e.outstanding)
+        return ordered[0]
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            "name": self.name,
+            "strategy": self.strategy,
+            "endpoints": [endpoint.stats(now) for endpoint in self.endpoints],
+        }
+
+
+class LoadBalancerRegistry:
+    """One balancer per service URL (comma-separated replica list)"""
+
+    def __init__(self):
+        self._balancers: Dict[str, LoadBalancer] = {}
+
+    def get(self, service_url: str, name: Optional[str] = None, strategy: Optional[str] = None) -> LoadBalancer:
+        balancer = self._balancers.get(service_url)
+        if balancer is None:
+            balancer = self._balancers[service_url] = LoadBalancer(
+                name or service_url,
+                parse_endpoints(service_url),
+                strategy=strategy or LOAD_BALANCER_STRATEGY,
+            )
+        return balancer
+
+    def stats(self) -> List[dict]:
+        return [balancer.stats() for balancer in self._balancers.values()]
+
+
+# Process-wide registry used by call_service and the API Gateway
+balancers = LoadBalancerRegistry()
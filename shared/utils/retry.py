@@ -0,0 +1,141 @@
+"""
+Retry and hedging helpers for outgoing calls
+
+- retry_connect: retry a call that failed to connect (nothing was sent, so any
+  method is safe to repeat), with full-jitter exponential backoff and without
+  outliving the request deadline
+- hedged: for idempotent calls, start a second attempt if the first has not
+  answered after a delay (the upstream's recent p95) and keep whichever answers
+  first
+- LatencyTracker: recent latencies of one upstream, source of the hedge delay
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import random
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+
+import httpx
+
+from shared.common.deadline import remaining as deadline_remaining
+
+T = TypeVar("T")
+
+RETRY_BACKOFF_BASE = float(os.getenv("RETRY_BACKOFF_BASE", "0.05"))
+RETRY_BACKOFF_MAX = float(os.getenv("RETRY_BACKOFF_MAX", "1.0"))
+# Percentile of recent latency after which a hedge is sent
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "0.95"))
+# Never hedge sooner than this, nor before enough samples are known
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "0.01"))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+
+
+def backoff_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff for retry number `attempt` (0-based)"""
+    return random.uniform(0, min(RETRY_BACKOFF_MAX, RETRY_BACKOFF_BASE * (2 ** attempt)))
+
+
+async def retry_connect(call: Callable[[], Awaitable[T]], retries: int) -> T:
+    """Run call(), retrying up to `retries` times on httpx.ConnectError"""
+    attempt = 0
+    while True:
+        try:
+            return await call()
+        except httpx.ConnectError:
+            if attempt >= retries:
+                raise
+            delay = backoff_delay(attempt)
+            budget = deadline_remaining()
+            if budget is not None and budget <= delay:
+                raise
+            attempt += 1
+            await asyncio.sleep(delay)
+
+
+async def hedged(
+    call: Callable[[], Awaitable[T]],
+    delay: Optional[float],
+    discard: Optional[Callable[[T], Awaitable[None]]] = None,
+) -> T:
+    """Run call(); if it has not finished after `delay` seconds, run it again and
+    return the first result. The losing attempt is cancelled, or passed to
+    discard() if it finished too. delay=None disables hedging."""
+    first = asyncio.ensure_future(call())
+    budget = deadline_remaining()
+    if delay is None or (budget is not None and budget <= delay):
+        return await first
+
+    try:
+        done, _ = await asyncio.wait({first}, timeout=delay)
+    except BaseException:
+        first.cancel()
+        raise
+    if done:
+        return first.result()
+
+    pending = {first, asyncio.ensure_future(call())}
+    error: Optional[BaseException] = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            winners = [task for task in done if not task.cancelled() and task.exception() is None]
+            if not winners:
+                error = next(task.exception() for task in done if not task.cancelled())
+                continue
+            for loser in winners[1:]:
+                if discard is not None:
+                    await discard(loser.result())
+            return winners[0].result()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+        # Wait for cancelled attempts so they release their connections
+        if pending:
+            results = await asyncio.gather(*pending, return_exceptions=True)
+            if discard is not None:
+                for result in results:
+                    if not isinstance(result, BaseException):
+                        await discard(result)
+
+
+class LatencyTracker:
+    """Sliding window of recent latencies with a cached percentile"""
+
+    def __init__(self, size: int = 256):
+        self._samples = [0.0] * size
+        self._count = 0
+        self._delay: Optional[float] = None
+
+    def record(self, seconds: float):
+        self._samples[self._count % len(self._samples)] = seconds
+        self._count += 1
+        # Recompute the percentile every 16 samples rather than on every call
+        if self._count % 16 == 0:
+            self._delay = None
+
+    def hedge_delay(self) -> Optional[float]:
+        """Delay before hedging, or None while there are too few samples"""
+        filled = min(self._count, len(self._samples))
+        if filled < HEDGE_MIN_SAMPLES:
+            return None
+        if self._delay is None:
+            ordered = sorted(self._samples[:filled])
+            self._delay = max(HEDGE_MIN_DELAY, ordered[min(filled - 1, int(filled * HEDGE_PERCENTILE))])
+        return self._delay
+
+
+class LatencyTrackers:
+    def __init__(self):
+        self._trackers: Dict[str, LatencyTracker] = {}
+
+    def get(self, name: str) -> LatencyTracker:
+        tracker = self._trackers.get(name)
+        if tracker is None:
+            tracker = self._trackers[name] = LatencyTracker()
+        return tracker
+
+
+# Process-wide trackers used by call_service and the API Gateway
+latency_trackers = LatencyTrackers()